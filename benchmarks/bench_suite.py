@@ -0,0 +1,189 @@
+"""
+鉴权核心路径的基准测试：批量写入数据后测量各环节的吞吐量和延迟分位数，结果以JSON输出，便于不同版本之间对比
+
+python -m benchmarks.bench_suite --apis 100000 --roles 5000 --users 50000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from importlib.metadata import version
+
+from benchmarks.seed import seed, request_urls
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter
+from eAuth.models import User, url_match
+from eAuth.settings import config, Testing
+from eAuth.utils.auth import verify_token
+
+
+def measure(func, iterations: int, warmup: int = 10) -> dict:
+    """
+    逐次计时，返回吞吐量和延迟分位数（毫秒）
+
+    :param func: 被测函数，参数为第几次调用
+    :param iterations: 调用次数
+    :param warmup: 预热次数，不计入结果
+    :return:
+    """
+    for i in range(min(warmup, iterations)):
+        func(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        begin = time.perf_counter_ns()
+        func(i)
+        latencies.append((time.perf_counter_ns() - begin) / 10 ** 6)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 4)
+
+    return {
+        "iterations": iterations,
+        "throughput": round(iterations / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1], 4),
+    }
+
+
+def mixed_requests(users: list[User], apis: list[dict], count: int, allowed_ratio: float,
+                   rnd: random.Random) -> list[tuple[str, str, bool]]:
+    """
+    生成鉴权请求，第i个请求由users[i % len(users)]发起。allowed_ratio比例的请求取自该用户角色绑定的api，
+    其余取自全部api，预期结果由User.can确定
+
+    :return: (url, method, 是否有权限)
+    """
+    user_apis = [[api for role in user.roles for api in role.apis] for user in users]
+    requests = []
+    for i in range(count):
+        user, own = users[i % len(users)], user_apis[i % len(users)]
+        if own and rnd.random() < allowed_ratio:
+            api = rnd.choice(own)
+            url, method = api.url, api.method
+        else:
+            api = rnd.choice(apis)
+            url, method = api["url"], api["method"]
+        url = url.replace("{id}", str(rnd.randint(1, 10 ** 6)))
+        requests.append((url, method, user.can(url, method)))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apis", type=int, default=100000)
+    parser.add_argument("--roles", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--apis-per-role", type=int, default=20)
+    parser.add_argument("--roles-per-user", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--allowed-ratio", type=float, default=0.5, help="鉴权请求中有权限的比例")
+    # 登录需要计算口令哈希，cache_auth是全量刷新，次数单独设置
+    parser.add_argument("--login-iterations", type=int, default=50)
+    parser.add_argument("--refresh-iterations", type=int, default=3)
+    parser.add_argument("--database", default="sqlite:///:memory:")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="结果文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    # 数据库连接在创建app时建立，需要通过配置类传入
+    config["benchmark"] = type("Benchmark", (Testing,), {
+        "SQLALCHEMY_ECHO": False,
+        "SQLALCHEMY_DATABASE_URI": args.database,
+        # 被测的路径都不涉及搜索，省去写入数据时维护搜索索引的开销
+        "SEARCH_INDEX_ENABLED": False,
+        "QUERY_BUDGET_ENABLED": False,
+    })
+    # 日志输出会影响计时，并且会混入标准输出的结果
+    logging.disable(logging.INFO)
+    app = create_app("benchmark")
+    limiter.enabled = False
+    context = app.test_request_context()
+    context.push()
+    client = app.test_client()
+    rnd = random.Random(args.seed)
+
+    db.drop_all()
+    db.create_all()
+    start = time.perf_counter()
+    apis, usernames = seed(args.apis, args.roles, args.users, args.apis_per_role, args.roles_per_user, args.seed)
+    seed_cost = time.perf_counter() - start
+
+    results = {"cache_auth": measure(lambda i: cache_auth(), args.refresh_iterations, warmup=1)}
+
+    sample = [db.session.get(User, rnd.randint(1, args.users)) for _ in range(min(200, args.users))]
+    tokens = [user.auth_token for user in sample]
+    requests = request_urls(apis, args.iterations, rnd)
+    templates = [rnd.choice(apis)["url"] for _ in range(args.iterations)]
+    checks = mixed_requests(sample, apis, args.iterations, args.allowed_ratio, rnd)
+    allowed = sum(expected for _, _, expected in checks)
+
+    # 预热一遍全部请求，计时不包含首次匹配时编译正则
+    results["verify_token"] = measure(lambda i: verify_token(tokens[i % len(tokens)]), args.iterations)
+    results["user_can"] = measure(lambda i: sample[i % len(sample)].can(*checks[i][:2]), args.iterations,
+                                  warmup=args.iterations)
+    results["url_match"] = measure(lambda i: url_match(requests[i][0], templates[i]), args.iterations,
+                                   warmup=args.iterations)
+
+    def check(i: int):
+        url, method, expected = checks[i]
+        res = client.post("/api/auth/check", json={"url": url, "method": method},
+                          headers={"Authorization": tokens[i % len(tokens)]})
+        assert res.status_code == (200 if expected else 403), res.json
+
+    def login(i: int):
+        res = client.post("/api/auth/login",
+                          json={"username": usernames[i % len(usernames)], "password": "Password@123"})
+        assert res.status_code == 200, res.json
+
+    def check_fast(i: int):
+        url, method, expected = checks[i]
+        res = client.post("/api/auth/check/fast", json={"url": url, "method": method},
+                          headers={"Authorization": tokens[i % len(tokens)]})
+        assert res.status_code == (204 if expected else 403), res.status_code
+
+    results["api_auth_check"] = measure(check, args.iterations, warmup=args.iterations)
+    results["api_auth_check_fast"] = measure(check_fast, args.iterations, warmup=args.iterations)
+    results["api_auth_login"] = measure(login, args.login_iterations, warmup=2)
+
+    report = {
+        "meta": {
+            "datetime": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "flask": version("flask"),
+            "sqlalchemy": version("sqlalchemy"),
+            "database": db.engine.dialect.name,
+            "apis": args.apis,
+            "roles": args.roles,
+            "users": args.users,
+            "apis_per_role": args.apis_per_role,
+            "roles_per_user": args.roles_per_user,
+            "seed": args.seed,
+            # 鉴权请求中有权限的实际比例
+            "allowed_ratio": round(allowed / len(checks), 4),
+            "seed_seconds": round(seed_cost, 2),
+        },
+        "results": results,
+    }
+    context.pop()
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Write results to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
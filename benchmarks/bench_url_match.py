@@ -0,0 +1,125 @@
+"""
+url匹配的微基准：对比每次重新生成正则的旧版url_match、预编译的url_match与前缀树。
+前缀树对路径段中只有一部分是参数的模板（例如`{id}.json`）按固定路径段分组匹配预编译的正则，单独统计
+
+python -m benchmarks.bench_url_match --templates 10000
+"""
+import argparse
+import random
+import re
+import time
+
+from eAuth.models import url_match
+from eAuth.utils.route import RouteTrie
+
+
+def legacy_url_match(request_url: str, allowed_url: str):
+    """预编译之前的url_match实现"""
+    pattern = re.sub(r'{[^}]*?}', r'[a-zA-Z0-9\\u4e00-\\u9fff\_\-\.~]+', allowed_url)
+    if re.match(f"^{pattern}$", request_url):
+        return True
+    return False
+
+
+def build_templates(count: int, rnd: random.Random) -> dict[int, str]:
+    templates = {}
+    for api_id in range(1, count + 1):
+        service = f"svc{rnd.randint(0, 49)}"
+        kind = rnd.random()
+        if kind < 0.4:
+            templates[api_id] = f"/api/{service}/res{api_id}"
+        elif kind < 0.9:
+            templates[api_id] = f"/api/{service}/res{api_id}/{{id}}"
+        else:
+            templates[api_id] = f"/api/{service}/res{api_id}/{{id}}/sub"
+    return templates
+
+
+def partial_templates(templates: dict[int, str]) -> dict[int, str]:
+    """整段的`{id}`改为部分参数`{id}.json`，只能由前缀树的正则分组匹配"""
+    return {api_id: url.replace("{id}", "{id}.json") for api_id, url in templates.items() if "{id}" in url}
+
+
+def build_requests(templates: dict[int, str], count: int, rnd: random.Random) -> list[str]:
+    requests = []
+    for _ in range(count):
+        url = rnd.choice(list(templates.values())).replace("{id}", str(rnd.randint(1, 10 ** 6)))
+        if rnd.random() < 0.2:
+            url += "/missing"
+        requests.append(url)
+    return requests
+
+
+def timeit(func, requests: list[str], repeat: int) -> float:
+    """返回单次请求的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url in requests:
+            func(url)
+    return (time.perf_counter() - start) / (repeat * len(requests)) * 10 ** 6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--templates", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    # 旧版实现每次都要重新编译正则（超出re模块的缓存），只取少量请求
+    parser.add_argument("--legacy-requests", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    templates = build_templates(args.templates, rnd)
+    requests = build_requests(templates, args.requests, rnd)
+
+    start = time.perf_counter()
+    for url in templates.values():
+        url_match("/", url)
+    compile_cost = time.perf_counter() - start
+    trie = RouteTrie()
+    for api_id, url in templates.items():
+        trie.add(api_id, url, "GET")
+    partial = partial_templates(templates)
+    partial_requests = build_requests(partial, args.requests, rnd)
+    for url in partial.values():
+        url_match("/", url)
+    partial_trie = RouteTrie()
+    for api_id, url in partial.items():
+        partial_trie.add(api_id, url, "GET")
+    # 预热，计时不包含首次匹配时编译正则
+    for url in partial_requests:
+        partial_trie.match(url, "GET")
+
+    results = {
+        "legacy url_match": timeit(lambda u: any(legacy_url_match(u, t) for t in templates.values()),
+                                   requests[:args.legacy_requests], 1),
+        "precompiled url_match": timeit(lambda u: any(url_match(u, t) for t in templates.values()),
+                                        requests, args.repeat),
+        "route trie": timeit(lambda u: trie.match(u, "GET"), requests, args.repeat),
+    }
+    partial_results = {
+        "precompiled url_match": timeit(lambda u: any(url_match(u, t) for t in partial.values()),
+                                        partial_requests, args.repeat),
+        "route trie (grouped)": timeit(lambda u: partial_trie.match(u, "GET"), partial_requests, args.repeat),
+    }
+    # 结果一致性
+    for url in requests:
+        expected = any(url_match(url, t) for t in templates.values())
+        assert (trie.match(url, "GET") is not None) == expected, url
+    for url in partial_requests:
+        expected = any(url_match(url, t) for t in partial.values())
+        assert (partial_trie.match(url, "GET") is not None) == expected, url
+
+    baseline = results["legacy url_match"]
+    print(f"templates: {args.templates}, requests: {len(requests)}, precompile: {compile_cost * 1000:.1f}ms")
+    for name, cost in results.items():
+        print(f"{name:<24}{cost:>14.1f}us/request{baseline / cost:>10.1f}x")
+    baseline = partial_results["precompiled url_match"]
+    print(f"partial templates: {len(partial)}, requests: {len(partial_requests)}")
+    for name, cost in partial_results.items():
+        print(f"{name:<24}{cost:>14.1f}us/request{baseline / cost:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+对比两次bench_suite的结果，吞吐量下降或p99延迟上升超过阈值时返回非零退出码
+
+python -m benchmarks.compare base.json current.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的性能下降比例")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)["results"]
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'name':<20}{'throughput':>24}{'p99_ms':>24}")
+    for name, result in current.items():
+        if name not in base:
+            continue
+        throughput = result["throughput"] / base[name]["throughput"] - 1
+        p99 = result["p99_ms"] / base[name]["p99_ms"] - 1 if base[name]["p99_ms"] else 0
+        print(f"{name:<20}{result['throughput']:>14.1f}{throughput:>+10.1%}{result['p99_ms']:>14.3f}{p99:>+10.1%}")
+        if throughput < -args.threshold or p99 > args.threshold:
+            regressions.append(name)
+    if regressions:
+        print(f"Regression: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+对比迁移0003_keys_indexes前后关联表和日志表常用查询的执行计划及耗时，结果以JSON输出
+
+python -m benchmarks.query_plans --apis 20000 --roles 1000 --users 10000 --logs 200000 --output plans.json
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime
+
+import flask_migrate
+from sqlalchemy import text
+
+from benchmarks.bench_suite import measure
+from eAuth import create_app
+from eAuth.extensions import db
+from eAuth.settings import config, Testing
+from eAuth.utils.fixture import FixtureGenerator
+
+# 增加复合主键和索引之前的版本
+BASELINE = "0002_search_rollup"
+
+# 名称 -> (SQL, 只看执行计划不计时)
+QUERIES = {
+    # 刷新鉴权快照时按角色读取绑定的api
+    "role_apis": ("SELECT roles_apis.role_id, api.id, api.url, api.method FROM roles_apis "
+                  "JOIN api ON api.id = roles_apis.api_id WHERE roles_apis.role_id = :role_id", False),
+    # api.roles反查绑定的角色
+    "api_roles": ("SELECT role.id, role.name FROM role JOIN roles_apis ON role.id = roles_apis.role_id "
+                  "WHERE roles_apis.api_id = :api_id", False),
+    # 构建用户身份时读取用户的角色
+    "user_roles": ("SELECT users_roles.role_id FROM users_roles WHERE users_roles.user_id = :user_id", False),
+    # role.users反查绑定的用户
+    "role_users": ("SELECT users_roles.user_id FROM users_roles WHERE users_roles.role_id = :role_id", False),
+    # 删除api时级联删除绑定关系
+    "delete_api_bindings": ("DELETE FROM roles_apis WHERE roles_apis.api_id = :api_id", True),
+    # 登录时查询最近一次失败的记录
+    "login_lockout": ("SELECT security_log.id, security_log.operate_datetime FROM security_log "
+                      "WHERE security_log.username = :username AND security_log.success = 0 "
+                      "ORDER BY security_log.operate_datetime DESC LIMIT 1", False),
+    # 按操作人分页查询操作日志
+    "operate_log_by_user": ("SELECT operate_log.id FROM operate_log WHERE operate_log.username = :username "
+                            "ORDER BY operate_log.operate_datetime DESC LIMIT 20", False),
+}
+
+
+def explain(statement: str, params: dict) -> list:
+    """
+    获取执行计划，sqlite使用EXPLAIN QUERY PLAN，其他数据库使用EXPLAIN
+
+    :param statement: SQL
+    :param params: 参数
+    :return: 执行计划的每一行
+    """
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {statement}"), params).all()
+        return [row[-1] for row in rows]
+    rows = db.session.execute(text(f"EXPLAIN {statement}"), params).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def analyze():
+    # 更新统计信息，让优化器看到数据分布
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(text("ANALYZE"))
+    elif db.engine.dialect.name == "mysql":
+        for table in ("roles_apis", "users_roles", "security_log", "operate_log"):
+            db.session.execute(text(f"ANALYZE TABLE {table}"))
+    db.session.commit()
+
+
+def run(args, rnd: random.Random) -> dict:
+    """
+    分析当前结构下各查询的执行计划并计时
+    """
+    analyze()
+    params = [{
+        "role_id": rnd.randint(1, args.roles),
+        "api_id": rnd.randint(1, args.apis),
+        "user_id": rnd.randint(1, args.users),
+        "username": f"user{rnd.randint(1, args.users)}",
+    } for _ in range(args.iterations)]
+    result = {}
+    for name, (statement, plan_only) in QUERIES.items():
+        result[name] = {"plan": explain(statement, params[0])}
+        if not plan_only:
+            result[name].update(measure(lambda i: db.session.execute(text(statement), params[i]).all(),
+                                        args.iterations))
+    db.session.rollback()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apis", type=int, default=20000)
+    parser.add_argument("--roles", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--apis-per-role", type=int, default=50)
+    parser.add_argument("--logs", type=int, default=200000, help="操作日志和安全日志各写入的数量")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--database", default="sqlite:///:memory:")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="结果文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    config["benchmark"] = type("Benchmark", (Testing,), {
+        "SQLALCHEMY_ECHO": False,
+        "SQLALCHEMY_DATABASE_URI": args.database,
+        "SEARCH_INDEX_ENABLED": False,
+        "QUERY_BUDGET_ENABLED": False,
+    })
+    logging.disable(logging.INFO)
+    app = create_app("benchmark")
+    context = app.app_context()
+    context.push()
+    rnd = random.Random(args.seed)
+
+    # 按最新的模型建表并写入数据，降级得到迁移前的结构，再升级回来
+    db.drop_all()
+    db.create_all()
+    flask_migrate.stamp()
+    start = time.perf_counter()
+    generator = FixtureGenerator(args.seed)
+    generator.apis(args.apis)
+    generator.roles(args.roles, (args.apis_per_role, args.apis_per_role))
+    usernames = generator.users(args.users, (1, 3), password="Password@123")
+    end = datetime(2024, 1, 1)
+    generator.operate_logs(args.logs, usernames=usernames, end=end)
+    generator.security_logs(args.logs, usernames=usernames, end=end)
+    seed_cost = time.perf_counter() - start
+
+    flask_migrate.downgrade(revision=BASELINE)
+    before = run(args, rnd)
+    start = time.perf_counter()
+    flask_migrate.upgrade()
+    upgrade_cost = time.perf_counter() - start
+    after = run(args, random.Random(args.seed))
+
+    report = {
+        "meta": {
+            "datetime": datetime.utcnow().isoformat(),
+            "database": db.engine.dialect.name,
+            "apis": args.apis,
+            "roles": args.roles,
+            "users": args.users,
+            "apis_per_role": args.apis_per_role,
+            "logs": args.logs,
+            "seed": args.seed,
+            "seed_seconds": round(seed_cost, 2),
+            "upgrade_seconds": round(upgrade_cost, 2),
+        },
+        "before": before,
+        "after": after,
+    }
+    context.pop()
+    output = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Write results to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+基准测试数据，由FixtureGenerator批量写入
+"""
+import random
+
+from eAuth.utils.fixture import FixtureGenerator
+
+
+def seed(apis: int, roles: int, users: int, apis_per_role: int = 20, roles_per_user: int = 2, seed_: int = 0,
+         password: str = "Password@123") -> tuple[list[dict], list[str]]:
+    """
+    写入api、角色、用户及绑定关系，所有用户使用同一个口令哈希
+
+    :return: (写入的api, 写入的用户名)
+    """
+    generator = FixtureGenerator(seed_)
+    api_records = generator.apis(apis)
+    generator.roles(roles, (apis_per_role, apis_per_role))
+    usernames = generator.users(users, (roles_per_user, roles_per_user), password=password)
+    return api_records, usernames
+
+
+def request_urls(apis: list[dict], count: int, rnd: random.Random) -> list[tuple[str, str]]:
+    """生成请求，约80%命中某个api模板"""
+    requests = []
+    for _ in range(count):
+        api = rnd.choice(apis)
+        url = api["url"].replace("{id}", str(rnd.randint(1, 10 ** 6)))
+        if rnd.random() < 0.2:
+            url += "/missing"
+        requests.append((url, api["method"]))
+    return requests
@@ -1,8 +1,9 @@
 import logging
 import logging.config
-import random
+import os
 
 import click
+import flask_migrate
 import yaml
 from apiflask import APIFlask, abort
 from faker import Faker
@@ -10,15 +11,25 @@ from flask import request, g
 from sqlalchemy import inspect
 
 from .auth.api import auth_api
+from .auth.fast import FastCheckMiddleware
 from eAuth.models import User, Api, Role
 from .config import config_api_blueprint
-from .constant import CACHE_TIME_AUTH
+from .constant import CACHE_TIME_AUTH, HTTP_METHODS, SEARCH_MODES, PROCESS_LOCAL_CACHE_TYPES
 from .extensions import db, migrate, cors, cache, scheduler, limiter, mail
-from .log.api import log_api
+from .log.api import log_api, build_log_query, OPERATE_LOG_LIKE_FIELDS, SECURITY_LOG_LIKE_FIELDS
 from .log.models import OperateLog, SecurityLog
+from .metrics.api import metrics_api
 from .schedule.auth import cache_auth
+from .schedule.log import archive_logs, rollup_logs
 from .settings import config
-from .utils.auth import verify_token
+from .utils.export import export_stream, EXPORT_FORMATS
+from .utils.fixture import FixtureGenerator
+from .utils.audit import audit_writer
+from .utils.metrics import metrics
+from .utils.password import password_hasher
+from .utils.query_budget import query_budget
+from .utils.search import reindex
+from .utils.auth import verify_token, verify_identity
 
 logger = logging.getLogger(__name__)
 fake = Faker('zh_CN')
@@ -35,6 +46,8 @@ def create_app(config_name="base"):
     register_blueprints(app)
     register_processor(app)
     register_commands(app)
+    if app.config.get("FAST_CHECK_PATH"):
+        app.wsgi_app = FastCheckMiddleware(app)
 
     return app
 
@@ -42,24 +55,48 @@ def create_app(config_name="base"):
 def register_extensions(app):
     db.init_app(app)
     cors.init_app(app)
-    migrate.init_app(app)
+    # sqlite不支持修改约束，使用batch模式重建表
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), "migrations"),
+                     render_as_batch=True)
     cache.init_app(app)
+    # 鉴权纪元保存在缓存中，进程内缓存无法让其它进程看到锁定、注销等变更
+    cache_type = app.config.get("CACHE_TYPE", "null").rsplit(".", 1)[-1].lower()
+    if app.config.get("TOKEN_EMBED_ROLES") and cache_type in PROCESS_LOCAL_CACHE_TYPES:
+        raise RuntimeError(f"TOKEN_EMBED_ROLES requires a cache shared by all worker processes, "
+                           f"CACHE_TYPE {app.config['CACHE_TYPE']} is process-local")
     limiter.init_app(app)
     mail.init_app(app)
-    scheduler.init_app(app)
+    audit_writer.init_app(app)
+    metrics.init_app(app)
+    query_budget.init_app(app)
+    password_hasher.init_app(app)
+    if scheduler.running:
+        # 同一进程中多次创建app（例如测试）时调度器已经启动，只需切换其绑定的app
+        scheduler.app = app
+    else:
+        scheduler.init_app(app)
     with app.app_context():
         insp = inspect(db.engine)
         if not insp.has_table(Api.__tablename__, db.engine):
             db.create_all()
-    scheduler.start()
-    scheduler.add_job("cache_api", cache_auth, trigger='interval', seconds=CACHE_TIME_AUTH)
+    if not scheduler.running:
+        scheduler.start()
+    scheduler.add_job("cache_api", cache_auth, trigger='interval', seconds=CACHE_TIME_AUTH, replace_existing=True)
     scheduler.run_job("cache_api")
+    scheduler.add_job("rollup_log", rollup_logs, trigger='interval', seconds=app.config["LOG_ROLLUP_INTERVAL"],
+                      replace_existing=True)
+    if app.config.get("LOG_ARCHIVE_ENABLED"):
+        scheduler.add_job("archive_log", archive_logs, trigger='cron', hour=app.config["LOG_ARCHIVE_HOUR"],
+                          timezone="UTC", replace_existing=True)
+    elif scheduler.get_job("archive_log"):
+        scheduler.remove_job("archive_log")
 
 
 def register_blueprints(app):
     app.register_blueprint(auth_api)
     app.register_blueprint(config_api_blueprint)
     app.register_blueprint(log_api)
+    app.register_blueprint(metrics_api)
 
 
 def register_processor(app):
@@ -93,7 +130,8 @@ def register_processor(app):
         if f"{request.method.upper()} {request.path}" in auth_white_list:
             return
         jwt_token = request.headers.get("Authorization")
-        user = verify_token(jwt_token)
+        with metrics.timer("eauth_phase_seconds", phase="authenticate"):
+            user = verify_identity(jwt_token)
         if user is None:
             abort(401, message="Token error")
         g.user = user
@@ -102,7 +140,7 @@ def register_processor(app):
         permission_white_list = app.config.get("PERMISSION_WHITE_LIST", {"/api/auth/check"})
         if f"{request.method.upper()} {request.path}" in permission_white_list:
             return
-        if user.username == "admin":  # admin直接通过
+        if user.is_admin:  # admin直接通过
             logger.info("[verify permission] Admin visitor")
             return
         url = request.path
@@ -123,8 +161,63 @@ def register_commands(app):
             db.drop_all()
             click.echo('The database is deleted successfully, and the new database is creating...')
         db.create_all()
+        # 新建的表结构即为最新版本，标记后之后的变更通过flask db upgrade执行
+        flask_migrate.stamp()
         click.echo('The database create successfully.')
 
+    @app.cli.command()
+    @click.option('--batch-size', default=1000, type=int, help='每批处理的记录数')
+    def reindex_search(batch_size):
+        """重建搜索索引"""
+        for model in (Api, Role, User, OperateLog, SecurityLog):
+            total = reindex(model, batch_size)
+            click.echo(f"Reindex {total} {model.__tablename__} records.")
+
+    @app.cli.command()
+    @click.option('--type', 'log_type', default='operate', type=click.Choice(['operate', 'security']), help='日志类型')
+    @click.option('--format', 'fmt', default='ndjson', type=click.Choice(EXPORT_FORMATS), help='导出格式')
+    @click.option('--gzip', 'compress', is_flag=True, help='gzip压缩')
+    @click.option('--output', default='-', type=click.File('wb'), help='输出文件，默认为标准输出')
+    @click.option('--start', type=click.DateTime(), help='开始时间')
+    @click.option('--end', type=click.DateTime(), help='结束时间')
+    @click.option('--username', help='用户名')
+    @click.option('--ip-addr', help='客户端标识')
+    @click.option('--operate-type', type=click.Choice(HTTP_METHODS), help='请求方法，仅操作日志')
+    @click.option('--operate-api', help='请求接口，仅操作日志')
+    @click.option('--status-code', type=click.IntRange(100, 599), help='响应码，仅操作日志')
+    @click.option('--resource-id', type=int, help='资源id，仅操作日志')
+    @click.option('--operate', help='操作，仅安全日志')
+    @click.option('--success/--failure', default=None, help='是否成功')
+    @click.option('--search-mode', default='contains', type=click.Choice(SEARCH_MODES), help='用户名等字段的查询方式')
+    @click.option('--batch-size', default=1000, type=int, help='每批读取的行数')
+    def export_logs(log_type, fmt, compress, output, start, end, search_mode, batch_size, **filters):
+        """按条件流式导出审计日志，过滤条件与日志查询接口一致"""
+        model, like_query_fields = (OperateLog, OPERATE_LOG_LIKE_FIELDS) if log_type == 'operate' \
+            else (SecurityLog, SECURITY_LOG_LIKE_FIELDS)
+        conditions = {k: v for k, v in filters.items() if v is not None}
+        unknown = [k for k in conditions if k not in model.__table__.columns]
+        if unknown:
+            raise click.UsageError(f"{', '.join(unknown)} can not be used with --type {log_type}")
+        query, equal_query_condition = build_log_query(model, like_query_fields, conditions,
+                                                       {"start_datetime": start, "end_datetime": end}, search_mode)
+        query = query.filter_by(**equal_query_condition)
+        for chunk in export_stream(query, list(model.__table__.columns), fmt, compress, batch_size):
+            output.write(chunk)
+
+    @app.cli.command()
+    @click.option('--hours', default=24, type=int, help='重新计算最近几个小时')
+    def rollup_log(hours):
+        """重新计算审计日志的按小时汇总"""
+        rollup_logs(hours)
+        click.echo('Rollup logs successfully.')
+
+    @app.cli.command()
+    @click.confirmation_option(prompt='Logs older than the retention days will be deleted from the database, continue?')
+    def archive_log():
+        """立即归档超过保留天数的审计日志（归档后从数据库删除）"""
+        archive_logs()
+        click.echo('Archive logs successfully.')
+
     @app.cli.command()
     @click.option('--username', prompt=True, help='用户名')
     @click.option('--email', prompt=True, help='邮箱')
@@ -180,35 +273,45 @@ def register_commands(app):
         db.session.commit()
 
     @app.cli.command()
-    @click.option('--count', default=200, type=int)
-    def fake_api(count):
-        methods = [
-            "GET", "POST", "PUT", "DELETE", "PATCH"
-        ]
-        for i in range(count):
-            try:
-                api = Api(
-                    url="/"+fake.uri_path(),
-                    method=random.choice(methods),
-                    description=fake.sentence()
-                )
-                db.session.add(api)
-                db.session.commit()
-            except:
-                db.session.rollback()
+    @click.option('--count', default=200, type=int, help='api数量')
+    @click.option('--param-ratio', default=0.6, type=float, help='带{id}参数的url比例')
+    @click.option('--seed', default=0, type=int, help='随机数种子，相同的种子生成相同的数据')
+    def fake_api(count, param_ratio, seed):
+        """批量生成api"""
+        FixtureGenerator(seed).apis(count, param_ratio)
+        cache_auth()
+        click.echo(f"Create {count} apis successfully.")
+
+    @app.cli.command()
+    @click.option('--count', default=20, type=int, help='角色数量')
+    @click.option('--apis-per-role', default=(2, 10), type=(int, int), help='每个角色绑定的api数量范围')
+    @click.option('--seed', default=0, type=int, help='随机数种子，相同的种子生成相同的数据')
+    def fake_role(count, apis_per_role, seed):
+        """批量生成角色并绑定api"""
+        FixtureGenerator(seed).roles(count, apis_per_role)
+        cache_auth()
+        click.echo(f"Create {count} roles successfully.")
+
+    @app.cli.command()
+    @click.option('--count', default=100, type=int, help='用户数量')
+    @click.option('--roles-per-user', default=(1, 3), type=(int, int), help='每个用户绑定的角色数量范围')
+    @click.option('--password', default='Password@123', help='所有用户的口令')
+    @click.option('--seed', default=0, type=int, help='随机数种子，相同的种子生成相同的数据')
+    def fake_user(count, roles_per_user, password, seed):
+        """批量生成用户并绑定角色"""
+        FixtureGenerator(seed).users(count, roles_per_user, password=password)
+        click.echo(f"Create {count} users successfully.")
 
     @app.cli.command()
-    @click.option('--count', default=20, type=int)
-    def fake_role(count):
-        api_list = Api.query.all()
-        for i in range(count):
-            try:
-                role = Role(
-                    name=fake.word(),
-                    description=fake.sentence()
-                )
-                role.apis = random.choices(api_list, k=random.randint(2, 10))
-                db.session.add(role)
-                db.session.commit()
-            except:
-                db.session.rollback()
+    @click.option('--operate', default=10000, type=int, help='操作日志数量')
+    @click.option('--security', default=10000, type=int, help='安全日志数量')
+    @click.option('--days', default=30, type=int, help='日志时间分布在最近几天内')
+    @click.option('--seed', default=0, type=int, help='随机数种子，相同的种子生成相同的数据')
+    def fake_log(operate, security, days, seed):
+        """批量生成审计日志，并重新计算这段时间的按小时汇总"""
+        generator = FixtureGenerator(seed)
+        usernames = list(db.session.execute(db.select(User.username).limit(1000)).scalars()) or None
+        generator.operate_logs(operate, days, usernames)
+        generator.security_logs(security, days, usernames)
+        rollup_logs(days * 24 + 1)
+        click.echo(f"Create {operate} operate logs and {security} security logs successfully.")
@@ -4,17 +4,23 @@ import logging
 from apiflask import APIBlueprint, abort
 from flask import current_app, g
 
-from eAuth.models import User
-from .schemas import LoginInputSchema, LoginOutputSchema, AuthInputSchema, AuthOutputSchema
+from eAuth.models import User, Identity
+from .schemas import LoginInputSchema, LoginOutputSchema, AuthInputSchema, AuthOutputSchema, AuthBatchInputSchema, \
+    AuthBatchOutputSchema
 from ..base.schemas import BaseOutSchema
 from ..extensions import limiter, db
-from ..log.models import SecurityLog
 from ..utils.auth import logout_user
 from ..utils.decorator import security_log
+from ..utils.query_budget import query_budget
+from ..utils.route import match_any
+from ..utils.serializer import fast_output
 
 auth_api = APIBlueprint("auth", __name__, url_prefix="/api/auth")
 logger = logging.getLogger(__name__)
 
+# 鉴权接口的限流，快速路径使用相同的限流
+CHECK_LIMITS = '10000/day;2000/hour;500/minute;10/second'
+
 
 @auth_api.post("/login")
 @security_log("login")
@@ -22,6 +28,7 @@ logger = logging.getLogger(__name__)
 @auth_api.output(LoginOutputSchema, status_code=200)
 @auth_api.doc(summary="登录接口，返回token信息", responses=[200, 401, 422])
 @limiter.limit('2000/day;800/hour;100/minute;5/second')
+@query_budget.limit(6)
 def login(data):
     username, password = data["username"], data["password"]
     user = User.query.filter_by(username=username).first()
@@ -40,13 +47,11 @@ def login(data):
             f"[login] Over than the MAX_LOGIN_INCORRECT(user <{user.username}>, times <{user.login_incorrect}>)")
         abort(401, message="Username or password failed")
 
-    last_login_log: SecurityLog = \
-        SecurityLog.query.filter_by(username=user.username, success=False).order_by(
-            SecurityLog.operate_datetime.desc()).first()
+    # 最近一次失败的时间与失败次数在同一事务中同步写入，不依赖异步写入的安全日志
     is_short_max_login_incorrect = (
             user.login_incorrect >= current_app.config.get("SHORT_MAX_LOGIN_INCORRECT", 3)
-            and last_login_log is not None
-            and datetime.datetime.utcnow() - last_login_log.operate_datetime <
+            and user.last_login_incorrect is not None
+            and datetime.datetime.utcnow() - user.last_login_incorrect <
             datetime.timedelta(hours=current_app.config.get("SHORT_MAX_LOGIN_DELAY", 3)))
     if is_short_max_login_incorrect:
         logger.info(
@@ -56,6 +61,7 @@ def login(data):
     if not user.validate_password(password):
         try:
             user.login_incorrect += 1
+            user.last_login_incorrect = datetime.datetime.utcnow()
             db.session.commit()
         except:
             db.session.rollback()
@@ -67,6 +73,10 @@ def login(data):
 
     try:
         user.login_incorrect = 0
+        if user.password_needs_rehash():
+            # 口令哈希的参数已过时，使用当前参数重新生成
+            user.set_password(password)
+            logger.info(f"[login] Rehash the password of user <{user.username}>")
         db.session.commit()
     except:
         db.session.rollback()
@@ -83,10 +93,12 @@ def login(data):
 @auth_api.doc(summary="鉴权接口，传入请求URL及请求方法，返回响应码200表示鉴权通过",
               responses=[200, 401, 403, 422],
               security="Authorization")
-@limiter.limit('10000/day;2000/hour;500/minute;10/second')
+@limiter.limit(CHECK_LIMITS)
+@fast_output(AuthOutputSchema)
+@query_budget.limit(2)
 def auth(data):
     url, method = data["url"], data["method"]
-    user: User = g.user
+    user: Identity = g.user
     success: bool = True
     if not user.can(url, method):
         success = False
@@ -95,6 +107,32 @@ def auth(data):
     return {}
 
 
+@auth_api.post("/check/batch")
+@auth_api.input(AuthBatchInputSchema, location="json", arg_name="data")
+@auth_api.output(AuthBatchOutputSchema)
+@auth_api.doc(summary="批量鉴权接口，传入多组请求URL及请求方法，按顺序返回每组的鉴权结果",
+              responses=[200, 401, 422],
+              security="Authorization")
+@limiter.limit(CHECK_LIMITS)
+@fast_output(AuthBatchOutputSchema)
+@query_budget.limit(2)
+def auth_batch(data):
+    user: Identity = g.user
+    # 用户的角色及权限只获取一次
+    tries = user.get_role_tries()
+    result = []
+    for item in data["items"]:
+        url, method = item["url"], item["method"]
+        result.append({
+            "url": url,
+            "method": method,
+            "allowed": match_any(tries, url, method) is not None
+        })
+    logger.info(f"[check batch] User: `{user.username}`, check {len(result)} items, "
+                f"{sum(item['allowed'] for item in result)} allowed")
+    return {"data": result}
+
+
 @auth_api.post("/logout")
 @auth_api.output(BaseOutSchema)
 @auth_api.doc(summary="用于推出登录",
@@ -102,7 +140,7 @@ def auth(data):
               security="Authorization")
 def logout():
     # 调用到该方法说明认证通过了，因此只需要将该用户uid以及当前时间加入缓存中即可
-    user: User = g.get("user")
+    user: Identity = g.get("user")
     logout_user(user.id)
 
 
@@ -0,0 +1,102 @@
+import json
+import logging
+import time
+
+from apiflask import APIFlask
+from limits import parse_many
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES
+
+from .api import CHECK_LIMITS
+from ..extensions import limiter, get_ipaddr
+from ..utils.auth import verify_identity
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class FastCheckMiddleware(object):
+    """
+    鉴权接口的快速路径：FAST_CHECK_PATH的请求在进入Flask之前处理，不经过路由、before_request、参数校验和输出模型，
+    只返回响应码，没有响应体：204鉴权通过，403无权限，401认证失败，400/422请求格式错误，429超过限流。
+
+    与/api/auth/check的语义一致：同样的限流（单独计数）、token校验（verify_identity）、
+    对本接口的鉴权（PERMISSION_WHITE_LIST、admin、Identity.can）和对请求的鉴权（Identity.can），
+    请求体同样只能包含字符串类型的url和method。另外支持GET请求只通过请求头传入
+    X-Original-URI和X-Original-Method（例如nginx的auth_request），查询参数不参与鉴权
+    """
+
+    def __init__(self, app: APIFlask):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.path = app.config["FAST_CHECK_PATH"]
+        self.limits = parse_many(CHECK_LIMITS)
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") != self.path or environ.get("REQUEST_METHOD") == "OPTIONS":
+            return self.wsgi_app(environ, start_response)
+        start = time.perf_counter()
+        with self.app.app_context():
+            try:
+                status = self.check(self.app.request_class(environ))
+            except HTTPException as e:
+                # 例如请求体超过MAX_CONTENT_LENGTH
+                status = e.code
+            except:
+                logger.error("[fast check] Check failed", exc_info=True)
+                status = 500
+            metrics.observe("eauth_request_seconds", time.perf_counter() - start,
+                            (("endpoint", "auth.fast_check"), ("status", status)))
+        start_response(f"{status} {HTTP_STATUS_CODES[status]}", [("Content-Length", "0")])
+        return []
+
+    def check(self, request) -> int:
+        """
+        依次限流、认证、接口鉴权、校验参数、鉴权，与Flask中各环节的顺序一致
+
+        :param request: 请求
+        :return: 响应码
+        """
+        if request.method not in ("GET", "POST"):
+            return 405
+        if limiter.enabled:
+            ip_addr = get_ipaddr(request)
+            for item in self.limits:
+                if not limiter.limiter.hit(item, "auth.fast_check", ip_addr):
+                    logger.info(f"[fast check] Rate limit {item} exceeded for {ip_addr}")
+                    return 429
+
+        user = verify_identity(request.headers.get("Authorization"))
+        if user is None:
+            return 401
+
+        # 与jwt_auth一致：快速路径本身也需要鉴权，默认在PERMISSION_WHITE_LIST中
+        permission_white_list = self.app.config.get("PERMISSION_WHITE_LIST", set())
+        if f"{request.method} {self.path}" not in permission_white_list and not user.is_admin \
+                and not user.can(self.path, request.method):
+            logger.info("[fast check] Verify permission failed: no permission")
+            return 403
+
+        if request.method == "GET":
+            url = request.headers.get("X-Original-URI")
+            method = request.headers.get("X-Original-Method")
+            if url is not None:
+                url = url.split("?", 1)[0]
+        else:
+            # 与输入模型一致：非JSON请求体视为空，只能包含url和method
+            data = {}
+            if request.is_json:
+                try:
+                    data = json.loads(request.get_data())
+                except ValueError:
+                    return 400
+            if not isinstance(data, dict) or set(data) != {"url", "method"}:
+                return 422
+            url, method = data["url"], data["method"]
+        if not isinstance(url, str) or not isinstance(method, str):
+            return 422
+
+        success = user.can(url, method)
+        logger.info(f"[fast check] User: `{user.username}`, url: `{url}`, method: `{method}`, "
+                    f"check result is {success}")
+        return 204 if success else 403
@@ -1,5 +1,6 @@
-from apiflask.fields import String
+from apiflask.fields import String, Boolean, List, Nested
 from apiflask.schemas import Schema
+from apiflask.validators import Length
 
 from eAuth.base.schemas import BaseOutSchema, AuditLogInterface
 
@@ -47,3 +48,20 @@ class AuthInputSchema(Schema, AuditLogInterface):
 
 class AuthOutputSchema(BaseOutSchema):
     pass
+
+
+class AuthItemSchema(Schema):
+    url = String(required=True)
+    method = String(required=True)
+
+
+class AuthBatchInputSchema(Schema):
+    items = List(Nested(AuthItemSchema), required=True, validate=[Length(min=1, max=100)])
+
+
+class AuthResultSchema(AuthItemSchema):
+    allowed = Boolean()
+
+
+class AuthBatchOutputSchema(BaseOutSchema):
+    data = List(Nested(AuthResultSchema))
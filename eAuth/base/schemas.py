@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 
-from apiflask.fields import Boolean, Integer, Nested, DateTime
+from apiflask.fields import Boolean, Integer, Nested, DateTime, String, DelimitedList
 from apiflask.schemas import Schema, PaginationSchema
-from apiflask.validators import Range
+from apiflask.validators import Range, OneOf
 from flask import g
-from marshmallow import pre_load, post_dump
+from marshmallow import pre_load, post_dump, pre_dump
+
+from ..constant import SEARCH_MODES, COUNT_STRATEGIES
 
 
 class BaseOutSchema(Schema):
@@ -19,6 +21,44 @@ class PageSchema(Schema):
     page = Integer(load_default=1, validate=Range(min=1))  # 设置默认页面为 1
     # 将默认值设置为 20，并确保该值不超过 100
     per_page = Integer(load_default=20, validate=Range(min=1, max=200))
+    # 总数的统计方式，不传时使用接口的默认方式
+    count = String(load_default=None, validate=OneOf(COUNT_STRATEGIES))
+
+
+class BaseCursorPageOutSchema(BaseOutSchema):
+    next_cursor = String(allow_none=True)
+    total = Integer(allow_none=True)
+
+
+class CursorSchema(Schema):
+    # 传入cursor时使用游标分页，空字符串表示第一页，之后传入上一页返回的next_cursor
+    cursor = String(load_default=None)
+    # 游标分页时是否统计总数
+    with_total = Boolean(load_default=False)
+
+
+class SearchModeSchema(Schema):
+    # exact和prefix可以使用字段上的索引，contains使用三元组索引
+    search_mode = String(load_default="contains", validate=[OneOf(SEARCH_MODES)])
+
+
+class FieldsSchema(Schema):
+    # 只返回指定的字段（逗号分隔），不传时返回全部字段，id总是返回
+    fields = DelimitedList(String())
+
+
+class SparseFieldsMixin(object):
+    """
+    列表接口传入fields时只输出请求的字段。先把对象转为只含这些字段的字典再输出，
+    未请求的嵌套集合不会被访问，因此也不会触发加载
+    """
+
+    @pre_dump
+    def _select_fields(self, obj, **kwargs):
+        fields = g.get("sparse_fields")
+        if not fields or isinstance(obj, dict):
+            return obj
+        return {name: getattr(obj, name) for name in self.dump_fields if name in fields}
 
 
 class DatetimeSchema(Schema):
@@ -3,18 +3,23 @@ import logging
 from apiflask import APIBlueprint
 from apiflask import abort
 from flask.views import MethodView
+from sqlalchemy.orm import selectinload
 
 from eAuth.base.schemas import BaseOutSchema
 from eAuth.extensions import db
 from eAuth.models import Api
 from eAuth.utils.decorator import operate_log
-from eAuth.utils.model import get_page
+from eAuth.utils.model import get_page, sparse_options
+from eAuth.utils.query_budget import query_budget
+from eAuth.utils.search import search_condition
 from .schema import ApiQuerySchema, ApiPageOutputSchema, ApiInputSchema, ApiSingleOutputSchema
 
 config_api = APIBlueprint("config_api", __name__, url_prefix="/api")
 
 logger = logging.getLogger(__name__)
 
+API_COLUMNS = ("id", "url", "method", "description")
+
 
 class ApiView(MethodView):
     @config_api.input(ApiQuerySchema, location="query", arg_name="query")
@@ -22,15 +27,18 @@ class ApiView(MethodView):
     @config_api.doc(summary="获取API",
                     responses=[200, 401, 403, 404, 500],
                     security="Authorization")
+    @query_budget.limit(6)
     def get(self, api_id: int, query: dict):
         model = Api.query
         search = query.get("search")
         if search:
-            model = model.filter((Api.url.like(f"%{search}%")) | (Api.description.like(f"%{search}%")))
+            model = model.filter(search_condition(Api, ("url", "description"), search, query["search_mode"]))
         method: str = query.get("method")
         if method:
             model = model.filter(Api.method == method)
-        return get_page(model, {"id": api_id}, query["page"], query["per_page"])
+        # 一次查询加载本页所有api绑定的角色
+        options = sparse_options(Api, query.get("fields"), API_COLUMNS, {"roles": selectinload(Api.roles)})
+        return get_page(model, {"id": api_id}, query["page"], query["per_page"], query["count"], options)
 
     @operate_log
     @config_api.input(ApiInputSchema, location="json", arg_name="data")
@@ -8,14 +8,14 @@ from marshmallow.validate import Length, Regexp, OneOf
 from sqlalchemy import and_
 
 from eAuth.base.schemas import PageSchema, BasePageOutSchema, BaseOutSchema, RequestWithIdAuditLog, \
-    RequestAuditLog, ResponseGetResourceAuditLog
+    RequestAuditLog, ResponseGetResourceAuditLog, SearchModeSchema, FieldsSchema, SparseFieldsMixin
 from eAuth.extensions import db
 from eAuth.models import Api
 
 logger = logging.getLogger(__name__)
 
 
-class ApiQuerySchema(PageSchema):
+class ApiQuerySchema(PageSchema, SearchModeSchema, FieldsSchema):
     search = String(validate=[Length(max=512)])
     method = String(required=False, validate=[OneOf(("GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"))])
 
@@ -44,7 +44,7 @@ class ApiInputSchema(ApiSchema, RequestWithIdAuditLog):
     pass
 
 
-class ApiWithRolesSchema(ApiSchema):
+class ApiWithRolesSchema(SparseFieldsMixin, ApiSchema):
     roles = List(Nested("RoleSchema"))
 
 
@@ -65,7 +65,8 @@ class ApiIdListInputSchema(Schema, RequestAuditLog):
     @validates_schema
     def exists_validate(self, data, **kwargs):
         ids: list = data.get("ids")
-        ids_db = set(item[0] for item in (db.session.query(Api.id).all()))
+        # 只查询传入的id，不读取全部api
+        ids_db = set(db.session.execute(db.select(Api.id).where(Api.id.in_(set(ids)))).scalars())
         for id_ in ids:
             if id_ not in ids_db:
                 logger.info(f"[validate role-api] The api_id={id_} is not exists.")
@@ -2,19 +2,28 @@ import logging
 
 from apiflask import abort, APIBlueprint
 from flask.views import MethodView
+from sqlalchemy import delete, exists, func, insert, literal, select
+from sqlalchemy.orm import selectinload
 
 from eAuth.base.schemas import BaseOutSchema
 from eAuth.extensions import db
-from eAuth.models import Role, Api
+from eAuth.models import Role, Api, roles_apis
+from eAuth.schedule.auth import mark_auth_changes
 from eAuth.utils.decorator import operate_log
-from eAuth.utils.model import get_page
-from .schema import RoleQuerySchema, RolePageOutputSchema, RoleInputSchema, RoleSingleOutputSchema
+from eAuth.utils.model import get_page, mark_count_changes, sparse_options
+from eAuth.utils.query_budget import query_budget
+from eAuth.utils.search import search_condition
+from .schema import RoleQuerySchema, RolePageOutputSchema, RoleInputSchema, RoleSingleOutputSchema, \
+    RoleApiBindingOutputSchema
+from ..api.api import API_COLUMNS
 from ..api.schema import ApiQuerySchema, ApiPageOutputSchema, ApiIdListInputSchema
 
 config_role = APIBlueprint("config_role", __name__, url_prefix="/role")
 
 logger = logging.getLogger(__name__)
 
+ROLE_COLUMNS = ("id", "name", "description")
+
 
 class RoleView(MethodView):
     @config_role.input(RoleQuerySchema, location="query", arg_name="query")
@@ -22,12 +31,15 @@ class RoleView(MethodView):
     @config_role.doc(summary="获取角色",
                      responses=[200, 401, 403, 404, 500],
                      security="Authorization")
+    @query_budget.limit(6)
     def get(self, role_id: int, query: dict):
         model = Role.query
         search = query.get("search")
         if search:
-            model = model.filter((Role.name.like(f"%{search}%")) | (Role.description.like(f"%{search}%")))
-        return get_page(model, {"id": role_id}, query["page"], query["per_page"])
+            model = model.filter(search_condition(Role, ("name", "description"), search, query["search_mode"]))
+        # 绑定的api可能很多，只需要角色信息时传入fields跳过加载
+        options = sparse_options(Role, query.get("fields"), ROLE_COLUMNS, {"apis": selectinload(Role.apis)})
+        return get_page(model, {"id": role_id}, query["page"], query["per_page"], query["count"], options)
 
     @operate_log
     @config_role.input(RoleInputSchema, location="json", arg_name="data")
@@ -93,75 +105,88 @@ config_role.add_url_rule("/<int:role_id>", view_func=role_view, methods=["GET",
 @config_role.doc(summary="查询角色未绑定的API列表",
                  responses=[200, 401, 403, 404, 500],
                  security="Authorization")
+@query_budget.limit(7)
 def get_role_unbind_api(role_id: int, query: dict):
-    role: Role = Role.query.get_or_404(role_id)
-    model = Api.query.filter(~Api.id.in_(item.id for item in role.apis))
+    if db.session.get(Role, role_id) is None:
+        abort(404)
+    # 关联子查询由数据库判断是否已绑定，不在内存中拼接全部已绑定的id
+    model = Api.query.filter(~exists().where(roles_apis.c.role_id == role_id, roles_apis.c.api_id == Api.id))
     search = query.get("search")
     if search:
-        model = model.filter((Api.url.like(f"%{search}%")) | (Api.description.like(f"%{search}%")))
+        model = model.filter(search_condition(Api, ("url", "description"), search, query["search_mode"]))
     method: str = query.get("method")
     if method:
         model = model.filter(Api.method == method)
-    result = get_page(model, {}, query["page"], query["per_page"], role_id=role_id)
+    options = sparse_options(Api, query.get("fields"), API_COLUMNS, {"roles": selectinload(Api.roles)})
+    result = get_page(model, {}, query["page"], query["per_page"], query["count"], options, role_id=role_id)
     return result
 
 
+def role_binding_response(role: Role, count: int) -> dict:
+    """
+    绑定、解绑api后的响应，只统计绑定的api数量
+    """
+    api_count = db.session.execute(
+        select(func.count()).select_from(roles_apis).where(roles_apis.c.role_id == role.id)).scalar()
+    return {
+        "data": {"id": role.id, "name": role.name, "description": role.description, "api_count": api_count},
+        "count": count
+    }
+
+
 @config_role.put("/<int:role_id>/api")
 @operate_log
 @config_role.input(ApiIdListInputSchema, location="json", arg_name="data")
-@config_role.output(RoleSingleOutputSchema, status_code=201)
+@config_role.output(RoleApiBindingOutputSchema, status_code=201)
 @config_role.doc(summary="为角色绑定api",
                  responses=[201, 401, 403, 404, 500],
                  security="Authorization")
+@query_budget.limit(10)
 def role_add_api(role_id: int, data: dict):
     # 查询角色
     role: Role = Role.query.get_or_404(role_id)
-    # 筛选出需要添加的API id列表
     ids = set(data["ids"])
-    current_ids = set(api.id for api in role.apis)
-    add_ids = list()
-    for id_ in ids:
-        if id_ not in current_ids:
-            add_ids.append(id_)
-    logger.info(f"[role-api] Role `{role.name}` will add api {add_ids}")
+    logger.info(f"[role-api] Role `{role.name}` will add {len(ids)} apis")
     try:
-        # 为角色添加API
-        api_add_list = Api.query.filter(Api.id.in_(add_ids)).all()
-        role.apis.extend(api_add_list)
+        # 在数据库中筛选出未绑定的api并写入，不加载角色已绑定的api
+        bound = exists().where(roles_apis.c.role_id == role_id, roles_apis.c.api_id == Api.id)
+        result = db.session.execute(insert(roles_apis).from_select(
+            ["role_id", "api_id"], select(literal(role_id), Api.id).where(Api.id.in_(ids), ~bound)))
+        # 直接写入关联表不会触发ORM事件，需要登记变更
+        mark_auth_changes(db.session, role_ids=[role_id])
+        mark_count_changes(db.session, Role.__tablename__, Api.__tablename__)
+        response = role_binding_response(role, result.rowcount)
         db.session.commit()
     except:
         logger.error("[role-api] Update failed", exc_info=True)
         db.session.rollback()
         abort(500, message="server error")
-    return {
-        "data": role
-    }
+    return response
 
 
 @config_role.delete("/<int:role_id>/api")
 @operate_log
 @config_role.input(ApiIdListInputSchema, location="json", arg_name="data")
-@config_role.output(RoleSingleOutputSchema, status_code=201)
+@config_role.output(RoleApiBindingOutputSchema, status_code=201)
 @config_role.doc(summary="为角色解绑api",
                  responses=[201, 401, 403, 404, 500],
                  security="Authorization")
+@query_budget.limit(10)
 def role_remove_api(role_id: int, data: dict):
     # 查询角色
     role: Role = Role.query.get_or_404(role_id)
-    # 筛选出需要删除的API id列表
     ids = set(data["ids"])
-    current_apis = role.apis.copy()
-    for api in role.apis:
-        if api.id in ids:
-            current_apis.remove(api)
-    logger.info(f"[role-api] Role `{role.name}` will set apis={[api.id for api in current_apis]}")
+    logger.info(f"[role-api] Role `{role.name}` will remove {len(ids)} apis")
     try:
-        role.apis = current_apis
+        result = db.session.execute(
+            delete(roles_apis).where(roles_apis.c.role_id == role_id, roles_apis.c.api_id.in_(ids)))
+        # 直接删除关联表的记录不会触发ORM事件，需要登记变更
+        mark_auth_changes(db.session, role_ids=[role_id])
+        mark_count_changes(db.session, Role.__tablename__, Api.__tablename__)
+        response = role_binding_response(role, result.rowcount)
         db.session.commit()
     except:
         logger.error("[role-api] Delete failed", exc_info=True)
         db.session.rollback()
         abort(500, message="server error")
-    return {
-        "data": role
-    }
+    return response
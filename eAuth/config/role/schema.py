@@ -8,14 +8,14 @@ from marshmallow.validate import Length
 from sqlalchemy import and_
 
 from eAuth.base.schemas import PageSchema, BasePageOutSchema, BaseOutSchema, RequestAuditLog, \
-    RequestWithIdAuditLog, ResponseGetResourceAuditLog
+    RequestWithIdAuditLog, ResponseGetResourceAuditLog, SearchModeSchema, FieldsSchema, SparseFieldsMixin
 from eAuth.extensions import db
 from eAuth.models import Role
 
 logger = logging.getLogger(__name__)
 
 
-class RoleQuerySchema(PageSchema):
+class RoleQuerySchema(PageSchema, SearchModeSchema, FieldsSchema):
     search = String(validate=[Length(max=512)])
 
 
@@ -39,10 +39,22 @@ class RoleInputSchema(RoleSchema, RequestWithIdAuditLog):
     pass
 
 
-class RoleWithApisSchema(RoleSchema):
+class RoleWithApisSchema(SparseFieldsMixin, RoleSchema):
     apis = List(Nested("ApiSchema"))
 
 
+class RoleWithApiCountSchema(RoleSchema):
+    api_count = Integer()
+
+
+class RoleApiBindingOutputSchema(BaseOutSchema, ResponseGetResourceAuditLog):
+    """
+    角色绑定、解绑api的输出模型，只返回绑定的api数量，不返回全部api
+    """
+    data = Nested(RoleWithApiCountSchema)
+    count = Integer()  # 本次新增或删除的绑定数
+
+
 class RolePageOutputSchema(BasePageOutSchema):
     data = List(Nested(RoleWithApisSchema))
 
@@ -69,7 +81,8 @@ class RoleIdListInputSchema(Schema, RequestAuditLog):
     @validates_schema
     def exists_validate(self, data, **kwargs):
         ids: list = data.get("ids")
-        ids_db = set(item[0] for item in (db.session.query(Role.id).all()))
+        # 只查询传入的id，不读取全部角色
+        ids_db = set(db.session.execute(db.select(Role.id).where(Role.id.in_(set(ids)))).scalars())
         for id_ in ids:
             if id_ not in ids_db:
                 logger.info(f"[validate user-role] The role_id={id_} is not exists.")
@@ -1,17 +1,18 @@
 import logging
 
 from apiflask import abort, HTTPError, APIBlueprint
-from flask import g
 from flask.views import MethodView
-from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 
 from eAuth.base.schemas import BaseOutSchema
 from eAuth.extensions import db
 from eAuth.models import User, Role
-from eAuth.utils.auth import required_admin, generate_random_password, logout_user
+from eAuth.utils.auth import required_admin, generate_random_password, logout_user, get_current_user
 from eAuth.utils.decorator import operate_log, security_log
 from eAuth.utils.message import message_util
-from eAuth.utils.model import get_page
+from eAuth.utils.model import get_page, sparse_options
+from eAuth.utils.query_budget import query_budget
+from eAuth.utils.search import search_condition
 from .schema import UserQuerySchema, UserPageOutputSchema, UserInputSchema, UserSingleOutputSchema, \
     RegisterInputSchema, ResetPasswordInputSchema, ChangePasswordInputSchema
 from ..role.schema import RoleIdListInputSchema, RoleLightOutputSchema
@@ -20,6 +21,9 @@ config_user = APIBlueprint("config_user", __name__, url_prefix="/user")
 
 logger = logging.getLogger(__name__)
 
+# 列表输出的列，不读取口令哈希等其他列
+USER_COLUMNS = ("id", "username", "email", "locked")
+
 
 class UserView(MethodView):
     @config_user.input(UserQuerySchema, location="query", arg_name="query")
@@ -27,14 +31,14 @@ class UserView(MethodView):
     @config_user.doc(summary="获取用户",
                      responses=[200, 401, 403, 404, 500],
                      security="Authorization")
+    @query_budget.limit(6)
     def get(self, uid: int, query: dict):
         model = User.query
         if query.get("username"):
-            model = model.filter(or_(
-                User.username.like(f"%{query.get('username')}%"),
-                User.email.like(f"%{query.get('username')}%")
-            ))
-        return get_page(model, {"id": uid}, query["page"], query["per_page"])
+            model = model.filter(search_condition(User, ("username", "email"), query["username"], query["search_mode"]))
+        # 一次查询加载本页所有用户的角色
+        options = sparse_options(User, query.get("fields"), USER_COLUMNS, {"roles": selectinload(User.roles)})
+        return get_page(model, {"id": uid}, query["page"], query["per_page"], query["count"], options)
 
     @operate_log
     @config_user.input(UserInputSchema, location="json", arg_name="data")
@@ -182,7 +186,7 @@ def reset(data):
                  security="Authorization")
 def change_password(data):
     new_password: str = data['new_password']
-    user: User = g.get('user')
+    user: User = get_current_user()
     try:
         user.set_password(new_password)
         db.session.commit()
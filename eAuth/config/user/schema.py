@@ -1,14 +1,14 @@
 from apiflask import Schema
-from flask import g
 from marshmallow import validates_schema, ValidationError, validates
 from marshmallow.fields import String, Integer, Boolean, List, Nested
 from marshmallow.validate import Length, Email
 from sqlalchemy import or_
 
 from eAuth.base.schemas import PageSchema, BasePageOutSchema, BaseOutSchema, RequestAuditLog, \
-    ResponseGetResourceAuditLog
+    ResponseGetResourceAuditLog, SearchModeSchema, FieldsSchema, SparseFieldsMixin
 from eAuth.extensions import db
 from eAuth.models import User
+from eAuth.utils.auth import get_current_user
 
 
 class UserSchema(Schema):
@@ -22,11 +22,11 @@ class UserInputSchema(UserSchema, RequestAuditLog):
     pass
 
 
-class UserWithRolesSchema(UserSchema):
+class UserWithRolesSchema(SparseFieldsMixin, UserSchema):
     roles = List(Nested("RoleSchema"))
 
 
-class UserQuerySchema(PageSchema):
+class UserQuerySchema(PageSchema, SearchModeSchema, FieldsSchema):
     username = String(validate=[Length(min=0, max=20)])
 
 
@@ -70,7 +70,7 @@ class ChangePasswordInputSchema(Schema):
         if new_password != new_password_confirm:
             raise ValidationError("The confirmed password is different from the password.")
 
-        user = g.get('user')
+        user = get_current_user()
         password: str = data.get("password")
         if not (user and user.validate_password(password)):
             raise ValidationError("The password is incorrect.")
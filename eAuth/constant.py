@@ -1,15 +1,26 @@
 CACHE_PREFIX_ROLE = "cache_role"
-CACHE_PREFIX_API = "cache_api"
-CACHE_PREFIX_ROLE_TO_API = "cache_role_to_api"
-CACHE_PREFIX_USER_TO_ROLE = "cache_user_to_role"
+CACHE_PREFIX_IDENTITY = "cache_identity"
+# 用户鉴权纪元，角色、锁定状态、密码变更或注销时更新
+CACHE_PREFIX_AUTHZ_EPOCH = "cache_authz_epoch"
 # 注销缓存
 CACHE_PREFIX_LOGOUT = "cache_logout"
 CACHE_TIME_LOGOUT_DELAY = 30
 
 # 缓存设置
+# 全量刷新鉴权快照的间隔。事件增量刷新只发生在提交变更的进程中，其它工作进程依靠全量刷新，
+# 间隔即为权限变更（如收回角色）在其它进程生效的最长滞后
 CACHE_TIME_AUTH = 10 * 60
-CACHE_TIME_AUTH_DELAY = 30
-CACHE_TIME_USER = 5 * 60
+CACHE_TIME_IDENTITY = 60  # 用户变更时会主动失效，有效期只是兜底
+# 只在当前进程中有效的缓存类型，不能用于需要跨工作进程同步的数据
+PROCESS_LOCAL_CACHE_TYPES = ('simplecache', 'nullcache', 'simple', 'null')
+CACHE_PREFIX_COUNT = "cache_count"
+CACHE_TIME_COUNT = 60  # 缓存的分页总数的有效期，表有变更时主动失效
+
+# 分页总数的统计方式
+COUNT_STRATEGIES = ('exact', 'cached', 'estimate', 'none')
+
+# 搜索方式：精确、前缀、子串
+SEARCH_MODES = ('exact', 'prefix', 'contains')
 
 # 支持的HTTP方法
 HTTP_METHODS = (
@@ -1,4 +1,6 @@
-from flask import request
+from typing import Optional
+
+from flask import request, Request
 from flask_apscheduler import APScheduler
 from flask_caching import Cache
 from flask_cors import CORS
@@ -8,10 +10,12 @@ from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
 
-def get_ipaddr():
-    xff = request.headers.get("X-Forwarded-For", "")
+def get_ipaddr(req: Optional[Request] = None):
+    if req is None:
+        req = request
+    xff = req.headers.get("X-Forwarded-For", "")
     client_ip = xff.split(",")[-1].strip()
-    return client_ip or request.headers.get("X-Real-Ip") or request.remote_addr or '127.0.0.1'
+    return client_ip or req.headers.get("X-Real-Ip") or req.remote_addr or '127.0.0.1'
 
 
 db = SQLAlchemy()
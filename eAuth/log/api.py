@@ -1,57 +1,162 @@
 import logging
+from datetime import datetime
 
 from apiflask import APIBlueprint
+from flask import Response, stream_with_context, current_app
+from flask_sqlalchemy.query import Query
+from sqlalchemy import func, select
 
-from .models import OperateLog, SecurityLog
-from .schemas import OperateLogPageOutputSchema, OperateLogSchema, SecurityLogSchema, SecurityLogPageOutputSchema
-from ..base.schemas import PageSchema, DatetimeSchema
-from ..utils.model import get_page
+from .models import OperateLog, SecurityLog, ROLLUPS
+from .schemas import OperateLogPageOutputSchema, OperateLogSchema, SecurityLogSchema, SecurityLogPageOutputSchema, \
+    ExportSchema, LogStatsQuerySchema, LogStatsOutputSchema, STATS_DIMENSIONS
+from ..base.schemas import PageSchema, DatetimeSchema, CursorSchema, SearchModeSchema
+from ..extensions import db
+from ..utils.export import export_stream, MIMETYPES
+from ..utils.model import get_page, get_cursor_page
+from ..utils.query_budget import query_budget
+from ..utils.search import search_condition
+from ..utils.serializer import fast_output
 
 log_api = APIBlueprint("log", __name__, url_prefix="/api/log")
 logger = logging.getLogger(__name__)
 
+# 模糊查询的字段，其余字段精确查询
+OPERATE_LOG_LIKE_FIELDS = ("username", "ip_addr", "operate_api")
+SECURITY_LOG_LIKE_FIELDS = ("username", "ip_addr", "operate")
 
-@log_api.get('/operate-log')
-@log_api.input(OperateLogSchema, location="query", arg_name="operate_log")
-@log_api.input(DatetimeSchema, location='query', arg_name='between')
-@log_api.input(PageSchema, location="query", arg_name="page")
-@log_api.output(OperateLogPageOutputSchema)
-def query_operate_log(operate_log: dict, between: dict, page: dict):
-    query = OperateLog.query.order_by(OperateLog.operate_datetime.desc())
+
+def build_log_query(model, like_query_fields: tuple, conditions: dict, between: dict,
+                    search_mode: str = "contains") -> tuple[Query, dict]:
+    """
+    根据查询条件构建日志查询，列表、导出接口与命令行共用
+
+    :param model: OperateLog或SecurityLog
+    :param like_query_fields: 模糊查询的字段
+    :param conditions: 字段 -> 查询值
+    :param between: 起止时间
+    :param search_mode: 模糊查询的方式
+    :return: (按时间倒序的查询, 精确查询条件)
+    """
+    query = model.query.order_by(model.operate_datetime.desc())
     start_datetime = between.get("start_datetime")
     end_datetime = between.get("end_datetime")
     if start_datetime:
-        query = query.filter(OperateLog.operate_datetime >= start_datetime)
+        query = query.filter(model.operate_datetime >= start_datetime)
     if end_datetime:
-        query = query.filter(OperateLog.operate_datetime <= end_datetime)
+        query = query.filter(model.operate_datetime <= end_datetime)
     # 精确查询
-    like_query_fields = ("username", "ip_addr", "operate_api")
-    equal_query_condition = {k: v for k, v in operate_log.items() if k not in like_query_fields}
-    # 模糊查询
+    equal_query_condition = {k: v for k, v in conditions.items() if k not in like_query_fields}
+    # 模糊查询，默认使用三元组索引查询子串
     for field in like_query_fields:
-        if operate_log.get(field):
-            query = query.filter(getattr(OperateLog, field).like(f"%{operate_log.get(field)}%"))
-    return get_page(query, equal_query_condition, page["page"], page["per_page"])
+        if conditions.get(field):
+            query = query.filter(search_condition(model, (field,), conditions.get(field), search_mode))
+    return query, equal_query_condition
+
+
+def export_log_response(model, query: Query, equal_query_condition: dict, export: dict) -> Response:
+    query = query.filter_by(**{k: v for k, v in equal_query_condition.items() if v is not None})
+    stream = export_stream(query, list(model.__table__.columns), export["format"], export["gzip"],
+                           current_app.config.get("LOG_EXPORT_BATCH_SIZE", 1000))
+    filename = f"{model.__tablename__}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export['format']}"
+    if export["gzip"]:
+        filename += ".gz"
+    mimetype = "application/gzip" if export["gzip"] else MIMETYPES[export["format"]]
+    logger.info(f"[export] Export {model.__tablename__} as {filename}")
+    return Response(stream_with_context(stream), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+@log_api.get('/operate-log')
+@log_api.input(OperateLogSchema, location="query", arg_name="operate_log")
+@log_api.input(DatetimeSchema, location='query', arg_name='between')
+@log_api.input(PageSchema, location="query", arg_name="page")
+@log_api.input(CursorSchema, location="query", arg_name="cursor")
+@log_api.input(SearchModeSchema, location="query", arg_name="search")
+@log_api.output(OperateLogPageOutputSchema)
+@fast_output(OperateLogPageOutputSchema)
+@query_budget.limit(5)
+def query_operate_log(operate_log: dict, between: dict, page: dict, cursor: dict, search: dict):
+    query, equal_query_condition = build_log_query(OperateLog, OPERATE_LOG_LIKE_FIELDS, operate_log, between,
+                                                   search["search_mode"])
+    if cursor["cursor"] is not None:
+        # 游标分页，翻页深度不影响查询耗时
+        return get_cursor_page(query, equal_query_condition, OperateLog.operate_datetime, OperateLog.id,
+                               cursor["cursor"], page["per_page"], cursor["with_total"])
+    return get_page(query, equal_query_condition, page["page"], page["per_page"], page["count"])
 
 
 @log_api.get("/security-log")
 @log_api.input(SecurityLogSchema, location="query", arg_name="security_log")
 @log_api.input(DatetimeSchema, location="query", arg_name="between")
 @log_api.input(PageSchema, location="query", arg_name="page")
+@log_api.input(CursorSchema, location="query", arg_name="cursor")
+@log_api.input(SearchModeSchema, location="query", arg_name="search")
 @log_api.output(SecurityLogPageOutputSchema)
-def query_security_log(security_log: dict, between: dict, page: dict):
-    query = SecurityLog.query.order_by(SecurityLog.operate_datetime.desc())
+@fast_output(SecurityLogPageOutputSchema)
+@query_budget.limit(5)
+def query_security_log(security_log: dict, between: dict, page: dict, cursor: dict, search: dict):
+    query, equal_query_condition = build_log_query(SecurityLog, SECURITY_LOG_LIKE_FIELDS, security_log, between,
+                                                   search["search_mode"])
+    if cursor["cursor"] is not None:
+        # 游标分页，翻页深度不影响查询耗时
+        return get_cursor_page(query, equal_query_condition, SecurityLog.operate_datetime, SecurityLog.id,
+                               cursor["cursor"], page["per_page"], cursor["with_total"])
+    return get_page(query, equal_query_condition, page["page"], page["per_page"], page["count"])
+
+
+@log_api.get('/operate-log/export')
+@log_api.input(OperateLogSchema, location="query", arg_name="operate_log")
+@log_api.input(DatetimeSchema, location='query', arg_name='between')
+@log_api.input(SearchModeSchema, location="query", arg_name="search")
+@log_api.input(ExportSchema, location="query", arg_name="export")
+@log_api.doc(summary="按查询条件流式导出操作日志（NDJSON或CSV，可gzip压缩）", responses=[200, 401, 403, 422],
+             security="Authorization")
+def export_operate_log(operate_log: dict, between: dict, search: dict, export: dict):
+    query, equal_query_condition = build_log_query(OperateLog, OPERATE_LOG_LIKE_FIELDS, operate_log, between,
+                                                   search["search_mode"])
+    return export_log_response(OperateLog, query, equal_query_condition, export)
+
+
+@log_api.get('/security-log/export')
+@log_api.input(SecurityLogSchema, location="query", arg_name="security_log")
+@log_api.input(DatetimeSchema, location='query', arg_name='between')
+@log_api.input(SearchModeSchema, location="query", arg_name="search")
+@log_api.input(ExportSchema, location="query", arg_name="export")
+@log_api.doc(summary="按查询条件流式导出安全日志（NDJSON或CSV，可gzip压缩）", responses=[200, 401, 403, 422],
+             security="Authorization")
+def export_security_log(security_log: dict, between: dict, search: dict, export: dict):
+    query, equal_query_condition = build_log_query(SecurityLog, SECURITY_LOG_LIKE_FIELDS, security_log, between,
+                                                   search["search_mode"])
+    return export_log_response(SecurityLog, query, equal_query_condition, export)
+
+
+@log_api.get('/stats')
+@log_api.input(LogStatsQuerySchema, location="query", arg_name="query")
+@log_api.input(DatetimeSchema, location='query', arg_name='between')
+@log_api.output(LogStatsOutputSchema)
+@log_api.doc(summary="审计日志统计，基于按小时汇总的数据，按指定维度分组返回日志数",
+             responses=[200, 401, 403, 422],
+             security="Authorization")
+@fast_output(LogStatsOutputSchema)
+@query_budget.limit(3)
+def log_stats(query: dict, between: dict):
+    model = OperateLog if query["type"] == "operate" else SecurityLog
+    rollup_model, _ = ROLLUPS[model]
+    columns = [getattr(rollup_model, field) for field in dict.fromkeys(query["group_by"])]
+    total = func.sum(rollup_model.count).label("count")
+    statement = select(*columns, total).group_by(*columns).limit(query["limit"])
+    # 按小时分组时按时间排列，否则按日志数从多到少排列
+    if "hour" in query["group_by"]:
+        statement = statement.order_by(rollup_model.hour, total.desc())
+    else:
+        statement = statement.order_by(total.desc())
     start_datetime = between.get("start_datetime")
     end_datetime = between.get("end_datetime")
     if start_datetime:
-        query = query.filter(SecurityLog.operate_datetime >= start_datetime)
+        statement = statement.where(rollup_model.hour >= start_datetime.replace(minute=0, second=0, microsecond=0))
     if end_datetime:
-        query = query.filter(SecurityLog.operate_datetime <= end_datetime)
-    # 精确查询
-    like_query_fields = ("username", "ip_addr", "operate")
-    equal_query_condition = {k: v for k, v in security_log.items() if k not in like_query_fields}
-    # 模糊查询
-    for field in like_query_fields:
-        if security_log.get(field):
-            query = query.filter(getattr(SecurityLog, field).like(f"%{security_log.get(field)}%"))
-    return get_page(query, equal_query_condition, page["page"], page["per_page"])
+        statement = statement.where(rollup_model.hour <= end_datetime)
+    for field in STATS_DIMENSIONS[query["type"]]:
+        if field in query:
+            statement = statement.where(getattr(rollup_model, field) == query[field])
+    return {"data": db.session.execute(statement).mappings().all()}
@@ -1,15 +1,21 @@
 from datetime import datetime
 
 from ..extensions import db
+from ..utils.search import register as register_search
 
 
 class OperateLog(db.Model):
     """
     操作日志
     """
+    __table_args__ = (
+        # 按操作人查询并按时间倒序分页，同时覆盖只按操作人的查询
+        db.Index("ix_operate_log_username_datetime", "username", "operate_datetime"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     # 操作人
-    username = db.Column(db.String(32), index=True)
+    username = db.Column(db.String(32))
     # 客户端标识
     ip_addr = db.Column(db.String(64), index=True)
     # 操作类型 GET/POST/...
@@ -34,9 +40,14 @@ class SecurityLog(db.Model):
     """
     安全日志
     """
+    __table_args__ = (
+        # 登录时查询用户最近一次失败的记录，索引覆盖过滤条件和排序，同时覆盖只按用户名的查询
+        db.Index("ix_security_log_username_success_datetime", "username", "success", "operate_datetime"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     # 登录用户
-    username = db.Column(db.String(32), index=True)
+    username = db.Column(db.String(32))
     # 客户端标识
     ip_addr = db.Column(db.String(64), index=True)
     # 操作
@@ -45,3 +56,45 @@ class SecurityLog(db.Model):
     success = db.Column(db.Boolean)
     # 操作时间
     operate_datetime = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class OperateLogHourly(db.Model):
+    """
+    操作日志按小时汇总，由定时任务根据原始日志重新计算
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # 所在小时
+    hour = db.Column(db.DateTime, index=True)
+    username = db.Column(db.String(32))
+    ip_addr = db.Column(db.String(64))
+    operate_type = db.Column(db.String(16))
+    operate_api = db.Column(db.String(256))
+    status_code = db.Column(db.Integer)
+    success = db.Column(db.Boolean)
+    # 日志数
+    count = db.Column(db.Integer)
+
+
+class SecurityLogHourly(db.Model):
+    """
+    安全日志按小时汇总，由定时任务根据原始日志重新计算
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # 所在小时
+    hour = db.Column(db.DateTime, index=True)
+    username = db.Column(db.String(32))
+    ip_addr = db.Column(db.String(64))
+    operate = db.Column(db.String(32))
+    success = db.Column(db.Boolean)
+    # 日志数
+    count = db.Column(db.Integer)
+
+
+# 原始日志 -> (汇总表, 汇总的维度)
+ROLLUPS = {
+    OperateLog: (OperateLogHourly, ("username", "ip_addr", "operate_type", "operate_api", "status_code", "success")),
+    SecurityLog: (SecurityLogHourly, ("username", "ip_addr", "operate", "success")),
+}
+
+register_search(OperateLog, "username", "ip_addr", "operate_api")
+register_search(SecurityLog, "username", "ip_addr", "operate")
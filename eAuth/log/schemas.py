@@ -1,10 +1,12 @@
 from apiflask import Schema
-from apiflask.fields import String, Integer, Boolean, DateTime, List, Nested
+from apiflask.fields import String, Integer, Boolean, DateTime, List, Nested, DelimitedList
 from apiflask.validators import Length, Regexp, OneOf, Range
+from marshmallow import validates_schema, ValidationError
 
-from ..base.schemas import BasePageOutSchema
+from ..base.schemas import BasePageOutSchema, BaseCursorPageOutSchema, BaseOutSchema
 from ..base.validators import IP
 from ..constant import HTTP_METHODS
+from ..utils.export import EXPORT_FORMATS
 
 
 class OperateLogSchema(Schema):
@@ -23,7 +25,7 @@ class OperateLogSchema(Schema):
     operate_datetime = DateTime(format='%Y-%m-%d %H:%M:%S', dump_only=True)
 
 
-class OperateLogPageOutputSchema(BasePageOutSchema):
+class OperateLogPageOutputSchema(BasePageOutSchema, BaseCursorPageOutSchema):
     data = List(Nested(OperateLogSchema))
 
 
@@ -36,5 +38,57 @@ class SecurityLogSchema(Schema):
     operate_datetime = DateTime(format='%Y-%m-%d %H:%M:%S', dump_only=True)
 
 
-class SecurityLogPageOutputSchema(BasePageOutSchema):
+class SecurityLogPageOutputSchema(BasePageOutSchema, BaseCursorPageOutSchema):
     data = List(Nested(SecurityLogSchema))
+
+
+class ExportSchema(Schema):
+    format = String(load_default="ndjson", validate=[OneOf(EXPORT_FORMATS)])
+    gzip = Boolean(load_default=False)
+
+
+# 日志类型 -> 可以分组和过滤的维度
+STATS_DIMENSIONS = {
+    "operate": ("username", "ip_addr", "operate_type", "operate_api", "status_code", "success"),
+    "security": ("username", "ip_addr", "operate", "success"),
+}
+
+
+class LogStatsQuerySchema(Schema):
+    type = String(required=True, validate=[OneOf(tuple(STATS_DIMENSIONS))])
+    # 分组的维度，逗号分隔，hour表示按小时分组
+    group_by = DelimitedList(String(), load_default=["hour"])
+    username = String(validate=[Length(max=32)])
+    ip_addr = String(validate=[Length(max=64)])
+    operate = String(validate=[Length(max=32)])
+    operate_type = String(validate=[OneOf(HTTP_METHODS)])
+    operate_api = String(validate=[Length(max=256)])
+    status_code = Integer(validate=[Range(min=100, max=599)])
+    success = Boolean()
+    limit = Integer(load_default=1000, validate=Range(min=1, max=10000))
+
+    @validates_schema
+    def dimension_validate(self, data, **kwargs):
+        dimensions = STATS_DIMENSIONS[data["type"]]
+        for field in data["group_by"]:
+            if field != "hour" and field not in dimensions:
+                raise ValidationError(f"Invalid group_by field: {field}", field_name="group_by")
+        for field in ("username", "ip_addr", "operate", "operate_type", "operate_api", "status_code", "success"):
+            if field in data and field not in dimensions:
+                raise ValidationError(f"Unsupported filter for {data['type']} log", field_name=field)
+
+
+class LogStatsSchema(Schema):
+    hour = DateTime(format='%Y-%m-%d %H:%M:%S')
+    username = String()
+    ip_addr = String()
+    operate = String()
+    operate_type = String()
+    operate_api = String()
+    status_code = Integer()
+    success = Boolean()
+    count = Integer()
+
+
+class LogStatsOutputSchema(BaseOutSchema):
+    data = List(Nested(LogStatsSchema))
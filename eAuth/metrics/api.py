@@ -0,0 +1,19 @@
+from apiflask import APIBlueprint, abort
+from flask import Response
+
+from ..utils.auth import required_admin
+from ..utils.metrics import metrics
+
+metrics_api = APIBlueprint("metrics", __name__, url_prefix="/api/metrics")
+
+
+@metrics_api.get("")
+@metrics_api.doc(summary="Prometheus文本格式的指标：请求及认证、鉴权、审计各阶段的耗时分布，缓存命中次数。"
+                         "仅管理员可访问，METRICS_ENABLED关闭时返回404",
+                 responses=[200, 401, 403, 404],
+                 security="Authorization")
+@required_admin
+def get_metrics():
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
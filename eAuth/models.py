@@ -1,27 +1,34 @@
 import logging
-import re
 import time
+from typing import NamedTuple, Optional
 from urllib.parse import urlparse
 
 from authlib.jose import jwt
 from flask import current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 
-from eAuth.constant import CACHE_PREFIX_USER_TO_ROLE, CACHE_TIME_USER, CACHE_PREFIX_ROLE_TO_API, CACHE_PREFIX_API
+from eAuth.constant import CACHE_PREFIX_IDENTITY, CACHE_TIME_IDENTITY, CACHE_PREFIX_AUTHZ_EPOCH
 from eAuth.extensions import db, cache
+from eAuth.utils.metrics import metrics
+from eAuth.utils.password import password_hasher
+from eAuth.utils.permission import permission_store
+from eAuth.utils.route import RouteTrie, compile_url, match_any
+from eAuth.utils.search import register as register_search
 
 logger = logging.getLogger(__name__)
 
+# 复合主键保证绑定关系不重复，并覆盖按第一列的查询；按第二列反查（api->角色、角色->用户）使用单独的索引
 roles_apis = db.Table(
     'roles_apis',
-    db.Column('role_id', db.Integer, db.ForeignKey('role.id', ondelete='CASCADE')),
-    db.Column('api_id', db.Integer, db.ForeignKey('api.id', ondelete='CASCADE'))
+    db.Column('role_id', db.Integer, db.ForeignKey('role.id', ondelete='CASCADE'), nullable=False),
+    db.Column('api_id', db.Integer, db.ForeignKey('api.id', ondelete='CASCADE'), nullable=False, index=True),
+    db.PrimaryKeyConstraint('role_id', 'api_id', name='pk_roles_apis')
 )
 
 users_roles = db.Table(
     'users_roles',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('role_id', db.Integer, db.ForeignKey('role.id'))
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), nullable=False),
+    db.Column('role_id', db.Integer, db.ForeignKey('role.id'), nullable=False, index=True),
+    db.PrimaryKeyConstraint('user_id', 'role_id', name='pk_users_roles')
 )
 
 
@@ -51,6 +58,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(256))
     locked = db.Column(db.Boolean, default=False)  # 账号是否被锁定/冻结
     login_incorrect = db.Column(db.Integer, default=0)  # 登录错误次数
+    last_login_incorrect = db.Column(db.DateTime)  # 最近一次登录错误的时间，用于短期锁定
     email = db.Column(db.String(320), unique=True, nullable=False)
 
     # 关联角色
@@ -60,10 +68,13 @@ class User(db.Model):
         super().__init__(*args, **kwargs)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.generate(password)
 
     def validate_password(self, password) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
+
+    def password_needs_rehash(self) -> bool:
+        return password_hasher.needs_rehash(self.password_hash)
 
     @property
     def auth_token(self):
@@ -75,6 +86,11 @@ class User(db.Model):
             "iat": now,
             "exp": now + current_app.config.get("TOKEN_EXPIRED", 60 * 60)
         }
+        if current_app.config.get("TOKEN_EMBED_ROLES", False):
+            # 先取纪元再取身份，期间发生变更时纪元不一致，token只会走慢路径而不会携带过期的角色
+            epoch = get_authz_epoch(self.id) or bump_authz_epoch(self.id)
+            payload["rids"] = sorted(get_identity(self.id, self).role_ids)
+            payload["aep"] = epoch
         return jwt.encode(header, payload, current_app.config["SECRET_KEY"]).decode()
 
     def lock(self):
@@ -95,6 +111,61 @@ class User(db.Model):
     def is_locked(self):
         return self.locked
 
+    @property
+    def identity(self) -> "Identity":
+        return Identity(
+            id=self.id,
+            username=self.username,
+            locked=bool(self.locked),
+            role_ids=frozenset(role.id for role in self.roles),
+            is_admin=self.username == "admin"
+        )
+
+    def get_role_tries(self) -> list[RouteTrie]:
+        """
+        获取用户所有角色的api前缀树，需要多次鉴权时只获取一次
+
+        :return:
+        """
+        return get_identity(self.id, self).get_role_tries()
+
+    def can(self, url: str, method: str):
+        """
+        鉴权
+
+        :param url:
+        :param method:
+        :return:
+        """
+        return get_identity(self.id, self).can(url, method)
+
+
+class Identity(NamedTuple):
+    """
+    缓存的用户身份，认证和鉴权只需要这些信息，不必查询数据库
+    """
+    id: int
+    username: str
+    locked: bool
+    role_ids: frozenset[int]
+    is_admin: bool
+
+    @property
+    def is_locked(self):
+        return self.locked
+
+    def get_role_tries(self) -> list[RouteTrie]:
+        """
+        获取用户所有角色的api前缀树，需要多次鉴权时只获取一次
+
+        :return:
+        """
+        snapshot = permission_store.snapshot
+        if snapshot is None:
+            logger.warning("[can] The permission snapshot is not published yet")
+            return []
+        return snapshot.get_role_tries(self.role_ids)
+
     def can(self, url: str, method: str):
         """
         鉴权
@@ -103,40 +174,80 @@ class User(db.Model):
         :param method:
         :return:
         """
-        # 获取user对应的role列表
-        role_ids = cache.get(f"{CACHE_PREFIX_USER_TO_ROLE}_{self.id}")
-        if role_ids is None:
-            logger.info(f"[can] Get cache for user {self.id}->{self.username}")
-            # 无缓存，读数据库并加入缓存
-            role_ids = set(role.id for role in self.roles)
-            cache.set(f"{CACHE_PREFIX_USER_TO_ROLE}_{self.id}", role_ids, CACHE_TIME_USER)
-        logger.info(f"[can] Get role_ids: `{role_ids}`")
-
-        # 从role列表中提取api列表
-        api_set: set[int] = set()
-        for role_id in role_ids:
-            apis = cache.get(f"{CACHE_PREFIX_ROLE_TO_API}_{role_id}")
-            if apis:
-                api_set.update(apis)
-        logger.info(f"[can] Get api_ids: `{api_set}`")
-        # 匹配api，鉴权
-        for api_id in api_set:
-            api = cache.get(f"{CACHE_PREFIX_API}_{api_id}")
-            if not api:
-                continue
-            if method.upper() == api.method and url_match(url, api.url):
-                return True
+        # 在各角色的api前缀树中匹配，鉴权
+        with metrics.timer("eauth_phase_seconds", phase="permission"):
+            api_id = match_any(self.get_role_tries(), url, method)
+        if api_id is not None:
+            logger.info(f"[can] Match api_id: `{api_id}`")
+            return True
         return False
 
 
+def get_identity(uid: int, user: Optional[User] = None) -> Optional[Identity]:
+    """
+    获取用户身份，优先读缓存
+
+    :param uid: 用户id
+    :param user: 已经查询出的用户，缓存未命中时直接使用
+    :return: 用户不存在时返回None
+    """
+    identity: Identity = cache.get(f"{CACHE_PREFIX_IDENTITY}_{uid}")
+    metrics.inc("eauth_cache_total", cache="identity", result="miss" if identity is None else "hit")
+    if identity is None:
+        logger.info(f"[identity] Get cache for user {uid}")
+        # 无缓存，读数据库并加入缓存
+        if user is None:
+            user = User.query.get(uid)
+            if user is None:
+                return None
+        identity = user.identity
+        cache.set(f"{CACHE_PREFIX_IDENTITY}_{uid}", identity, CACHE_TIME_IDENTITY)
+    return identity
+
+
+def get_authz_epoch(uid: int) -> Optional[int]:
+    """
+    获取用户当前的鉴权纪元
+
+    :param uid: 用户id
+    :return:
+    """
+    return cache.get(f"{CACHE_PREFIX_AUTHZ_EPOCH}_{uid}")
+
+
+def bump_authz_epoch(uid: int) -> int:
+    """
+    更新用户的鉴权纪元，之前签发的token中携带的角色不再可信
+
+    :param uid: 用户id
+    :return: 新纪元
+    """
+    epoch = time.time_ns()
+    cache.set(f"{CACHE_PREFIX_AUTHZ_EPOCH}_{uid}", epoch, current_app.config.get("TOKEN_EXPIRED", 60 * 60))
+    return epoch
+
+
+def invalidate_identity(uid: int):
+    """
+    用户信息变更后使缓存的身份失效
+
+    :param uid: 用户id
+    :return:
+    """
+    cache.delete(f"{CACHE_PREFIX_IDENTITY}_{uid}")
+
+
+register_search(Api, "url", "description")
+register_search(Role, "name", "description")
+register_search(User, "username", "email")
+
+
 def url_match(request_url: str, allowed_url: str):
     parsed_url = urlparse(request_url)
     request_url = parsed_url.path
     logger.debug(f"[url match] request_url: `{request_url}`, allowed_url: {allowed_url}")
 
-    # 将{xx}替换为正则
-    pattern = re.sub(r'{[^}]*?}', r'[a-zA-Z0-9\\u4e00-\\u9fff\_\-\.~]+', allowed_url)
-
-    if re.match(f"^{pattern}$", request_url):
+    # 将{xx}替换为正则，编译结果会被缓存
+    if compile_url(allowed_url).fullmatch(request_url):
         return True
     return False
@@ -1,24 +1,162 @@
 import logging
+import threading
+from itertools import chain
+from typing import Iterable, Optional
 
-from eAuth.models import Api, Role
-from ..constant import CACHE_PREFIX_API, CACHE_TIME_AUTH, CACHE_TIME_AUTH_DELAY, CACHE_PREFIX_ROLE_TO_API
-from ..extensions import scheduler, cache
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.base import NO_VALUE
+
+from eAuth.models import Api, Role, User, roles_apis, invalidate_identity, bump_authz_epoch
+from ..extensions import scheduler, db
+from ..utils.permission import permission_store
+from ..utils.route import ApiRecord
 
 logger = logging.getLogger(__name__)
 
+# 全量刷新与增量刷新串行执行，避免先读取的旧数据覆盖后提交的变更
+_refresh_lock = threading.RLock()
+
+
+def _load_roles(connection, role_ids: Optional[set[int]] = None) -> tuple[dict[int, ApiRecord], dict[int, list[int]]]:
+    """
+    一次扫描roles_apis并关联api，读取角色绑定的api，返回的都是普通元组构建的数据而不是ORM对象
+
+    :param connection: 数据库连接
+    :param role_ids: 需要读取的角色，None表示全部
+    :return: (api id -> api记录, role id -> api id列表)
+    """
+    role_query = select(Role.id)
+    binding_query = select(roles_apis.c.role_id, Api.id, Api.url, Api.method) \
+        .join(Api, Api.id == roles_apis.c.api_id)
+    if role_ids is not None:
+        role_query = role_query.where(Role.id.in_(role_ids))
+        binding_query = binding_query.where(roles_apis.c.role_id.in_(role_ids))
+    role_apis = {role_id: [] for role_id in connection.execute(role_query).scalars()}
+    apis = {}
+    for role_id, api_id, url, method in connection.execute(binding_query):
+        if role_id not in role_apis:
+            continue
+        role_apis[role_id].append(api_id)
+        if api_id not in apis:
+            apis[api_id] = ApiRecord(api_id, url, method)
+    return apis, role_apis
+
 
 def cache_auth():
     """
-    缓存api、role与api的映射
+    加载角色绑定的api，构建并发布新的鉴权快照。日常变更由refresh_auth增量更新，这里作为定期的一致性校准
+    :return:
+    """
+    with scheduler.app.app_context(), _refresh_lock, db.engine.connect() as connection:
+        apis, role_apis = _load_roles(connection)
+        permission_store.publish(apis, role_apis)
+
+
+def refresh_auth(api_ids: set[int], role_ids: set[int]):
+    """
+    增量刷新鉴权快照，只重新读取变更的api和角色
+
+    :param api_ids: 新增、修改或删除的api id
+    :param role_ids: 新增、修改、删除或绑定关系变化的角色id
+    :return:
+    """
+    with _refresh_lock:
+        if permission_store.snapshot is None:
+            return
+        with db.engine.connect() as connection:
+            apis = {}
+            if api_ids:
+                for api_id, url, method in connection.execute(
+                        select(Api.id, Api.url, Api.method).where(Api.id.in_(api_ids))):
+                    apis[api_id] = ApiRecord(api_id, url, method)
+            role_apis = {}
+            if role_ids:
+                role_api_records, role_apis = _load_roles(connection, role_ids)
+                apis.update(role_api_records)
+        removed_api_ids = set(api_id for api_id in api_ids if api_id not in apis)
+        permission_store.update(apis, removed_api_ids, role_apis, role_ids - set(role_apis))
+
+
+class _AuthChanges(object):
+    def __init__(self):
+        self.api_ids: set[int] = set()
+        self.role_ids: set[int] = set()
+        self.user_ids: set[int] = set()
+        self.epoch_user_ids: set[int] = set()
+
+    def __bool__(self):
+        return bool(self.api_ids or self.role_ids or self.user_ids or self.epoch_user_ids)
+
+
+def _changed_ids(obj, key: str) -> set[int]:
+    history = inspect(obj).attrs[key].history
+    return set(item.id for item in chain(history.added, history.deleted))
+
+
+def mark_auth_changes(session: Session, api_ids: Iterable[int] = (), role_ids: Iterable[int] = ()):
+    """
+    绕过ORM直接修改api或角色的绑定关系时不会触发after_flush，调用后在事务提交时增量刷新鉴权快照
+
+    :param session: 会话
+    :param api_ids: 变更的api id
+    :param role_ids: 变更的角色id
     :return:
     """
-    with scheduler.app.app_context():
-        apis = Api.query.all()
-        for api in apis:
-            cache.set(f"{CACHE_PREFIX_API}_{api.id}", api, CACHE_TIME_AUTH + CACHE_TIME_AUTH_DELAY)
-            logger.debug("[cache] Set api cache success")
-        roles = Role.query.all()
-        for role in roles:
-            cache.set(f"{CACHE_PREFIX_ROLE_TO_API}_{role.id}", [api.id for api in role.apis],
-                      CACHE_TIME_AUTH + CACHE_TIME_AUTH_DELAY)
-            logger.debug("[cache] Set role cache success")
+    changes: _AuthChanges = session.info.setdefault("auth_changes", _AuthChanges())
+    changes.api_ids.update(api_ids)
+    changes.role_ids.update(role_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_auth_changes(session: Session, flush_context):
+    """
+    记录本次事务中与鉴权相关的变更，提交后再刷新
+    """
+    changes: _AuthChanges = session.info.setdefault("auth_changes", _AuthChanges())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        state = inspect(obj)
+        changed = obj in session.new or obj in session.deleted
+        if isinstance(obj, Api):
+            if changed or state.attrs.url.history.has_changes() or state.attrs.method.history.has_changes():
+                changes.api_ids.add(obj.id)
+            changes.role_ids.update(_changed_ids(obj, "roles"))
+        elif isinstance(obj, Role):
+            if changed or state.attrs.apis.history.has_changes():
+                changes.role_ids.add(obj.id)
+            user_ids = _changed_ids(obj, "users")
+            users = state.attrs.users.loaded_value
+            if obj in session.deleted and users is not NO_VALUE:
+                user_ids.update(user.id for user in users)
+            changes.user_ids.update(user_ids)
+            changes.epoch_user_ids.update(user_ids)
+        elif isinstance(obj, User):
+            # 用户的任何变更都使缓存的身份失效，影响鉴权的变更同时更新鉴权纪元。
+            # 修改密码会通过logout_user更新纪元，登录时重新生成口令哈希不应使其他token失效
+            changes.user_ids.add(obj.id)
+            if changed or any(state.attrs[key].history.has_changes()
+                              for key in ("username", "locked", "roles")):
+                changes.epoch_user_ids.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_auth_changes(session: Session):
+    changes: _AuthChanges = session.info.pop("auth_changes", None)
+    if not changes:
+        return
+    try:
+        for uid in changes.user_ids:
+            invalidate_identity(uid)
+        # 先使身份失效再更新纪元，携带新纪元的token一定读到最新的身份
+        for uid in changes.epoch_user_ids:
+            bump_authz_epoch(uid)
+        if changes.api_ids or changes.role_ids:
+            refresh_auth(changes.api_ids, changes.role_ids)
+    except:
+        # 增量刷新失败时等待下一次全量刷新
+        logger.error("[cache] Refresh permission snapshot failed", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_auth_changes(session: Session):
+    session.info.pop("auth_changes", None)
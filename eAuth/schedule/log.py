@@ -0,0 +1,217 @@
+import gzip
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Optional
+
+from sqlalchemy import select, delete, insert, func, text
+
+from ..extensions import scheduler, db
+from ..log.models import OperateLog, SecurityLog, ROLLUPS
+from ..utils.model import invalidate_count
+from ..utils.search import unindex_rows
+
+logger = logging.getLogger(__name__)
+
+
+def _dump_row(row) -> str:
+    record = {}
+    for key, value in row.items():
+        record[key] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(record, ensure_ascii=False)
+
+
+def archive_path(archive_dir: str, table_name: str, day) -> str:
+    """
+    归档文件路径，每张表每天一个文件：<archive_dir>/<table>/<table>-YYYY-MM-DD.ndjson.gz
+
+    :param archive_dir: 归档目录
+    :param table_name: 表名
+    :param day: 日期
+    :return:
+    """
+    return os.path.join(archive_dir, table_name, f"{table_name}-{day.isoformat()}.ndjson.gz")
+
+
+def archive_log(model, before: datetime, archive_dir: str, batch_size: int = 1000) -> int:
+    """
+    将早于before的日志分批写入归档文件后删除。每批的写入和删除是一个独立的短事务，
+    先写文件再删除，中途失败时已写入的记录可能在下次归档时重复写入，离线读取时按id去重即可
+
+    :param model: 日志模型，OperateLog或SecurityLog
+    :param before: 归档该时间之前的日志
+    :param archive_dir: 归档目录
+    :param batch_size: 每批处理的记录数
+    :return: 归档的记录数
+    """
+    table = model.__table__
+    os.makedirs(os.path.join(archive_dir, table.name), exist_ok=True)
+    query = select(table).where(table.c.operate_datetime < before) \
+        .order_by(table.c.operate_datetime, table.c.id).limit(batch_size)
+    total = 0
+    while True:
+        rows = db.session.execute(query).mappings().all()
+        if not rows:
+            break
+        try:
+            for day, day_rows in groupby(rows, key=lambda row: row["operate_datetime"].date()):
+                # 追加写入的gzip文件由多个member组成，gzip -dc和gzip模块都可以直接读取
+                with gzip.open(archive_path(archive_dir, table.name, day), "at", encoding="utf-8") as f:
+                    for row in day_rows:
+                        f.write(_dump_row(row) + "\n")
+            ids = [row["id"] for row in rows]
+            db.session.execute(delete(table).where(table.c.id.in_(ids)))
+            unindex_rows(db.session.connection(), model, ids)
+            db.session.commit()
+        except:
+            db.session.rollback()
+            logger.error(f"[archive] Archive {table.name} failed after {total} records", exc_info=True)
+            break
+        total += len(rows)
+    if total:
+        invalidate_count(table.name)
+        logger.info(f"[archive] Archive {total} {table.name} records before {before.isoformat()}")
+    return total
+
+
+def _lock_file(f) -> bool:
+    # 非阻塞地锁定文件，文件关闭或进程退出时自动释放。fcntl只在类Unix系统上可用，Windows使用msvcrt
+    if os.name == "nt":
+        import msvcrt
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    import fcntl
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _unlock_file(f):
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    import fcntl
+    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def single_runner(name: str, lock_dir: str):
+    """
+    获取跨进程的锁，每个工作进程都有自己的定时任务，同一时刻只允许一个进程执行。
+    mysql使用GET_LOCK，锁在数据库中，多台主机部署时同样有效；其它数据库（sqlite）只在本机使用，
+    使用lock_dir下的文件锁。进程退出时两种锁都会自动释放
+
+    :param name: 锁名
+    :param lock_dir: 文件锁所在目录
+    :return: 是否获取到锁，未获取到时不应执行任务
+    """
+    if db.engine.dialect.name == "mysql":
+        # 锁属于数据库连接，使用独立的连接持有，不受会话提交归还连接的影响
+        with db.engine.connect() as connection:
+            acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": name}).scalar() == 1
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f".{name}.lock"), "w") as f:
+        if not _lock_file(f):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            _unlock_file(f)
+
+
+def archive_logs():
+    """
+    定期归档操作日志和安全日志，使日志表只保留最近的数据。
+    多个进程同时触发时只有获取到锁的进程执行，避免重复写入归档文件
+    :return:
+    """
+    with scheduler.app.app_context():
+        config = scheduler.app.config
+        with single_runner("eauth_archive_log", config["LOG_ARCHIVE_DIR"]) as acquired:
+            if not acquired:
+                logger.info("[archive] Archive is running in another process, skip")
+                return
+            now = datetime.utcnow()
+            for model, retention_days in ((OperateLog, config["OPERATE_LOG_RETENTION_DAYS"]),
+                                          (SecurityLog, config["SECURITY_LOG_RETENTION_DAYS"])):
+                archive_log(model, now - timedelta(days=retention_days),
+                            config["LOG_ARCHIVE_DIR"], config["LOG_ARCHIVE_BATCH_SIZE"])
+
+
+def _hour_bucket(column):
+    # 截断到小时。sqlite中DateTime以字符串保存，格式需与SQLAlchemy写入的一致才能正确比较
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+    if dialect == "mysql":
+        return func.date_format(column, "%Y-%m-%d %H:00:00")
+    return func.date_trunc("hour", column)
+
+
+def rollup_log(model, start: datetime, end: datetime) -> int:
+    """
+    重新计算[start, end)内各小时的汇总数据。先删除再由INSERT ... SELECT写入，可以重复执行
+
+    :param model: 日志模型，OperateLog或SecurityLog
+    :param start: 开始时间，会截断到整点
+    :param end: 结束时间
+    :return: 写入的汇总记录数
+    """
+    rollup_model, dimensions = ROLLUPS[model]
+    start = start.replace(minute=0, second=0, microsecond=0)
+    columns = [getattr(model, dimension) for dimension in dimensions]
+    hour = _hour_bucket(model.operate_datetime)
+    aggregate = select(hour, *columns, func.count()) \
+        .where(model.operate_datetime >= start, model.operate_datetime < end) \
+        .group_by(hour, *columns)
+    try:
+        db.session.execute(delete(rollup_model).where(rollup_model.hour >= start, rollup_model.hour < end))
+        result = db.session.execute(insert(rollup_model).from_select(["hour", *dimensions, "count"], aggregate))
+        db.session.commit()
+    except:
+        db.session.rollback()
+        logger.error(f"[rollup] Rollup {model.__tablename__} from {start.isoformat()} failed", exc_info=True)
+        return 0
+    logger.debug(f"[rollup] Rollup {model.__tablename__} from {start.isoformat()}: {result.rowcount} records")
+    return result.rowcount
+
+
+def rollup_logs(hours: Optional[int] = None):
+    """
+    定期汇总最近几个小时的审计日志，已归档的日志不会被重新计算。
+    汇总表为空时（例如升级后第一次运行）从最早的日志开始补算，使已有的日志也有统计数据
+
+    :param hours: 重新计算的小时数，默认为LOG_ROLLUP_HOURS
+    :return:
+    """
+    with scheduler.app.app_context():
+        hours = hours or scheduler.app.config["LOG_ROLLUP_HOURS"]
+        now = datetime.utcnow()
+        start = now - timedelta(hours=hours)
+        # 结束时间取下一个整点，当前小时的汇总随之更新
+        end = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        for model, (rollup_model, _) in ROLLUPS.items():
+            model_start = start
+            if db.session.execute(select(rollup_model.hour).limit(1)).first() is None:
+                earliest = db.session.execute(select(func.min(model.operate_datetime))).scalar()
+                if earliest is not None and earliest < start:
+                    logger.info(f"[rollup] Backfill {model.__tablename__} from {earliest.isoformat()}")
+                    model_start = earliest
+            rollup_log(model, model_start, end)
@@ -89,12 +89,65 @@ class BaseConfig(object):
 
     # token有效期
     TOKEN_EXPIRED = 60 * 60 * 3
+    # token中携带角色id和鉴权纪元，纪元未变化时直接信任token中的角色，无需查询用户身份。
+    # 纪元保存在缓存中，锁定、注销等只更新处理请求的进程能看到的缓存，开启时CACHE_TYPE必须是
+    # 所有工作进程共享的缓存（如RedisCache），使用SimpleCache等进程内缓存时启动失败
+    TOKEN_EMBED_ROLES = False
 
     # 登录失败防暴力破解
     SHORT_MAX_LOGIN_INCORRECT = 5  # 短期最大登录失败次数
     SHORT_MAX_LOGIN_DELAY = 1  # 短期最大登录失败后能够再次登录的时间间隔（小时）
     MAX_LOGIN_INCORRECT = 15  # 最大登录失败次数
 
+    # 口令哈希，修改算法或参数后旧的口令哈希在用户下次登录成功时重新生成
+    PASSWORD_HASH_METHOD = "scrypt:32768:8:1"  # werkzeug的method参数，需写全参数
+    PASSWORD_HASH_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 4  # 计算口令哈希的线程数
+    PASSWORD_HASH_QUEUE_LIMIT = 32  # 最多排队等待的任务数，超过时返回503
+    PASSWORD_HASH_TIMEOUT = 5  # 最长等待时间（秒），超时返回503
+
+    # 审计日志异步批量写入
+    AUDIT_ASYNC = True
+    AUDIT_QUEUE_SIZE = 10000  # 队列长度
+    AUDIT_BATCH_SIZE = 200  # 每批最多写入的日志数
+    AUDIT_FLUSH_INTERVAL = 1  # 最长写入间隔（秒）
+    AUDIT_QUEUE_FULL = "block"  # 队列满时的处理：block阻塞等待，超时后同步写入；drop丢弃
+    AUDIT_BLOCK_TIMEOUT = 0.5  # 阻塞等待的最长时间（秒）
+
+    # 搜索索引：为名称、url、用户名等字段维护三元组索引，子串搜索不再全表扫描。
+    # 默认关闭，关闭时不维护索引；启用后需执行flask reindex-search为已有数据建立索引，否则子串搜索查不到这些数据
+    SEARCH_INDEX_ENABLED = False
+
+    # 审计日志按小时汇总
+    LOG_ROLLUP_INTERVAL = 5 * 60  # 汇总间隔（秒）
+    LOG_ROLLUP_HOURS = 2  # 每次重新计算最近几个小时
+
+    # 日志导出时每批从数据库读取的行数
+    LOG_EXPORT_BATCH_SIZE = 1000
+
+    # 日志归档：超过保留天数的审计日志每天写入gzip压缩的NDJSON文件（每天一个文件）后从数据库删除。
+    # 会删除数据库中的日志，默认关闭，确认保留天数和归档目录后再启用
+    LOG_ARCHIVE_ENABLED = False
+    LOG_ARCHIVE_DIR = os.path.join(os.path.dirname(BASE_DIR), "archive")
+    LOG_ARCHIVE_BATCH_SIZE = 1000  # 每个事务归档的记录数
+    LOG_ARCHIVE_HOUR = 3  # 每天归档的时间（UTC小时）
+    OPERATE_LOG_RETENTION_DAYS = 180
+    SECURITY_LOG_RETENTION_DAYS = 180
+
+    # 指标：记录认证、鉴权、审计各阶段的耗时和缓存命中次数，管理员通过/api/metrics获取（Prometheus文本格式）
+    METRICS_ENABLED = False
+
+    # SQL语句数预算：统计每个请求执行的语句数，超过接口的预算（query_budget.limit设置，默认QUERY_BUDGET_DEFAULT）时记录警告
+    QUERY_BUDGET_ENABLED = False
+    QUERY_BUDGET_DEFAULT = 30
+    QUERY_BUDGET_RAISE = False  # 超过时抛出异常，用于测试
+
+    # 日志分页、统计和鉴权接口使用预先编译的序列化函数输出（fast_output），关闭后由marshmallow输出，两者结果一致
+    FAST_SERIALIZER_ENABLED = True
+
+    # 鉴权的快速路径：在进入Flask之前处理，只返回响应码（204通过，403无权限），为None时不启用
+    FAST_CHECK_PATH = "/api/auth/check/fast"
+
     # 日志存放位置
     LOG_CONFIG_FILE = os.path.join(BASE_DIR, "log_config.yaml")
 
@@ -102,7 +155,8 @@ class BaseConfig(object):
     AUTH_WHITE_LIST = {"POST /api/auth/login", "GET /docs", "GET /openapi.json"}
 
     # 不鉴权接口
-    PERMISSION_WHITE_LIST = {"POST /api/auth/check"}
+    PERMISSION_WHITE_LIST = {"POST /api/auth/check", "POST /api/auth/check/batch",
+                             "POST /api/auth/check/fast", "GET /api/auth/check/fast"}
 
     # 邮件设置
     MAIL_USE_SSL = True
@@ -136,6 +190,11 @@ class Production(BaseConfig):
 
 class Testing(Production):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    # 测试时同步写入审计日志，便于断言
+    AUDIT_ASYNC = False
+    # 测试时请求执行的SQL语句数超过预算直接失败
+    QUERY_BUDGET_ENABLED = True
+    QUERY_BUDGET_RAISE = True
 
 
 config = {
@@ -0,0 +1,164 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+from flask import Flask
+from ..extensions import db
+from .metrics import metrics
+from .model import invalidate_count
+from .search import insert_rows
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditWriter(object):
+    """
+    审计日志异步批量写入。
+
+    请求线程只把日志放入有界队列，后台线程按数量（AUDIT_BATCH_SIZE）或时间间隔（AUDIT_FLUSH_INTERVAL）
+    以executemany批量插入。队列满时按AUDIT_QUEUE_FULL处理：block阻塞等待，超时后在请求线程中同步写入；
+    drop直接丢弃并记录错误日志。进程退出时会写入队列中剩余的日志。
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.app: Optional[Flask] = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault("AUDIT_ASYNC", True)
+        app.config.setdefault("AUDIT_QUEUE_SIZE", 10000)
+        app.config.setdefault("AUDIT_BATCH_SIZE", 200)
+        app.config.setdefault("AUDIT_FLUSH_INTERVAL", 1)
+        app.config.setdefault("AUDIT_QUEUE_FULL", "block")
+        app.config.setdefault("AUDIT_BLOCK_TIMEOUT", 0.5)
+        app.extensions["audit_writer"] = self
+        self.app = app
+        if app.config["AUDIT_ASYNC"] and self._thread is None:
+            self._queue = queue.Queue(maxsize=app.config["AUDIT_QUEUE_SIZE"])
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def submit(self, model, row: dict):
+        """
+        写入一条审计日志
+
+        :param model: 日志模型，OperateLog或SecurityLog
+        :param row: 字段 -> 值
+        :return:
+        """
+        if self._thread is None or not self.app.config["AUDIT_ASYNC"]:
+            self._write(model, [row])
+            return
+        try:
+            if self.app.config["AUDIT_QUEUE_FULL"] == "drop":
+                self._queue.put_nowait((model, row))
+            else:
+                self._queue.put((model, row), timeout=self.app.config["AUDIT_BLOCK_TIMEOUT"])
+        except queue.Full:
+            if self.app.config["AUDIT_QUEUE_FULL"] == "drop":
+                self.dropped += 1
+                logger.error(f"[audit] Queue is full, drop {model.__tablename__} record: {row}")
+            else:
+                logger.warning(f"[audit] Queue is full, write {model.__tablename__} record synchronously")
+                self._write(model, [row])
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        等待队列中已有的日志写入完成
+
+        :param timeout: 最长等待时间（秒）
+        :return:
+        """
+        if self._thread is None:
+            # 后台线程未启动或已停止，没有线程消费队列
+            return
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait(timeout)
+
+    def shutdown(self, timeout: Optional[float] = 10):
+        """
+        写入剩余的日志并停止后台线程
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        batch: list[tuple] = []
+        deadline = None
+        while True:
+            interval = self.app.config["AUDIT_FLUSH_INTERVAL"]
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(batch)
+                return
+            if item is not None:
+                model, row = item
+                if model is None:
+                    # flush请求
+                    self._flush(batch)
+                    batch, deadline = [], None
+                    row.set()
+                    continue
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + interval
+            if batch and (len(batch) >= self.app.config["AUDIT_BATCH_SIZE"] or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    def _flush(self, batch: list[tuple]):
+        rows_by_model: dict = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+        with self.app.app_context():
+            for model, rows in rows_by_model.items():
+                self._write(model, rows)
+
+    @staticmethod
+    def _insert(model, rows: list[dict]):
+        with metrics.timer("eauth_phase_seconds", phase="audit_commit"):
+            insert_rows(db.session, model, rows)
+            db.session.commit()
+        invalidate_count(model.__tablename__)
+
+    @classmethod
+    def _write(cls, model, rows: list[dict]):
+        try:
+            cls._insert(model, rows)
+            logger.debug(f"[audit] Insert {len(rows)} {model.__tablename__} records")
+            return
+        except:
+            db.session.rollback()
+            if len(rows) == 1:
+                logger.error(f"[audit] Insert {model.__tablename__} record failed: {rows[0]}", exc_info=True)
+                return
+            logger.warning(f"[audit] Insert {len(rows)} {model.__tablename__} records failed, retry one by one",
+                           exc_info=True)
+        # 批量写入失败时逐条重试，只丢弃出错的记录
+        for row in rows:
+            try:
+                cls._insert(model, [row])
+            except:
+                db.session.rollback()
+                logger.error(f"[audit] Insert {model.__tablename__} record failed: {row}", exc_info=True)
+
+
+audit_writer = AuditWriter()
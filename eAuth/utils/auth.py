@@ -2,35 +2,63 @@ import logging
 import secrets
 import time
 from functools import wraps
+from typing import Optional
 
 from apiflask import abort
 from authlib.jose import jwt, JWTClaims, JoseError
 from flask import current_app, g
 
-from eAuth.models import User
+from eAuth.models import User, Identity, get_identity, get_authz_epoch, bump_authz_epoch
 from ..constant import CACHE_PREFIX_LOGOUT, CACHE_TIME_LOGOUT_DELAY
 from ..extensions import cache
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 
-def verify_token(token: str):
+def identity_from_claims(data: JWTClaims) -> Optional[Identity]:
     """
-    校验token，成功返回user，失败返回None
+    token携带的鉴权纪元与当前纪元一致时，直接由token中的角色构建用户身份
+
+    :param data: token内容
+    :return: 纪元不一致或token未携带角色时返回None
+    """
+    epoch = data.get("aep")
+    role_ids = data.get("rids")
+    if epoch is None or role_ids is None:
+        return None
+    if get_authz_epoch(data.get("uid")) != epoch:
+        return None
+    username = data.get("username")
+    return Identity(id=data.get("uid"), username=username, locked=False, role_ids=frozenset(role_ids),
+                    is_admin=username == "admin")
+
+
+def verify_identity(token: str) -> Optional[Identity]:
+    """
+    校验token，成功返回缓存的用户身份，失败返回None。缓存命中时不访问数据库
 
     :param token:
     :return:
     """
     try:
-        data: JWTClaims = jwt.decode(token.encode("ascii"), current_app.config["SECRET_KEY"])
+        with metrics.timer("eauth_phase_seconds", phase="jwt_decode"):
+            data: JWTClaims = jwt.decode(token.encode("ascii"), current_app.config["SECRET_KEY"])
         if data.get("exp") < time.time():
             raise JoseError("Token expired")
+        # 纪元未变化说明token签发后用户未被锁定、注销或修改角色
+        if "rids" in data:
+            identity = identity_from_claims(data)
+            metrics.inc("eauth_cache_total", cache="token_roles", result="miss" if identity is None else "hit")
+            if identity is not None:
+                return identity
         # 若已经注销了，则token无效
         logout_time = cache.get(f"{CACHE_PREFIX_LOGOUT}_{data.get('uid')}")
         if logout_time and logout_time >= data.get("iat"):
             raise JoseError("Invalid token")
-        user: User = User.query.get(data.get("uid"))
-        if user and user.is_locked:
+        with metrics.timer("eauth_phase_seconds", phase="identity"):
+            identity = get_identity(data.get("uid"))
+        if identity is None or identity.is_locked:
             return None
     except JoseError:
         return None
@@ -38,13 +66,39 @@ def verify_token(token: str):
         logger.info("[verify token] Verify token failed", exc_info=True)
         return None
     else:
-        return user
+        return identity
+
+
+def verify_token(token: str) -> Optional[User]:
+    """
+    校验token，成功返回user，失败返回None
+
+    :param token:
+    :return:
+    """
+    identity = verify_identity(token)
+    if identity is None:
+        return None
+    with metrics.timer("eauth_phase_seconds", phase="user_query"):
+        return User.query.get(identity.id)
+
+
+def get_current_user() -> Optional[User]:
+    """
+    获取当前请求用户的ORM对象，用于需要读取或修改用户数据的接口，同一请求只查询一次
+
+    :return:
+    """
+    if "current_user" not in g:
+        identity: Optional[Identity] = g.get("user")
+        g.current_user = User.query.get(identity.id) if identity else None
+    return g.current_user
 
 
 def required_admin(func):
     @wraps(func)
     def decorator(*args, **kwargs):
-        if g.user.username != "admin":  # admin直接通过
+        if not g.user.is_admin:  # admin直接通过
             abort(403)
         return func(*args, **kwargs)
     return decorator
@@ -63,3 +117,4 @@ def logout_user(uid: int):
     """
     cache.set(f"{CACHE_PREFIX_LOGOUT}_{uid}", int(time.time()),
               current_app.config.get("TOKEN_EXPIRED", 60 * 60) + CACHE_TIME_LOGOUT_DELAY)
+    bump_authz_epoch(uid)
@@ -1,11 +1,14 @@
 import json
 import logging
+from datetime import datetime
 from functools import wraps
 from typing import Optional
 
 from flask import g, Response, request
 
-from ..extensions import get_ipaddr, db
+from .audit import audit_writer
+from .metrics import metrics
+from ..extensions import get_ipaddr
 from ..log.models import OperateLog, SecurityLog
 
 logger = logging.getLogger(__name__)
@@ -67,25 +70,23 @@ def operate_log(func):
             resource_id = request.view_args.get(first_arg_name)
 
         try:
-            log_record = OperateLog(
+            row = dict(
                 username=username,
                 ip_addr=ip_addr,
                 operate_type=operate_type,
                 operate_api=operate_api,
                 status_code=status_code,
                 resource_id=resource_id,
-                success=success
+                request_data=json.dumps(request_data, ensure_ascii=False) if request_data else None,
+                response_data=json.dumps(response_data, ensure_ascii=False) if response_data else None,
+                success=success,
+                operate_datetime=datetime.utcnow()
             )
-            if request_data:
-                log_record.request_data = json.dumps(request_data, ensure_ascii=False)
-            if response_data:
-                log_record.response_data = json.dumps(response_data, ensure_ascii=False)
-            db.session.add(log_record)
-            db.session.commit()
+            with metrics.timer("eauth_phase_seconds", phase="audit_submit"):
+                audit_writer.submit(OperateLog, row)
             if not response_obj.is_json:
-                logger.warning(f"[operate log] Response is not json by log record id: {log_record.id}")
+                logger.warning(f"[operate log] Response is not json: {operate_type} {operate_api}")
         except:
-            db.session.rollback()
             logger.error("[operate log] Insert log record failed", exc_info=True)
         return response
     return decorator
@@ -131,18 +132,18 @@ def security_log(operate: str):
                     success = True
 
             try:
-                log_record = SecurityLog(
+                row = dict(
                     username=username,
                     ip_addr=ip_addr,
                     operate=operate,
-                    success=success
+                    success=success,
+                    operate_datetime=datetime.utcnow()
                 )
-                db.session.add(log_record)
-                db.session.commit()
+                with metrics.timer("eauth_phase_seconds", phase="audit_submit"):
+                    audit_writer.submit(SecurityLog, row)
                 if response_obj is not None and not response_obj.is_json:
-                    logger.warning(f"[login log] Response is not json by log record id: {log_record.id}")
+                    logger.warning(f"[login log] Response is not json: {operate}")
             except:
-                db.session.rollback()
                 logger.error("[login log] Insert log record failed", exc_info=True)
             if exception:
                 raise exception
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from flask_sqlalchemy.query import Query
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# 累积到该大小再输出，减少小块写入的开销
+_CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_rows(query: Query, columns: list, batch_size: int = 1000) -> Iterator[tuple]:
+    """
+    只查询需要的字段并通过服务端游标分批读取，内存占用与总行数无关
+
+    :param query: 模型查询
+    :param columns: 导出的字段
+    :param batch_size: 每批读取的行数
+    :return:
+    """
+    for row in query.with_entities(*columns).yield_per(batch_size):
+        yield tuple(row)
+
+
+def _ndjson_lines(names: list[str], rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, default=_json_default) + "\n"
+
+
+def _csv_lines(names: list[str], rows: Iterable[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for row in rows:
+        writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in row)
+        if buffer.tell() >= _CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _chunked(lines: Iterable[str]) -> Iterator[bytes]:
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= _CHUNK_SIZE:
+            yield "".join(chunk).encode()
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode()
+
+
+def _gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31表示gzip格式
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(query: Query, columns: list, fmt: str = "ndjson", compress: bool = False,
+                  batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    将查询结果流式输出为NDJSON或CSV
+
+    :param query: 模型查询
+    :param columns: 导出的字段
+    :param fmt: ndjson/csv
+    :param compress: 是否gzip压缩
+    :param batch_size: 每批读取的行数
+    :return: 字节块
+    """
+    names = [column.key for column in columns]
+    rows = iter_rows(query, columns, batch_size)
+    lines = _csv_lines(names, rows) if fmt == "csv" else _ndjson_lines(names, rows)
+    chunks = _chunked(lines)
+    return _gzipped(chunks) if compress else chunks
@@ -0,0 +1,203 @@
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import insert, func, select
+
+from .model import invalidate_count
+from .password import password_hasher
+from .search import index_rows
+from ..extensions import db
+from ..log.models import OperateLog, SecurityLog
+from ..models import Api, Role, User, roles_apis, users_roles
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH")
+OPERATES = ("login", "logout", "change_password", "reset_password")
+
+
+class FixtureGenerator(object):
+    """
+    批量生成测试数据。
+
+    通过Core的executemany按chunk_size分批写入，不经过ORM；同一个seed生成的数据完全相同。
+    主键由生成器分配（从表中现有的最大id之后开始），可以在已有数据的库中追加。
+    绕过ORM写入不会触发事件，搜索索引与缓存的总数在这里同步维护，鉴权快照需要调用方刷新。
+    """
+
+    def __init__(self, seed: int = 0, chunk_size: int = 5000):
+        self.random = random.Random(seed)
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _next_id(model) -> int:
+        return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def _insert(self, table, rows: Iterator[dict], model=None) -> int:
+        """
+        分批写入，每批一个事务
+
+        :param table: 表
+        :param rows: 记录，可以是生成器
+        :param model: 需要建立搜索索引的模型，记录中须包含id
+        :return: 写入的记录数
+        """
+        total = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                total += self._flush(table, chunk, model)
+                chunk = []
+        if chunk:
+            total += self._flush(table, chunk, model)
+        invalidate_count(table.name)
+        logger.info(f"[fixture] Insert {total} {table.name} records")
+        return total
+
+    @staticmethod
+    def _flush(table, chunk: list[dict], model=None) -> int:
+        db.session.execute(insert(table), chunk)
+        if model is not None:
+            index_rows(db.session.connection(), model, ((row["id"], row) for row in chunk))
+        db.session.commit()
+        return len(chunk)
+
+    def _sample(self, population: list[int], count_range: tuple[int, int]) -> list[int]:
+        low, high = count_range
+        return self.random.sample(population, min(self.random.randint(low, high), len(population)))
+
+    def apis(self, count: int, param_ratio: float = 0.6) -> list[dict]:
+        """
+        生成api，url按服务分组，param_ratio比例的url带有{id}参数
+
+        :param count: 数量
+        :param param_ratio: 带参数的url比例
+        :return: 写入的api
+        """
+        start = self._next_id(Api)
+        apis = []
+        for api_id in range(start, start + count):
+            url = f"/api/svc{self.random.randint(0, 49)}/res{api_id}"
+            if self.random.random() < param_ratio:
+                url += "/{id}"
+                if self.random.random() < 0.2:
+                    url += "/sub"
+            apis.append({"id": api_id, "url": url, "method": self.random.choice(METHODS),
+                         "description": f"fixture api {api_id}"})
+        self._insert(Api.__table__, iter(apis), Api)
+        return apis
+
+    def roles(self, count: int, apis_per_role: tuple[int, int] = (5, 20),
+              api_ids: Optional[list[int]] = None) -> list[int]:
+        """
+        生成角色并随机绑定api
+
+        :param count: 数量
+        :param apis_per_role: 每个角色绑定的api数量范围（均匀分布）
+        :param api_ids: 可以绑定的api，默认为全部
+        :return: 角色id
+        """
+        if api_ids is None:
+            api_ids = list(db.session.execute(select(Api.id)).scalars())
+        start = self._next_id(Role)
+        role_ids = list(range(start, start + count))
+        self._insert(Role.__table__, ({"id": role_id, "name": f"role{role_id}",
+                                       "description": f"fixture role {role_id}"} for role_id in role_ids), Role)
+        self._insert(roles_apis, ({"role_id": role_id, "api_id": api_id} for role_id in role_ids
+                                  for api_id in self._sample(api_ids, apis_per_role)))
+        return role_ids
+
+    def users(self, count: int, roles_per_user: tuple[int, int] = (1, 3), role_ids: Optional[list[int]] = None,
+              password: str = "Password@123") -> list[str]:
+        """
+        生成用户并随机绑定角色，所有用户使用同一个口令哈希
+
+        :param count: 数量
+        :param roles_per_user: 每个用户绑定的角色数量范围（均匀分布）
+        :param role_ids: 可以绑定的角色，默认为全部
+        :param password: 口令
+        :return: 用户名
+        """
+        if role_ids is None:
+            role_ids = list(db.session.execute(select(Role.id)).scalars())
+        start = self._next_id(User)
+        user_ids = list(range(start, start + count))
+        password_hash = password_hasher.generate(password)
+        self._insert(User.__table__, ({"id": user_id, "username": f"user{user_id}",
+                                       "email": f"user{user_id}@example.com", "password_hash": password_hash,
+                                       "locked": False, "login_incorrect": 0} for user_id in user_ids), User)
+        self._insert(users_roles, ({"user_id": user_id, "role_id": role_id} for user_id in user_ids
+                                   for role_id in self._sample(role_ids, roles_per_user)))
+        return [f"user{user_id}" for user_id in user_ids]
+
+    def _log_base(self, log_id: int, end: datetime, seconds: int, usernames: list[str]) -> dict:
+        return {
+            "id": log_id,
+            "username": self.random.choice(usernames),
+            "ip_addr": f"10.{self.random.randint(0, 3)}.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}",
+            "operate_datetime": end - timedelta(seconds=self.random.randint(0, seconds)),
+        }
+
+    def operate_logs(self, count: int, days: int = 30, usernames: Optional[list[str]] = None,
+                     failure_ratio: float = 0.05, end: Optional[datetime] = None) -> int:
+        """
+        生成操作日志，时间均匀分布在end之前的days天内
+
+        :param count: 数量
+        :param days: 天数
+        :param usernames: 操作人，默认为user1~user100
+        :param failure_ratio: 失败的比例
+        :param end: 最晚的日志时间，默认为当前时间
+        :return: 写入的记录数
+        """
+        usernames = usernames or [f"user{i}" for i in range(1, 101)]
+        start = self._next_id(OperateLog)
+        end = end or datetime.utcnow()
+
+        def rows():
+            for log_id in range(start, start + count):
+                row = self._log_base(log_id, end, days * 86400, usernames)
+                success = self.random.random() >= failure_ratio
+                row.update({
+                    "operate_type": self.random.choice(METHODS[:4]),
+                    "operate_api": f"/api/config/{self.random.choice(('api', 'role', 'user'))}/"
+                                   f"{self.random.randint(1, 1000)}",
+                    "status_code": 200 if success else self.random.choice((400, 403, 404, 500)),
+                    "resource_id": self.random.randint(1, 1000),
+                    "request_data": None,
+                    "response_data": None,
+                    "success": success,
+                })
+                yield row
+
+        return self._insert(OperateLog.__table__, rows(), OperateLog)
+
+    def security_logs(self, count: int, days: int = 30, usernames: Optional[list[str]] = None,
+                      failure_ratio: float = 0.1, end: Optional[datetime] = None) -> int:
+        """
+        生成安全日志，时间均匀分布在end之前的days天内
+
+        :param count: 数量
+        :param days: 天数
+        :param usernames: 登录用户，默认为user1~user100
+        :param failure_ratio: 失败的比例
+        :param end: 最晚的日志时间，默认为当前时间
+        :return: 写入的记录数
+        """
+        usernames = usernames or [f"user{i}" for i in range(1, 101)]
+        start = self._next_id(SecurityLog)
+        end = end or datetime.utcnow()
+
+        def rows():
+            for log_id in range(start, start + count):
+                row = self._log_base(log_id, end, days * 86400, usernames)
+                row.update({
+                    "operate": self.random.choice(OPERATES),
+                    "success": self.random.random() >= failure_ratio,
+                })
+                yield row
+
+        return self._insert(SecurityLog.__table__, rows(), SecurityLog)
@@ -0,0 +1,217 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional
+
+from flask import Flask, g, request
+
+# 默认的耗时分桶（秒），覆盖缓存命中的微秒级到查库、计算口令哈希的秒级
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_NULL_TIMER = nullcontext()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram(object):
+    """
+    固定分桶的直方图，记录时只做一次二分查找和计数
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, labels: tuple) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class _Timer(object):
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: tuple):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class Metrics(object):
+    """
+    进程内的指标：耗时直方图和计数器，以Prometheus文本格式输出。
+
+    METRICS_ENABLED为False时各记录方法在判断开关后直接返回，计时使用共享的空上下文，不读取时钟。
+    指标只在当前进程内累计，多进程部署时需要分别采集各进程。
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.enabled = False
+        self.buckets = DEFAULT_BUCKETS
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, int] = {}
+        self._help: dict[str, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault("METRICS_ENABLED", False)
+        app.config.setdefault("METRICS_BUCKETS", DEFAULT_BUCKETS)
+        app.extensions["metrics"] = self
+        self.enabled = app.config["METRICS_ENABLED"]
+        self.buckets = tuple(sorted(app.config["METRICS_BUCKETS"]))
+
+        @app.before_request
+        def start_request_timer():
+            if self.enabled:
+                g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            start = g.get("metrics_start")
+            if start is not None and self.enabled:
+                # 包含视图中的序列化，减去各阶段耗时即为其余开销
+                self.observe("eauth_request_seconds", time.perf_counter() - start,
+                             (("endpoint", request.endpoint or "none"), ("status", response.status_code)))
+            return response
+
+    def describe(self, name: str, kind: str, text: str):
+        """
+        登记指标的类型和说明，输出时作为HELP和TYPE
+
+        :param name: 指标名
+        :param kind: histogram或counter
+        :param text: 说明
+        :return:
+        """
+        self._help[name] = (kind, text)
+
+    def timer(self, name: str, **labels):
+        """
+        计时上下文，退出时把耗时记入直方图
+
+        e.g.
+        ```
+        with metrics.timer("eauth_phase_seconds", phase="jwt_decode"):
+            ...
+        ```
+
+        :param name: 指标名
+        :param labels: 标签
+        :return:
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, tuple(labels.items()))
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        """
+        记入直方图
+
+        :param name: 指标名
+        :param value: 观测值（秒）
+        :param labels: ((标签名, 值), ...)
+        :return:
+        """
+        if not self.enabled:
+            return
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        """
+        计数器加一
+
+        :param name: 指标名
+        :param amount: 增加的数量
+        :param labels: 标签
+        :return:
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """
+        以Prometheus文本格式输出全部指标
+
+        :return:
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+            counters = sorted(self._counters.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = self._help.get(name, (kind, ""))
+            if text:
+                lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            lines.extend(histogram.render(name, labels))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("eauth_request_seconds", "histogram", "Request duration in seconds, including serialization.")
+metrics.describe("eauth_phase_seconds", "histogram",
+                 "Duration of authentication, authorization, audit and serialization phases in seconds.")
+metrics.describe("eauth_cache_total", "counter", "Cache lookups by cache and result.")
@@ -1,8 +1,136 @@
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
 from apiflask import abort, pagination_builder
+from flask import g
 from flask_sqlalchemy.query import Query
+from sqlalchemy import and_, or_, event, text
+from sqlalchemy.orm import InstrumentedAttribute, Session, load_only
+
+from ..constant import CACHE_PREFIX_COUNT, CACHE_TIME_COUNT
+from ..extensions import db, cache
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _UncountedPagination(object):
+    """
+    不统计总数的分页，多取一条记录判断是否有下一页
+    """
+
+    def __init__(self, query: Query, page: int, per_page: int):
+        items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+        self.page = page
+        self.per_page = per_page
+        self.total = None
+        self.pages = None
+        self.has_next = len(items) > per_page
+        self.items = items[:per_page]
+        self.has_prev = page > 1
+        self.next_num = page + 1 if self.has_next else None
+        self.prev_num = page - 1 if self.has_prev else None
+
+
+def _table_names(query: Query) -> list[str]:
+    return [description["entity"].__tablename__ for description in query.column_descriptions
+            if hasattr(description["entity"], "__tablename__")]
+
+
+def _count_generation(table_name: str) -> int:
+    return cache.get(f"{CACHE_PREFIX_COUNT}_generation_{table_name}") or 0
+
+
+def invalidate_count(*table_names: str):
+    """
+    使表的缓存总数失效，ORM提交的增删改会自动调用，绕过ORM的批量写入需要手动调用
+
+    :param table_names: 表名
+    :return:
+    """
+    for table_name in table_names:
+        cache.set(f"{CACHE_PREFIX_COUNT}_generation_{table_name}", time.time_ns(), timeout=CACHE_TIME_COUNT * 2)
+
+
+def _cached_count(query: Query) -> int:
+    # 以表的版本号和编译后的SQL及参数作为缓存键，任何一张表有变更时缓存键随之变化
+    statement = query.order_by(None).statement.compile(db.engine)
+    generations = [f"{name}:{_count_generation(name)}" for name in _table_names(query)]
+    signature = hashlib.sha1(
+        f"{generations}|{statement.string}|{sorted(statement.params.items())}".encode()).hexdigest()
+    key = f"{CACHE_PREFIX_COUNT}_{signature}"
+    total = cache.get(key)
+    metrics.inc("eauth_cache_total", cache="count", result="miss" if total is None else "hit")
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total, timeout=CACHE_TIME_COUNT)
+    return total
+
+
+def _estimated_count(query: Query) -> Optional[int]:
+    # 根据数据库的统计信息估算总数，无法估算时返回None
+    table_names = _table_names(query)
+    if len(table_names) != 1:
+        return None
+    dialect = db.engine.dialect.name
+    try:
+        # 在保存点中执行，估算失败只回滚保存点，不影响会话中未提交的数据
+        with db.session.begin_nested():
+            if dialect == "mysql":
+                if query.whereclause is None:
+                    return db.session.execute(text(
+                        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"), {"name": table_names[0]}).scalar()
+                # IN的参数需要展开，EXPLAIN不接受POSTCOMPILE占位符
+                statement = query.order_by(None).statement.compile(
+                    db.engine, compile_kwargs={"render_postcompile": True})
+                row = db.session.connection().exec_driver_sql(f"EXPLAIN {statement.string}", statement.params) \
+                    .mappings().first()
+                return row["rows"] if row else None
+            if dialect == "sqlite" and query.whereclause is None:
+                # 执行过ANALYZE后sqlite_stat1中记录了表的行数
+                stat = db.session.execute(text("SELECT stat FROM sqlite_stat1 WHERE tbl = :name AND idx IS NULL"),
+                                          {"name": table_names[0]}).scalar()
+                return int(stat.split()[0]) if stat else None
+    except:
+        logger.warning(f"[page] Estimate count of {table_names[0]} failed", exc_info=True)
+    return None
 
 
-def get_page(query: Query, filter_condition: dict, page: int, per_page: int, **kwargs):
+def sparse_options(model, fields: Optional[list[str]], columns: Iterable[str],
+                   relationships: Optional[dict] = None) -> list:
+    """
+    根据请求的字段生成列表接口的加载选项：只读取输出的列（load_only），嵌套集合使用传入的选项（例如selectinload）
+    一次性加载，未请求的集合不加载。同时记录请求的字段，输出时由SparseFieldsMixin裁剪
+
+    :param model: 模型
+    :param fields: 请求的字段，None表示全部
+    :param columns: 输出模型中的列
+    :param relationships: 输出模型中的关系 -> 加载选项
+    :return: 加载选项，传给get_page
+    """
+    relationships = relationships or {}
+    g.sparse_fields = None
+    if fields:
+        unknown = set(fields) - set(columns) - set(relationships)
+        if unknown:
+            abort(422, message=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # id用于分页排序和审计，总是返回
+        fields = {"id", *fields}
+        g.sparse_fields = fields
+        columns = [column for column in columns if column in fields]
+        relationships = {name: option for name, option in relationships.items() if name in fields}
+    return [load_only(*(getattr(model, column) for column in columns)), *relationships.values()]
+
+
+def get_page(query: Query, filter_condition: dict, page: int, per_page: int, count_strategy: Optional[str] = None,
+             options: Optional[list] = None, **kwargs):
     """
     根据条件查询数据，并返回分页后的数据
 
@@ -10,20 +138,137 @@ def get_page(query: Query, filter_condition: dict, page: int, per_page: int, **k
     :param filter_condition: 查询条件
     :param page: 页数
     :param per_page: 每页数据数
+    :param count_strategy: 总数的统计方式，exact：每次执行COUNT；cached：按查询条件缓存COUNT的结果，表有变更时失效；
+        estimate：根据数据库的统计信息估算，无法估算时使用cached；none：不统计总数，只返回是否有下一页。默认为exact
+    :param options: 加载选项，例如selectinload预先加载输出的嵌套集合、load_only只读取输出的列，不影响总数的统计
     :return:
     """
     effect_filter_condition = {}
     for k, v in filter_condition.items():
         if v is not None:
             effect_filter_condition[k] = v
-    pagination = query.filter_by(**effect_filter_condition).paginate(
-        page=page,
-        per_page=per_page
-    )
+    query = query.filter_by(**effect_filter_condition)
+    if options:
+        query = query.options(*options)
+    count_strategy = count_strategy or "exact"
+    if count_strategy == "none":
+        pagination = _UncountedPagination(query, page, per_page)
+    elif count_strategy == "exact":
+        pagination = query.paginate(page=page, per_page=per_page)
+    else:
+        total = _estimated_count(query) if count_strategy == "estimate" else None
+        if total is None:
+            total = _cached_count(query)
+        pagination = query.paginate(page=page, per_page=per_page, count=False)
+        pagination.total = total
     data = pagination.items
     if not data:
         abort(404)
+    result = pagination_builder(pagination, **kwargs)
+    if pagination.pages is None:
+        result["last"] = ""
+    return {
+        "data": data,
+        "pagination": result
+    }
+
+
+def mark_count_changes(session: Session, *table_names: str):
+    """
+    绕过ORM的增删改（例如直接操作关联表）不会被自动记录，调用后在事务提交时使这些表的缓存总数失效
+
+    :param session: 会话
+    :param table_names: 表名
+    :return:
+    """
+    session.info.setdefault("count_changes", set()).update(table_names)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_count_changes(session: Session, flush_context):
+    tables: set = session.info.setdefault("count_changes", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tables.add(obj.__tablename__)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_count_changes(session: Session):
+    tables = session.info.pop("count_changes", None)
+    if tables:
+        invalidate_count(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_count_changes(session: Session):
+    session.info.pop("count_changes", None)
+
+
+def encode_cursor(value: datetime, id_: int) -> str:
+    """
+    将排序键编码为不透明的游标
+
+    :param value: 排序字段的值
+    :param id_: 主键
+    :return:
+    """
+    raw = json.dumps([value.isoformat(), id_], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[datetime, int]]:
+    """
+    解析游标，无效的游标返回None
+
+    :param cursor: encode_cursor生成的游标
+    :return: (排序字段的值, 主键)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, id_ = json.loads(raw)
+        return datetime.fromisoformat(value), int(id_)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def get_cursor_page(query: Query, filter_condition: dict, order_column: InstrumentedAttribute,
+                    id_column: InstrumentedAttribute, cursor: str, per_page: int, with_total: bool = False):
+    """
+    按(order_column, id_column)倒序的游标分页。每页从上一页最后一条记录处继续读取，
+    是一次索引范围扫描，耗时不随翻页深度增长；总数默认不统计
+
+    :param query: 模型查询
+    :param filter_condition: 查询条件
+    :param order_column: 排序字段，如operate_datetime
+    :param id_column: 主键，排序字段相同时用于确定顺序
+    :param cursor: 上一页返回的next_cursor，空字符串表示第一页
+    :param per_page: 每页数据数
+    :param with_total: 是否统计总数
+    :return:
+    """
+    effect_filter_condition = {}
+    for k, v in filter_condition.items():
+        if v is not None:
+            effect_filter_condition[k] = v
+    query = query.filter_by(**effect_filter_condition)
+    total = query.order_by(None).count() if with_total else None
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            abort(400, message="Invalid cursor")
+        value, id_ = position
+        query = query.filter(or_(order_column < value, and_(order_column == value, id_column < id_)))
+    # 多取一条用于判断是否还有下一页
+    data = query.order_by(None).order_by(order_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    if not data:
+        abort(404)
+    next_cursor = None
+    if len(data) > per_page:
+        data = data[:per_page]
+        last = data[-1]
+        next_cursor = encode_cursor(getattr(last, order_column.key), getattr(last, id_column.key))
     return {
         "data": data,
-        "pagination": pagination_builder(pagination, **kwargs)
-    }
\ No newline at end of file
+        "next_cursor": next_cursor,
+        "total": total
+    }
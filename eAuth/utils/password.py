@@ -0,0 +1,113 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from apiflask import HTTPError
+from flask import Flask
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(HTTPError):
+    """口令哈希线程池已满或计算超时"""
+
+    def __init__(self):
+        super().__init__(503, message="Server busy, please try again later")
+
+
+class PasswordHasher(object):
+    """
+    口令哈希在独立的有界线程池中计算，不占用处理请求的线程。
+
+    hashlib的scrypt/pbkdf2计算时会释放GIL，线程池即可并行计算。同时计算和排队的任务数超过
+    PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT时直接拒绝，等待超过PASSWORD_HASH_TIMEOUT时放弃等待，
+    两种情况都抛出PasswordHasherBusy（503）。登录的吞吐量由这里的参数单独控制，不影响鉴权接口。
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.app: Optional[Flask] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+        app.config.setdefault("PASSWORD_HASH_SALT_LENGTH", 16)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 4)
+        app.config.setdefault("PASSWORD_HASH_QUEUE_LIMIT", 32)
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 5)
+        app.extensions["password_hasher"] = self
+        self.app = app
+        if self._executor is None:
+            workers = app.config["PASSWORD_HASH_WORKERS"]
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+            self._slots = threading.BoundedSemaphore(workers + app.config["PASSWORD_HASH_QUEUE_LIMIT"])
+            atexit.register(self.shutdown)
+
+    def generate(self, password: str) -> str:
+        """
+        按当前配置的算法和参数生成口令哈希
+
+        :param password: 明文口令
+        :return:
+        """
+        return self._run(generate_password_hash, password,
+                         self.app.config["PASSWORD_HASH_METHOD"], self.app.config["PASSWORD_HASH_SALT_LENGTH"])
+
+    def check(self, pwhash: str, password: str) -> bool:
+        """
+        校验口令
+
+        :param pwhash: 保存的口令哈希
+        :param password: 明文口令
+        :return:
+        """
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """
+        口令哈希的算法、参数或盐长度与当前配置不一致时需要重新生成
+
+        :param pwhash: 保存的口令哈希，格式为method$salt$hash
+        :return:
+        """
+        if not pwhash or pwhash.count("$") < 2:
+            return True
+        method, salt, _ = pwhash.split("$", 2)
+        return (method != self.app.config["PASSWORD_HASH_METHOD"]
+                or len(salt) != self.app.config["PASSWORD_HASH_SALT_LENGTH"])
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            # 未初始化（如脚本中直接使用模型）时在当前线程计算
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            logger.warning("[password] Hash pool is full, reject the request")
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(func, *args)
+        except:
+            self._slots.release()
+            raise
+        # 超时放弃等待后任务仍在计算，完成时才释放名额
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.app.config["PASSWORD_HASH_TIMEOUT"])
+        except TimeoutError:
+            logger.warning("[password] Hash timeout, reject the request")
+            raise PasswordHasherBusy()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from .route import ApiRecord, RouteTrie
+
+logger = logging.getLogger(__name__)
+
+
+def build_role_tries(apis: Mapping[int, ApiRecord], role_apis: Mapping[int, Iterable[int]]) -> dict[int, RouteTrie]:
+    """
+    为每个角色构建api前缀树
+
+    :param apis: api id -> api记录
+    :param role_apis: role id -> api id列表
+    :return: role id -> 前缀树
+    """
+    role_tries = {}
+    for role_id, api_ids in role_apis.items():
+        trie = RouteTrie()
+        for api_id in api_ids:
+            api = apis.get(api_id)
+            if api is not None:
+                trie.add(api.id, api.url, api.method)
+        role_tries[role_id] = trie
+    return role_tries
+
+
+class PermissionSnapshot(object):
+    """
+    某一时刻完整的鉴权数据（api、角色与api的映射、角色的api前缀树）。
+
+    发布后不再修改，刷新时构建新的快照整体替换，同一次鉴权读到的数据总是一致的。
+    """
+    __slots__ = ("version", "apis", "role_apis", "role_tries", "created_at")
+
+    def __init__(self, version: int, apis: Mapping[int, ApiRecord], role_apis: Mapping[int, frozenset[int]],
+                 role_tries: Mapping[int, RouteTrie]):
+        self.version = version
+        self.apis = MappingProxyType(dict(apis))
+        self.role_apis = MappingProxyType(dict(role_apis))
+        self.role_tries = MappingProxyType(dict(role_tries))
+        self.created_at = time.time()
+
+    def get_role_tries(self, role_ids: Iterable[int]) -> list[RouteTrie]:
+        """
+        获取多个角色的api前缀树
+
+        :param role_ids: 角色id列表
+        :return:
+        """
+        tries = []
+        for role_id in role_ids:
+            trie = self.role_tries.get(role_id)
+            if trie:
+                tries.append(trie)
+        return tries
+
+
+class PermissionStore(object):
+    """
+    持有当前的鉴权快照。发布新快照只是一次引用替换，读取不需要加锁
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[PermissionSnapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[PermissionSnapshot]:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else 0
+
+    def publish(self, apis: Mapping[int, ApiRecord], role_apis: Mapping[int, Iterable[int]]) -> PermissionSnapshot:
+        """
+        构建并发布新的鉴权快照，版本号单调递增
+
+        :param apis: api id -> api记录
+        :param role_apis: role id -> api id列表
+        :return: 新快照
+        """
+        role_apis = {role_id: frozenset(api_ids) for role_id, api_ids in role_apis.items()}
+        role_tries = build_role_tries(apis, role_apis)
+        with self._lock:
+            snapshot = PermissionSnapshot(self.version + 1, apis, role_apis, role_tries)
+            self._snapshot = snapshot
+        logger.info(f"[permission] Publish snapshot v{snapshot.version}: "
+                    f"{len(snapshot.apis)} apis, {len(snapshot.role_apis)} roles")
+        return snapshot
+
+    def update(self, apis: Mapping[int, ApiRecord], removed_api_ids: Iterable[int],
+               role_apis: Mapping[int, Iterable[int]], removed_role_ids: Iterable[int]) -> Optional[PermissionSnapshot]:
+        """
+        在当前快照的基础上增量更新并发布新快照，只重建受影响角色的前缀树
+
+        :param apis: 新增或修改的api记录
+        :param removed_api_ids: 删除的api id
+        :param role_apis: 新增或修改的角色 -> 该角色全部的api id
+        :param removed_role_ids: 删除的角色id
+        :return: 新快照，尚未发布过快照时返回None
+        """
+        with self._lock:
+            base = self._snapshot
+            if base is None:
+                return None
+            changed_api_ids = set(apis) | set(removed_api_ids)
+            removed_api_ids = set(removed_api_ids)
+            new_apis = dict(base.apis)
+            new_apis.update(apis)
+            for api_id in removed_api_ids:
+                new_apis.pop(api_id, None)
+
+            new_role_apis = dict(base.role_apis)
+            changed_role_apis = {role_id: frozenset(api_ids) for role_id, api_ids in role_apis.items()}
+            # 包含了变更api的角色也需要重建前缀树
+            for role_id, api_ids in base.role_apis.items():
+                if role_id not in changed_role_apis and api_ids & changed_api_ids:
+                    changed_role_apis[role_id] = api_ids - removed_api_ids
+            new_role_apis.update(changed_role_apis)
+            new_role_tries = dict(base.role_tries)
+            new_role_tries.update(build_role_tries(new_apis, changed_role_apis))
+            for role_id in removed_role_ids:
+                new_role_apis.pop(role_id, None)
+                new_role_tries.pop(role_id, None)
+
+            snapshot = PermissionSnapshot(base.version + 1, new_apis, new_role_apis, new_role_tries)
+            self._snapshot = snapshot
+        logger.info(f"[permission] Update snapshot v{snapshot.version}: {len(changed_api_ids)} apis, "
+                    f"{len(changed_role_apis)} roles changed")
+        return snapshot
+
+
+permission_store = PermissionStore()
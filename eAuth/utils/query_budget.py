@@ -0,0 +1,180 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import Flask, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 当前上下文中正在计数的QueryCounter，可以嵌套
+_counters: ContextVar[tuple] = ContextVar("query_counters", default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    SQL语句数超过预算
+    """
+
+
+class QueryCounter(object):
+    """
+    记录执行的SQL语句
+    """
+
+    def __init__(self, max_queries: Optional[int] = None):
+        self.max_queries = max_queries
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.max_queries is not None and self.count > self.max_queries
+
+    def report(self, name: str) -> str:
+        lines = [f"{name} executed {self.count} statements, budget is {self.max_queries}:"]
+        lines.extend(f"  {i}. {statement}" for i, statement in enumerate(self.statements, 1))
+        return "\n".join(lines)
+
+
+# 保存点与BEGIN、COMMIT一样属于事务控制，不计入
+_SAVEPOINT_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if statement.startswith(_SAVEPOINT_PREFIXES):
+        return
+    for counter in _counters.get():
+        counter.statements.append(statement)
+
+
+class QueryBudget(object):
+    """
+    按请求统计SQL语句数，超过接口的预算时记录警告，QUERY_BUDGET_RAISE为True时抛出QueryBudgetExceeded（用于测试）。
+
+    接口的预算由limit装饰器设置，未设置的使用QUERY_BUDGET_DEFAULT。统计基于Engine的before_cursor_execute事件，
+    只计入请求线程中执行的语句，后台线程（例如异步写入审计日志）不计入。
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault("QUERY_BUDGET_ENABLED", False)
+        app.config.setdefault("QUERY_BUDGET_DEFAULT", 30)
+        app.config.setdefault("QUERY_BUDGET_RAISE", False)
+        app.extensions["query_budget"] = self
+        if not self._listening:
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            self._listening = True
+
+        @app.before_request
+        def start_query_counter():
+            if app.config["QUERY_BUDGET_ENABLED"]:
+                counter = QueryCounter(self.budget_of(request.endpoint, request.method))
+                request.environ["eauth.query_counter"] = (counter, self._start(counter))
+
+        @app.after_request
+        def check_query_budget(response):
+            started = request.environ.get("eauth.query_counter")
+            if started is not None:
+                self._check(started[0], request.endpoint)
+            return response
+
+        @app.teardown_request
+        def stop_query_counter(exc):
+            # 视图抛出异常时after_request不会执行，在这里结束计数
+            started = request.environ.pop("eauth.query_counter", None)
+            if started is not None:
+                _counters.reset(started[1])
+
+    @staticmethod
+    def _start(counter: QueryCounter):
+        return _counters.set(_counters.get() + (counter,))
+
+    @staticmethod
+    def budget_of(endpoint: Optional[str], method: str) -> int:
+        """
+        获取接口的预算
+
+        :param endpoint: 接口
+        :param method: 请求方法，MethodView的预算设置在对应的方法上
+        :return:
+        """
+        func = current_app.view_functions.get(endpoint) if endpoint else None
+        view_class = getattr(func, "view_class", None)
+        if view_class is not None:
+            func = getattr(view_class, method.lower(), None)
+        budget = getattr(func, "query_budget", None)
+        return current_app.config["QUERY_BUDGET_DEFAULT"] if budget is None else budget
+
+    @staticmethod
+    def _check(counter: QueryCounter, name: str):
+        if not counter.exceeded:
+            return
+        metrics.inc("eauth_query_budget_exceeded_total", endpoint=name)
+        message = counter.report(name)
+        if current_app.config["QUERY_BUDGET_RAISE"]:
+            raise QueryBudgetExceeded(message)
+        logger.warning(f"[query budget] {message}")
+
+    @staticmethod
+    def limit(max_queries: int):
+        """
+        设置接口的SQL语句数预算
+
+        e.g.
+        ```
+        @app.get('/api/config/user')
+        @app.input(...)
+        @app.output(...)
+        @query_budget.limit(5)  # 放在最下面
+        def get_users(...):
+            ...
+        ```
+
+        :param max_queries: 每次请求最多执行的语句数
+        :return:
+        """
+        def decorator(func):
+            func.query_budget = max_queries
+            return func
+        return decorator
+
+    @contextmanager
+    def count(self, max_queries: Optional[int] = None, name: str = "block"):
+        """
+        统计代码块中执行的SQL语句，用于测试
+
+        e.g.
+        ```
+        with query_budget.count(3) as counter:
+            client.get(...)
+        ```
+
+        :param max_queries: 预算，超过时退出代码块时抛出QueryBudgetExceeded
+        :param name: 预算超出时报告中的名称
+        :return:
+        """
+        counter = QueryCounter(max_queries)
+        token = self._start(counter)
+        try:
+            yield counter
+        finally:
+            _counters.reset(token)
+        if counter.exceeded:
+            raise QueryBudgetExceeded(counter.report(name))
+
+
+query_budget = QueryBudget()
+metrics.describe("eauth_query_budget_exceeded_total", "counter", "Requests that executed more SQL statements than "
+                                                                 "their budget.")
@@ -0,0 +1,147 @@
+import re
+from functools import lru_cache
+from itertools import takewhile
+from typing import Iterable, NamedTuple, Optional
+from urllib.parse import urlparse
+
+# 路径参数`{xx}`可匹配的字符，与models.url_match保持一致
+PARAM_CHARS = r'[a-zA-Z0-9\u4e00-\u9fff\_\-\.~]+'
+PARAM_PATTERN = re.compile(r'{[^}]*?}')
+SEGMENT_PATTERN = re.compile(PARAM_CHARS)
+
+
+@lru_cache(maxsize=65536)
+def compile_url(url: str) -> re.Pattern:
+    """
+    将url模板编译为正则，`{xx}`替换为路径参数，其余部分按字面匹配。同一模板只编译一次
+
+    :param url: api的url模板
+    :return:
+    """
+    return re.compile(PARAM_CHARS.join(re.escape(part) for part in PARAM_PATTERN.split(url)))
+
+
+class ApiRecord(NamedTuple):
+    """
+    缓存的api记录，代替ORM对象
+    """
+    id: int
+    url: str
+    method: str
+
+    @property
+    def pattern(self) -> re.Pattern:
+        return compile_url(self.url)
+
+
+class _Node(object):
+    __slots__ = ("static", "param", "api_ids")
+
+    def __init__(self):
+        self.static: dict[str, "_Node"] = {}  # 固定路径段
+        self.param: Optional["_Node"] = None  # 整段为`{xx}`的通配节点
+        self.api_ids: set[int] = set()  # 在该节点结束的api
+
+
+class RouteTrie(object):
+    """
+    api鉴权索引：method -> 路径分段前缀树，整段的`{xx}`作为通配节点。
+
+    匹配时按路径段逐层查找，耗时只与请求路径深度相关，与api数量无关。
+    路径段中只有一部分是参数的api（例如`/file/{name}.txt`）无法放入前缀树，按参数之前的固定路径段分组，
+    匹配时只逐个尝试固定路径段与请求相同的那一组正则。正则在首次匹配时才编译，整段参数的api不需要编译正则。
+    """
+
+    def __init__(self):
+        self._roots: dict[str, _Node] = {}
+        # method -> 参数之前的固定路径段 -> api id -> url模板
+        self._patterns: dict[str, dict[tuple[str, ...], dict[int, str]]] = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, api_id: int, url: str, method: str):
+        """
+        添加api
+
+        :param api_id: api id
+        :param url: api的url模板，例如`/api/config/role/{id}`
+        :param method: 请求方法
+        """
+        method = method.upper()
+        segments = url.split('/')
+        if any(PARAM_PATTERN.search(segment) and not PARAM_PATTERN.fullmatch(segment) for segment in segments):
+            # 参数不能匹配`/`，请求与模板的路径段一一对应，固定路径段相同的模板才可能匹配
+            prefix = tuple(takewhile(lambda segment: not PARAM_PATTERN.search(segment), segments))
+            self._patterns.setdefault(method, {}).setdefault(prefix, {})[api_id] = url
+            self._size += 1
+            return
+
+        node = self._roots.setdefault(method, _Node())
+        for segment in segments:
+            if PARAM_PATTERN.fullmatch(segment):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        node.api_ids.add(api_id)
+        self._size += 1
+
+    def match(self, url: str, method: str) -> Optional[int]:
+        """
+        查找与请求匹配的api
+
+        :param url: 请求url
+        :param method: 请求方法
+        :return: 匹配的api id，无匹配返回None
+        """
+        method = method.upper()
+        path = urlparse(url).path
+        segments = path.split('/')
+        root = self._roots.get(method)
+        if root is not None:
+            api_id = self._walk(root, segments, 0)
+            if api_id is not None:
+                return api_id
+        groups = self._patterns.get(method)
+        if not groups:
+            return None
+        for length in range(len(segments)):
+            group = groups.get(tuple(segments[:length]))
+            if not group:
+                continue
+            for api_id, template in group.items():
+                if compile_url(template).fullmatch(path):
+                    return api_id
+        return None
+
+    def _walk(self, node: _Node, segments: list[str], index: int) -> Optional[int]:
+        if index == len(segments):
+            return next(iter(node.api_ids), None)
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            api_id = self._walk(child, segments, index + 1)
+            if api_id is not None:
+                return api_id
+        if node.param is not None and SEGMENT_PATTERN.fullmatch(segment):
+            return self._walk(node.param, segments, index + 1)
+        return None
+
+
+def match_any(tries: Iterable[RouteTrie], url: str, method: str) -> Optional[int]:
+    """
+    在多个前缀树（例如用户所有角色）中查找与请求匹配的api
+
+    :param tries: 前缀树列表
+    :param url: 请求url
+    :param method: 请求方法
+    :return: 匹配的api id，无匹配返回None
+    """
+    for trie in tries:
+        api_id = trie.match(url, method)
+        if api_id is not None:
+            return api_id
+    return None
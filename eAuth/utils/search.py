@@ -0,0 +1,279 @@
+import logging
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, or_, select, delete, insert, func, event, inspect
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.elements import ColumnElement
+
+from ..extensions import db
+
+logger = logging.getLogger(__name__)
+
+# 三元组倒排索引：(表, 字段, 三元组) -> 行id，主键同时作为查询索引
+search_trigram = db.Table(
+    'search_trigram',
+    db.Column('table_name', db.String(32), primary_key=True),
+    db.Column('field', db.String(32), primary_key=True),
+    # mysql默认的排序规则忽略重音，'res'和'rés'会被视为相同的主键，三元组按二进制比较
+    db.Column('gram', db.String(12).with_variant(mysql.VARCHAR(12, collation='utf8mb4_bin'), 'mysql'),
+              primary_key=True),
+    db.Column('row_id', db.Integer, primary_key=True, autoincrement=False),
+    # 记录增删改及归档时按行id删除索引
+    db.Index('ix_search_trigram_table_row', 'table_name', 'row_id'),
+)
+
+# 表名 -> 建立索引的字段
+_registry: dict[str, tuple[str, ...]] = {}
+
+
+def trigrams(value: Optional[str]) -> set[str]:
+    """
+    拆分为小写的三元组，不足三个字符时没有三元组
+
+    :param value: 字段值
+    :return:
+    """
+    if not value:
+        return set()
+    value = value.lower()
+    return set(value[i:i + 3] for i in range(len(value) - 2))
+
+
+def _enabled() -> bool:
+    return has_app_context() and current_app.config.get("SEARCH_INDEX_ENABLED", False)
+
+
+def _index_values(connection, table_name: str, rows: Iterable[tuple[int, dict]]):
+    values = []
+    for row_id, row in rows:
+        for field in _registry[table_name]:
+            for gram in trigrams(row.get(field)):
+                values.append({"table_name": table_name, "field": field, "gram": gram, "row_id": row_id})
+    if values:
+        connection.execute(insert(search_trigram), values)
+
+
+@contextmanager
+def _isolated(connection, table_name: str):
+    """
+    在保存点中维护索引，失败时只回滚索引的变更并记录错误，不影响记录本身的写入。
+    缺失的索引可以通过flask reindex-search重建
+    """
+    try:
+        with connection.begin_nested():
+            yield
+    except SQLAlchemyError:
+        logger.error(f"[search] Update the index of {table_name} failed", exc_info=True)
+
+
+def _unindex(connection, table_name: str, row_ids: Iterable[int], fields: Optional[Iterable[str]] = None):
+    row_ids = list(row_ids)
+    if not row_ids:
+        return
+    statement = delete(search_trigram).where(search_trigram.c.table_name == table_name,
+                                             search_trigram.c.row_id.in_(row_ids))
+    if fields is not None:
+        statement = statement.where(search_trigram.c.field.in_(list(fields)))
+    connection.execute(statement)
+
+
+def is_indexed(model) -> bool:
+    return model.__tablename__ in _registry and _enabled()
+
+
+def index_rows(connection, model, rows: Iterable[tuple[int, dict]]):
+    """
+    为新写入的记录建立索引，用于绕过ORM的批量写入
+
+    :param connection: 与写入处于同一事务的连接
+    :param model: 模型
+    :param rows: (id, 字段 -> 值)
+    :return:
+    """
+    if is_indexed(model):
+        with _isolated(connection, model.__tablename__):
+            _index_values(connection, model.__tablename__, rows)
+
+
+def unindex_rows(connection, model, row_ids: Iterable[int]):
+    """
+    删除记录的索引，用于绕过ORM的批量删除
+
+    :param connection: 与删除处于同一事务的连接
+    :param model: 模型
+    :param row_ids: 删除的记录id
+    :return:
+    """
+    if is_indexed(model):
+        with _isolated(connection, model.__tablename__):
+            _unindex(connection, model.__tablename__, row_ids)
+
+
+def _inserted_ids(session, table, rows: list[dict]) -> list[int]:
+    """
+    批量写入并返回各行的主键，按rows的顺序
+
+    :param session: 数据库会话
+    :param table: 表
+    :param rows: 字段 -> 值
+    :return:
+    """
+    bind = session.get_bind()
+    if bind.dialect.name == "sqlite":
+        # sqlite的写入是串行的，一条多行INSERT中新行的rowid依次加一，lastrowid为最后一行的id
+        lastrowid = session.execute(insert(table).values(rows)).lastrowid
+        return list(range(lastrowid - len(rows) + 1, lastrowid + 1))
+    if bind.dialect.insert_executemany_returning_sort_by_parameter_order:
+        return session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    return [session.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def _unindexed_rows(session, model, first_id: int) -> list[tuple[int, dict]]:
+    """
+    范围扫描first_id之后尚未建立索引的记录
+
+    可见的记录中，其它进程写入的已在其写入事务中建立了索引，未提交的不可见，
+    剩下的就是本事务写入的记录。没有三元组的记录会被重复扫描，但不会写入索引
+
+    :param session: 与写入处于同一事务的会话
+    :param model: 模型
+    :param first_id: 本次写入的第一条记录的id
+    :return: (id, 字段 -> 值)
+    """
+    table = model.__table__
+    indexed = select(search_trigram.c.row_id).where(search_trigram.c.table_name == table.name,
+                                                    search_trigram.c.row_id == table.c.id)
+    rows = session.execute(
+        select(table.c.id, *(table.c[field] for field in _registry[table.name]))
+        .where(table.c.id >= first_id, ~indexed.exists())).mappings().all()
+    return [(row["id"], row) for row in rows]
+
+
+def insert_rows(session, model, rows: list[dict]):
+    """
+    批量写入记录并建立索引，记录和索引各用一条语句（或一次executemany）写入
+
+    :param session: 数据库会话
+    :param model: 模型
+    :param rows: 字段 -> 值，各行的字段相同
+    :return:
+    """
+    if not is_indexed(model):
+        session.execute(insert(model), rows)
+        return
+    if session.get_bind().dialect.name == "mysql":
+        # mysql没有RETURNING，且innodb_autoinc_lock_mode=2（MySQL 8默认）时并发写入的自增值会交错，
+        # 不能由LAST_INSERT_ID()推算各行的id。写入后从第一条记录的id开始范围扫描取得新记录
+        first_id = session.execute(insert(model.__table__).values(rows)).lastrowid
+        index_rows(session.connection(), model, _unindexed_rows(session, model, first_id))
+        return
+    ids = _inserted_ids(session, model.__table__, rows)
+    index_rows(session.connection(), model, zip(ids, rows))
+
+
+def register(model, *fields: str):
+    """
+    为模型的字段建立三元组索引，通过ORM的增删改自动维护
+
+    :param model: 模型
+    :param fields: 字段名
+    :return:
+    """
+    table_name = model.__tablename__
+    _registry[table_name] = fields
+
+    @event.listens_for(model, "after_insert")
+    def _after_insert(mapper, connection, target):
+        if _enabled():
+            with _isolated(connection, table_name):
+                _index_values(connection, table_name,
+                              [(target.id, {field: getattr(target, field) for field in fields})])
+
+    @event.listens_for(model, "after_update")
+    def _after_update(mapper, connection, target):
+        if not _enabled():
+            return
+        state = inspect(target)
+        changed = [field for field in fields if state.attrs[field].history.has_changes()]
+        if changed:
+            with _isolated(connection, table_name):
+                _unindex(connection, table_name, [target.id], changed)
+                _index_values(connection, table_name,
+                              [(target.id, {field: getattr(target, field) for field in changed})])
+
+    @event.listens_for(model, "after_delete")
+    def _after_delete(mapper, connection, target):
+        if _enabled():
+            with _isolated(connection, table_name):
+                _unindex(connection, table_name, [target.id])
+
+
+def reindex(model, batch_size: int = 1000) -> int:
+    """
+    重建模型的全部索引
+
+    :param model: 已注册的模型
+    :param batch_size: 每批处理的记录数
+    :return: 处理的记录数
+    """
+    table_name = model.__tablename__
+    fields = _registry[table_name]
+    table = model.__table__
+    db.session.execute(delete(search_trigram).where(search_trigram.c.table_name == table_name))
+    db.session.commit()
+    last_id, total = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, *(table.c[field] for field in fields))
+            .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)).mappings().all()
+        if not rows:
+            break
+        _index_values(db.session.connection(), table_name, [(row["id"], row) for row in rows])
+        db.session.commit()
+        last_id = rows[-1]["id"]
+        total += len(rows)
+    logger.info(f"[search] Reindex {total} {table_name} records")
+    return total
+
+
+def _next_prefix(value: str) -> str:
+    return value[:-1] + chr(ord(value[-1]) + 1)
+
+
+def search_condition(model, fields: Iterable[str], term: str, mode: str = "contains") -> ColumnElement:
+    """
+    生成搜索条件，多个字段任意一个匹配即可
+
+    exact：等值查询；prefix：前缀查询，转换为范围条件以使用字段上的B树索引；
+    contains：子串查询，字段建立了三元组索引且关键字不少于三个字符时先由索引筛选候选记录，再用LIKE复核，
+    否则退化为LIKE全表扫描
+
+    :param model: 模型
+    :param fields: 字段名
+    :param term: 关键字
+    :param mode: exact/prefix/contains
+    :return:
+    """
+    conditions = []
+    table_name = model.__tablename__
+    for field in fields:
+        column = getattr(model, field)
+        if mode == "exact":
+            conditions.append(column == term)
+        elif mode == "prefix":
+            conditions.append(and_(column >= term, column < _next_prefix(term)))
+        else:
+            grams = trigrams(term)
+            condition = column.contains(term, autoescape=True)
+            if grams and field in _registry.get(table_name, ()) and _enabled():
+                candidates = select(search_trigram.c.row_id).where(
+                    search_trigram.c.table_name == table_name,
+                    search_trigram.c.field == field,
+                    search_trigram.c.gram.in_(grams)
+                ).group_by(search_trigram.c.row_id).having(func.count() == len(grams))
+                condition = and_(model.id.in_(candidates), condition)
+            conditions.append(condition)
+    return or_(*conditions)
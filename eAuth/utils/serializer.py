@@ -0,0 +1,164 @@
+import logging
+from collections.abc import Mapping
+from functools import wraps
+from typing import Callable, Union
+
+from flask import current_app, jsonify, Response
+from marshmallow import Schema, fields, missing
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Dumper = Callable[[object], dict]
+
+
+def _number(cast):
+    def convert(value):
+        return None if value is None else cast(value)
+    return convert
+
+
+def _string(value):
+    return None if value is None else str(value)
+
+
+def _boolean(field: fields.Boolean):
+    truthy, falsy = field.truthy, field.falsy
+
+    def convert(value):
+        if value is None:
+            return None
+        try:
+            if value in truthy:
+                return True
+            if value in falsy:
+                return False
+        except TypeError:
+            pass
+        return bool(value)
+    return convert
+
+
+def _datetime(field: fields.DateTime):
+    if field.format and field.format not in field.SERIALIZATION_FUNCS:
+        date_format = field.format
+
+        def convert(value):
+            return None if value is None else value.strftime(date_format)
+        return convert
+    # iso、timestamp等格式交给字段本身处理
+    return lambda value: field._serialize(value, None, None)
+
+
+def _nested(field: fields.Nested, many: bool = False):
+    if field.only or field.exclude:
+        raise TypeError(f"Nested field with only/exclude is not supported: {field}")
+    dump = compile_schema(field.schema.__class__)
+    if many or field.many:
+        return lambda value: None if value is None else [dump(item) for item in value]
+    return lambda value: None if value is None else dump(value)
+
+
+def _converter(field: fields.Field) -> Callable:
+    # 子类在前：Url继承String，Integer继承Number
+    if isinstance(field, fields.Nested):
+        return _nested(field)
+    if isinstance(field, fields.List):
+        if isinstance(field.inner, fields.Nested):
+            return _nested(field.inner, many=True)
+        inner = _converter(field.inner)
+        return lambda value: None if value is None else [inner(item) for item in value]
+    if isinstance(field, fields.Boolean):
+        return _boolean(field)
+    if isinstance(field, fields.Integer) and not field.as_string:
+        return _number(int)
+    if isinstance(field, fields.Float) and not field.as_string:
+        return _number(float)
+    if isinstance(field, fields.DateTime) and type(field) in (fields.DateTime, fields.NaiveDateTime):
+        return _datetime(field)
+    if isinstance(field, fields.String):
+        return _string
+    raise TypeError(f"Field {field.__class__.__name__} is not supported")
+
+
+_compiled: dict[type, Dumper] = {}
+
+
+def compile_schema(schema_cls: type) -> Dumper:
+    """
+    把输出模型编译为专用的dump函数：按字段预先确定输出键、读取方式和转换函数，运行时不再经过marshmallow逐字段分派。
+    输出与schema.dump一致（值为None的字段输出null，取不到的字段不输出，dump_default照常生效），
+    只支持Integer、Float、String（含Url等子类）、Boolean、DateTime、Nested、List字段，
+    带pre_dump/post_dump等钩子的模型（例如实现了AuditLogInterface的模型）不能编译
+
+    :param schema_cls: 输出模型类
+    :return: 对象或字典 -> 输出的字典
+    """
+    dump = _compiled.get(schema_cls)
+    if dump is not None:
+        return dump
+    schema: Schema = schema_cls()
+    if any(schema._hooks.values()):
+        raise TypeError(f"{schema_cls.__name__} has processing hooks and can not be compiled")
+    plan = []
+    for name, field in schema.dump_fields.items():
+        attribute = field.attribute or name
+        if "." in attribute:
+            raise TypeError(f"Dotted attribute is not supported: {schema_cls.__name__}.{name}")
+        plan.append((field.data_key or name, attribute, _converter(field), field.dump_default))
+    plan = tuple(plan)
+
+    def dump(obj) -> dict:
+        result = {}
+        is_mapping = isinstance(obj, Mapping)
+        for key, attribute, convert, default in plan:
+            value = obj.get(attribute, missing) if is_mapping else getattr(obj, attribute, missing)
+            if value is missing:
+                if default is missing:
+                    continue
+                value = default() if callable(default) else default
+            result[key] = convert(value)
+        return result
+
+    _compiled[schema_cls] = dump
+    return dump
+
+
+def fast_output(schema_cls: type, status_code: int = 200):
+    """
+    只读接口的快速输出：用compile_schema编译的函数序列化视图的返回值，直接返回响应。
+    接口文档仍由output装饰器生成，本装饰器放在output下面，返回的是Response对象，output会原样返回；
+    FAST_SERIALIZER_ENABLED为False时不做处理，仍由output通过marshmallow输出。
+    视图返回的是Response对象或(数据, 状态码)时不做处理，不要用于带operate_log的接口（依赖output返回的元组）
+
+    e.g.
+    ```
+    @log_api.get('/operate-log')
+    @log_api.input(...)
+    @log_api.output(OperateLogPageOutputSchema)
+    @fast_output(OperateLogPageOutputSchema)  # 与output使用同一个模型
+    @query_budget.limit(5)
+    def query_operate_log(...):
+        ...
+    ```
+
+    :param schema_cls: 输出模型类，与output装饰器的一致
+    :param status_code: 响应码，与output装饰器的一致
+    :return:
+    """
+    dump = compile_schema(schema_cls)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Union[Response, object]:
+            rv = func(*args, **kwargs)
+            if (isinstance(rv, (Response, tuple)) or not current_app.config.get("FAST_SERIALIZER_ENABLED", True)
+                    or current_app.config.get("BASE_RESPONSE_SCHEMA") is not None):
+                return rv
+            with metrics.timer("eauth_phase_seconds", phase="serialize"):
+                response = jsonify(dump(rv))
+            response.status_code = status_code
+            return response
+        return wrapper
+    return decorator
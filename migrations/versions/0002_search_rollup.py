@@ -0,0 +1,76 @@
+"""search index and log rollup tables
+
+增加搜索的三元组索引表和审计日志的按小时汇总表。已有数据升级后需要执行flask reindex-search
+建立搜索索引、执行flask rollup-log汇总历史日志
+
+Revision ID: 0002_search_rollup
+Revises: 0001_baseline
+Create Date: 2026-10-18 10:12:31.508217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_search_rollup'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_trigram',
+    sa.Column('table_name', sa.String(length=32), nullable=False),
+    sa.Column('field', sa.String(length=32), nullable=False),
+    sa.Column('gram', sa.String(length=12).with_variant(mysql.VARCHAR(length=12, collation='utf8mb4_bin'), 'mysql'),
+              nullable=False),
+    sa.Column('row_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.PrimaryKeyConstraint('table_name', 'field', 'gram', 'row_id')
+    )
+    with op.batch_alter_table('search_trigram', schema=None) as batch_op:
+        batch_op.create_index('ix_search_trigram_table_row', ['table_name', 'row_id'], unique=False)
+
+    op.create_table('operate_log_hourly',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=True),
+    sa.Column('username', sa.String(length=32), nullable=True),
+    sa.Column('ip_addr', sa.String(length=64), nullable=True),
+    sa.Column('operate_type', sa.String(length=16), nullable=True),
+    sa.Column('operate_api', sa.String(length=256), nullable=True),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('success', sa.Boolean(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('operate_log_hourly', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_operate_log_hourly_hour'), ['hour'], unique=False)
+
+    op.create_table('security_log_hourly',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=True),
+    sa.Column('username', sa.String(length=32), nullable=True),
+    sa.Column('ip_addr', sa.String(length=64), nullable=True),
+    sa.Column('operate', sa.String(length=32), nullable=True),
+    sa.Column('success', sa.Boolean(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('security_log_hourly', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_security_log_hourly_hour'), ['hour'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('security_log_hourly', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_security_log_hourly_hour'))
+
+    op.drop_table('security_log_hourly')
+    with op.batch_alter_table('operate_log_hourly', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_operate_log_hourly_hour'))
+
+    op.drop_table('operate_log_hourly')
+    with op.batch_alter_table('search_trigram', schema=None) as batch_op:
+        batch_op.drop_index('ix_search_trigram_table_row')
+
+    op.drop_table('search_trigram')
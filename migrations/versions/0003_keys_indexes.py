@@ -0,0 +1,76 @@
+"""association keys and log indexes
+
+roles_apis、users_roles增加复合主键和反查索引，升级前删除重复的绑定关系；
+日志表的用户名索引改为覆盖常用过滤和排序的复合索引
+
+Revision ID: 0003_keys_indexes
+Revises: 0002_search_rollup
+Create Date: 2026-10-17 15:48:09.623800
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_keys_indexes'
+down_revision = '0002_search_rollup'
+branch_labels = None
+depends_on = None
+
+# 关联表 -> (第一列, 第二列)
+ASSOCIATIONS = {
+    'roles_apis': ('role_id', 'api_id'),
+    'users_roles': ('user_id', 'role_id'),
+}
+
+
+def deduplicate(table: str, columns: tuple):
+    # 通用SQL去重：保留不重复且非空的绑定关系后重新写入
+    first, second = columns
+    op.execute(f"CREATE TABLE {table}_dedup AS SELECT DISTINCT {first}, {second} FROM {table} "
+               f"WHERE {first} IS NOT NULL AND {second} IS NOT NULL")
+    op.execute(f"DELETE FROM {table}")
+    op.execute(f"INSERT INTO {table} ({first}, {second}) SELECT {first}, {second} FROM {table}_dedup")
+    op.drop_table(f"{table}_dedup")
+
+
+def upgrade():
+    for table, columns in ASSOCIATIONS.items():
+        first, second = columns
+        deduplicate(table, columns)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(first, existing_type=sa.INTEGER(), nullable=False)
+            batch_op.alter_column(second, existing_type=sa.INTEGER(), nullable=False)
+            batch_op.create_primary_key(f'pk_{table}', [first, second])
+            batch_op.create_index(batch_op.f(f'ix_{table}_{second}'), [second], unique=False)
+
+    with op.batch_alter_table('operate_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_operate_log_username')
+        batch_op.create_index('ix_operate_log_username_datetime', ['username', 'operate_datetime'], unique=False)
+
+    with op.batch_alter_table('security_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_security_log_username')
+        batch_op.create_index('ix_security_log_username_success_datetime',
+                              ['username', 'success', 'operate_datetime'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('security_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_security_log_username_success_datetime')
+        batch_op.create_index('ix_security_log_username', ['username'], unique=False)
+
+    with op.batch_alter_table('operate_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_operate_log_username_datetime')
+        batch_op.create_index('ix_operate_log_username', ['username'], unique=False)
+
+    mysql = op.get_bind().dialect.name == 'mysql'
+    for table, (first, second) in ASSOCIATIONS.items():
+        if mysql:
+            # 删除主键后第一列的外键仍需要以它开头的索引
+            op.create_index(f'ix_{table}_{first}', table, [first], unique=False)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_{second}'))
+            batch_op.drop_constraint(f'pk_{table}', type_='primary')
+            batch_op.alter_column(second, existing_type=sa.INTEGER(), nullable=True)
+            batch_op.alter_column(first, existing_type=sa.INTEGER(), nullable=True)
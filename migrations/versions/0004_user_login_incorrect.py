@@ -0,0 +1,28 @@
+"""user last login incorrect
+
+user增加最近一次登录错误的时间，登录的短期锁定不再依赖异步写入的安全日志
+
+Revision ID: 0004_user_login_incorrect
+Revises: 0003_keys_indexes
+Create Date: 2026-10-17 18:05:42.317905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_user_login_incorrect'
+down_revision = '0003_keys_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_login_incorrect', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('last_login_incorrect')
@@ -0,0 +1,170 @@
+import unittest
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User, Role, Api
+from eAuth.utils.auth import logout_user
+
+
+class TestFastCheck(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/auth/check/fast"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        reader = Role(name="reader", apis=[
+            Api(url="/api/demo/item", method="GET"),
+            Api(url="/api/demo/item/{id}", method="GET"),
+        ])
+        self.user = User(username="user", email="user@example.com", roles=[reader])
+        self.other = User(username="other", email="other@example.com")
+        self.admin = User(username="admin", email="admin@example.com")
+        db.session.add_all([self.user, self.other, self.admin])
+        db.session.commit()
+        cache_auth()
+        self.headers = {"Authorization": self.user.auth_token}
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def assert_same(self, headers: dict, **kwargs):
+        """快速路径与/api/auth/check的响应码一致（200对应204），且没有响应体"""
+        expected = self.client.post("/api/auth/check", headers=headers, **kwargs).status_code
+        res = self.client.post(self.url, headers=headers, **kwargs)
+        self.assertEqual(res.status_code, 204 if expected == 200 else expected, msg=kwargs)
+        self.assertEqual(res.data, b"")
+        return res.status_code
+
+    def test_equivalence(self):
+        """鉴权结果与原接口一致"""
+        admin_headers = {"Authorization": self.admin.auth_token}
+        other_headers = {"Authorization": self.other.auth_token}
+        for url, method in (("/api/demo/item", "GET"), ("/api/demo/item/1", "GET"),
+                            ("/api/demo/item?page=2", "GET"), ("/api/demo/item/1", "PUT"),
+                            ("/api/demo/order", "GET"), ("", "")):
+            for headers in (self.headers, admin_headers, other_headers):
+                self.assert_same(headers, json={"url": url, "method": method})
+        self.assertEqual(self.assert_same(self.headers, json={"url": "/api/demo/item/1", "method": "GET"}), 204)
+        self.assertEqual(self.assert_same(self.headers, json={"url": "/api/demo/order", "method": "GET"}), 403)
+
+    def test_permission(self):
+        """接口本身的鉴权与原接口一致：移出白名单后需要绑定接口的权限"""
+        white_list = self.app.config["PERMISSION_WHITE_LIST"]
+        self.app.config["PERMISSION_WHITE_LIST"] = set()
+        try:
+            admin_headers = {"Authorization": self.admin.auth_token}
+            data = {"url": "/api/demo/item", "method": "GET"}
+            self.assertEqual(self.assert_same(self.headers, json=data), 403)
+            self.assertEqual(self.assert_same(self.headers, json=[1]), 403)
+            # admin通过接口鉴权，进入参数校验
+            self.assertEqual(self.assert_same(admin_headers, json=[1]), 422)
+            self.assert_same(admin_headers, json=data)
+            self.assertEqual(self.client.get(self.url, headers={**self.headers, "X-Original-URI": "/api/demo/item",
+                                                                "X-Original-Method": "GET"}).status_code, 403)
+
+            role = Role.query.filter_by(name="reader").first()
+            role.apis.extend([Api(url="/api/auth/check", method="POST"), Api(url=self.url, method="POST")])
+            db.session.commit()
+            for url, method in (("/api/demo/item", "GET"), ("/api/demo/order", "GET")):
+                self.assert_same(self.headers, json={"url": url, "method": method})
+            self.assertEqual(self.assert_same(self.headers, json=data), 204)
+        finally:
+            self.app.config["PERMISSION_WHITE_LIST"] = white_list
+
+    def test_authenticate(self):
+        """认证失败返回401"""
+        data = {"url": "/api/demo/item", "method": "GET"}
+        self.assertEqual(self.assert_same({}, json=data), 401)
+        self.assertEqual(self.assert_same({"Authorization": "invalid"}, json=data), 401)
+        self.assertEqual(self.assert_same({"Authorization": self.headers["Authorization"][:-2]}, json=data), 401)
+        # 注销后token失效
+        logout_user(self.user.id)
+        self.assertEqual(self.assert_same(self.headers, json=data), 401)
+
+    def test_validation(self):
+        """请求格式与输入模型的校验一致，认证先于参数校验"""
+        self.assertEqual(self.assert_same(self.headers, data="{bad", content_type="application/json"), 400)
+        for kwargs in ({"json": [1]}, {"json": {"url": 1, "method": "GET"}}, {"json": {"url": "/api/demo/item"}},
+                       {"json": {"url": "/api/demo/item", "method": "GET", "extra": 1}},
+                       {"data": "url=x", "content_type": "application/x-www-form-urlencoded"}, {}):
+            self.assertEqual(self.assert_same(self.headers, **kwargs), 422)
+        self.assertEqual(self.assert_same({}, json=[1]), 401)
+
+    def test_headers(self):
+        """GET请求通过请求头传入url和method，查询参数不参与鉴权"""
+        def check(url, method, headers=None):
+            headers = headers or self.headers
+            return self.client.get(self.url, headers={**headers, "X-Original-URI": url,
+                                                      "X-Original-Method": method}).status_code
+        self.assertEqual(check("/api/demo/item/1?a=b", "GET"), 204)
+        self.assertEqual(check("/api/demo/item/1", "DELETE"), 403)
+        self.assertEqual(check("/api/demo/item/1", "GET", {"Authorization": "invalid"}), 401)
+        self.assertEqual(self.client.get(self.url, headers=self.headers).status_code, 422)
+        self.assertEqual(self.client.put(self.url, headers=self.headers).status_code, 405)
+
+
+class TestFastCheckLimit(unittest.TestCase):
+    app = None
+    context = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # 限流需要在创建app时启用
+        limiter.enabled = True
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        limiter.reset()
+        limiter.enabled = False
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        user = User(username="user", email="user@example.com",
+                    roles=[Role(name="reader", apis=[Api(url="/api/demo/item", method="GET")])])
+        db.session.add(user)
+        db.session.commit()
+        cache_auth()
+        self.headers = {"Authorization": user.auth_token}
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def test_limit(self):
+        """与原接口使用相同的限流，单独计数"""
+        data = {"url": "/api/demo/item", "method": "GET"}
+        codes = [self.client.post("/api/auth/check/fast", json=data, headers=self.headers).status_code
+                 for _ in range(11)]
+        self.assertEqual(codes, [204] * 10 + [429])
+        self.assertEqual(self.client.post("/api/auth/check", json=data, headers=self.headers).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
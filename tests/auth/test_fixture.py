@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.log.models import OperateLog, SecurityLog
+from eAuth.models import Api, Role, User, roles_apis, users_roles
+from eAuth.utils.fixture import FixtureGenerator
+from eAuth.utils.search import search_condition
+
+
+class TestFixture(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def generate(self, seed: int) -> list[tuple]:
+        generator = FixtureGenerator(seed, chunk_size=50)
+        generator.apis(200)
+        generator.roles(20, (3, 8))
+        generator.users(30, (1, 2))
+        generator.operate_logs(120, days=2, end=datetime(2024, 1, 1))
+        generator.security_logs(80, days=2, end=datetime(2024, 1, 1))
+        return [
+            [(api.url, api.method) for api in Api.query.order_by(Api.id)],
+            db.session.execute(db.select(roles_apis).order_by(roles_apis.c.role_id, roles_apis.c.api_id)).all(),
+            db.session.execute(db.select(users_roles).order_by(users_roles.c.user_id, users_roles.c.role_id)).all(),
+            [(log.username, log.operate_datetime) for log in SecurityLog.query.order_by(SecurityLog.id)],
+        ]
+
+    def test_generate(self):
+        """按分布生成数据，可以通过ORM、鉴权和搜索正常使用"""
+        self.generate(0)
+        self.assertEqual(Api.query.count(), 200)
+        self.assertEqual(OperateLog.query.count(), 120)
+        self.assertEqual(SecurityLog.query.count(), 80)
+        for role in Role.query:
+            self.assertTrue(3 <= len(role.apis) <= 8)
+        for user in User.query:
+            self.assertTrue(1 <= len(user.roles) <= 2)
+        self.assertTrue(User.query.first().validate_password("Password@123"))
+
+        cache_auth()
+        user = User.query.first()
+        api = user.roles[0].apis[0]
+        self.assertTrue(user.can(api.url.replace("{id}", "1"), api.method))
+        self.assertEqual(Api.query.filter(search_condition(Api, ("url",), api.url)).first().id, api.id)
+
+    def test_deterministic(self):
+        """相同的种子生成相同的数据，追加生成时id连续"""
+        first = self.generate(1)
+        db.drop_all()
+        db.create_all()
+        self.assertEqual(self.generate(1), first)
+        FixtureGenerator(2).apis(10)
+        self.assertEqual(Api.query.count(), 210)
+        self.assertEqual(db.session.execute(db.select(db.func.max(Api.id))).scalar(), 210)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 import unittest
 
-from eAuth import create_app, verify_token, SecurityLog
+from eAuth import create_app, verify_token
 from eAuth.extensions import db, limiter
 from eAuth.models import User
 
@@ -170,14 +170,10 @@ class TestLogin(unittest.TestCase):
             "username": "locked",
             "password": "123456",
             "locked": False,
-            "login_incorrect": self.app.config.get("SHORT_MAX_LOGIN_INCORRECT")
+            "login_incorrect": self.app.config.get("SHORT_MAX_LOGIN_INCORRECT"),
+            "last_login_incorrect": datetime.utcnow() - timedelta(hours=self.app.config.get("SHORT_MAX_LOGIN_DELAY"))
         }
         self.set_user(**user)
-        security_log = SecurityLog(username=user['username'], ip_addr='127.0.0.1', operate='登录', success=False,
-                                   operate_datetime=datetime.utcnow() - timedelta(
-                                       hours=self.app.config.get("SHORT_MAX_LOGIN_DELAY")))
-        db.session.add(security_log)
-        db.session.commit()
         return user
 
     @staticmethod
@@ -0,0 +1,85 @@
+import unittest
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User, Role, Api
+from eAuth.utils.metrics import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/metrics"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        admin = User(username="admin", email="admin@example.com")
+        user = User(username="user", email="user@example.com")
+        role = Role(name="role")
+        role.apis.append(Api(url="/api/config/api", method="GET"))
+        user.roles.append(role)
+        db.session.add_all([admin, user])
+        db.session.commit()
+        cache_auth()
+        self.admin_headers = {"Authorization": admin.auth_token}
+        self.user_headers = {"Authorization": user.auth_token}
+        metrics.reset()
+        metrics.enabled = True
+
+    def tearDown(self) -> None:
+        metrics.enabled = False
+        metrics.reset()
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def test_metrics(self):
+        """记录各阶段耗时和缓存命中，以Prometheus文本格式输出"""
+        for _ in range(2):
+            res = self.client.post("/api/auth/check", json={"url": "/api/config/api", "method": "GET"},
+                                   headers=self.user_headers)
+            self.assertEqual(res.status_code, 200)
+        res = self.client.get(self.url, headers=self.admin_headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, "text/plain")
+        text = res.get_data(as_text=True)
+        self.assertIn("# TYPE eauth_phase_seconds histogram", text)
+        for phase in ("jwt_decode", "identity", "authenticate", "permission"):
+            self.assertIn(f'eauth_phase_seconds_count{{phase="{phase}"}}', text)
+        self.assertIn('eauth_phase_seconds_bucket{phase="jwt_decode",le="+Inf"} 3', text)
+        # 每个用户的身份只在第一次请求时查询数据库
+        self.assertIn('eauth_cache_total{cache="identity",result="hit"} 1', text)
+        self.assertIn('eauth_cache_total{cache="identity",result="miss"} 2', text)
+        self.assertIn('eauth_request_seconds_count{endpoint="auth.auth",status="200"} 2', text)
+
+    def test_admin_only(self):
+        res = self.client.get(self.url, headers=self.user_headers)
+        self.assertEqual(res.status_code, 403)
+
+    def test_disabled(self):
+        """关闭时不记录，接口返回404"""
+        metrics.enabled = False
+        self.client.post("/api/auth/check", json={"url": "/api/config/api", "method": "GET"},
+                         headers=self.user_headers)
+        self.assertEqual(metrics.render(), "\n")
+        res = self.client.get(self.url, headers=self.admin_headers)
+        self.assertEqual(res.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import threading
+import unittest
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter
+from eAuth.models import User
+from eAuth.utils.password import password_hasher, PasswordHasherBusy
+
+
+class TestPassword(unittest.TestCase):
+    app = None
+    context = None
+    login_url = "/api/auth/login"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+
+    def test_hash(self):
+        """按配置的参数生成口令哈希"""
+        pwhash = password_hasher.generate("Password@123")
+        self.assertTrue(pwhash.startswith(self.app.config["PASSWORD_HASH_METHOD"] + "$"))
+        self.assertFalse(password_hasher.needs_rehash(pwhash))
+        self.assertTrue(password_hasher.check(pwhash, "Password@123"))
+        self.assertFalse(password_hasher.check(pwhash, "hack"))
+        self.assertFalse(password_hasher.check(None, "hack"))
+
+    def test_rehash_on_login(self):
+        """使用旧参数生成的口令哈希在登录成功后重新生成"""
+        self.app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+        try:
+            user = User(username="user", email="user@example.com")
+            user.set_password("Password@123")
+            db.session.add(user)
+            db.session.commit()
+            self.assertTrue(user.password_hash.startswith("pbkdf2:sha256:1000$"))
+        finally:
+            self.app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+        self.assertTrue(user.password_needs_rehash())
+
+        res = self.client.post(self.login_url, json={"username": "user", "password": "hack"})
+        self.assertEqual(res.status_code, 401)
+        db.session.refresh(user)
+        self.assertTrue(user.password_hash.startswith("pbkdf2:sha256:1000$"))
+
+        res = self.client.post(self.login_url, json={"username": "user", "password": "Password@123"})
+        self.assertEqual(res.status_code, 200)
+        db.session.refresh(user)
+        self.assertTrue(user.password_hash.startswith("scrypt:32768:8:1$"))
+        self.assertTrue(user.validate_password("Password@123"))
+
+    def test_busy(self):
+        """线程池和队列都满时直接拒绝"""
+        release = threading.Event()
+        slots = self.app.config["PASSWORD_HASH_WORKERS"] + self.app.config["PASSWORD_HASH_QUEUE_LIMIT"]
+        futures = [password_hasher._executor.submit(release.wait) for _ in range(slots)]
+        for _ in range(slots):
+            password_hasher._slots.acquire()
+        try:
+            with self.assertRaises(PasswordHasherBusy):
+                password_hasher.generate("Password@123")
+        finally:
+            release.set()
+            for _ in range(slots):
+                password_hasher._slots.release()
+            for future in futures:
+                future.result()
+        self.assertTrue(password_hasher.check(password_hasher.generate("Password@123"), "Password@123"))
+
+
+if __name__ == '__main__':
+    unittest.main()
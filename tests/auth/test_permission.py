@@ -0,0 +1,230 @@
+import unittest
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User, Role, Api, url_match
+from eAuth.settings import Testing
+from eAuth.utils.auth import verify_identity
+from eAuth.utils.permission import permission_store
+from eAuth.utils.route import RouteTrie, compile_url
+
+
+class TestRouteTrie(unittest.TestCase):
+    apis = [
+        (1, "/api/config/api", "GET"),
+        (2, "/api/config/api/{id}", "GET"),
+        (3, "/api/config/api/{id}", "PUT"),
+        (4, "/api/config/role/{id}/api", "PUT"),
+        (5, "/api/config/role/unbind", "GET"),
+        (6, "/api/file/{name}.txt", "GET"),
+    ]
+
+    def setUp(self) -> None:
+        self.trie = RouteTrie()
+        for api_id, url, method in self.apis:
+            self.trie.add(api_id, url, method)
+
+    def test_match(self):
+        """与url_match的匹配结果一致"""
+        requests = [
+            ("/api/config/api", "GET"),
+            ("/api/config/api?page=2", "GET"),
+            ("/api/config/api/1", "GET"),
+            ("/api/config/api/1", "put"),
+            ("/api/config/api/1", "DELETE"),
+            ("/api/config/api/1/2", "GET"),
+            ("/api/config/api/", "GET"),
+            ("/api/config/role/unbind", "GET"),
+            ("/api/config/role/3/api", "PUT"),
+            ("/api/config/role/unbind/api", "PUT"),
+            ("/api/config/role/中文/api", "PUT"),
+            ("/api/config/role/a b/api", "PUT"),
+            ("/api/file/readme.txt", "GET"),
+            ("/api/file/readme.json", "GET"),
+            ("/api/config", "GET"),
+        ]
+        for url, method in requests:
+            expected = any(method.upper() == api_method and url_match(url, api_url)
+                           for _, api_url, api_method in self.apis)
+            self.assertEqual(self.trie.match(url, method) is not None, expected, msg=f"{method} {url}")
+
+    def test_match_api_id(self):
+        """固定路径段优先于通配节点"""
+        self.assertEqual(self.trie.match("/api/config/role/unbind", "GET"), 5)
+        self.assertEqual(self.trie.match("/api/config/api/7", "PUT"), 3)
+        self.assertEqual(self.trie.match("/api/file/a.txt", "GET"), 6)
+        self.assertEqual(len(self.trie), len(self.apis))
+
+    def test_lazy_compile(self):
+        """整段参数的api不编译正则，部分参数的api在首次匹配时编译，之后添加的api同样生效"""
+        compile_url.cache_clear()
+        trie = RouteTrie()
+        for api_id, url, method in self.apis:
+            trie.add(api_id, url, method)
+        self.assertEqual(compile_url.cache_info().currsize, 0)
+        self.assertEqual(trie.match("/api/config/api/1", "GET"), 2)
+        self.assertEqual(compile_url.cache_info().currsize, 0)
+        self.assertEqual(trie.match("/api/file/a.txt", "GET"), 6)
+        self.assertEqual(compile_url.cache_info().currsize, 1)
+        trie.add(7, "/api/file/{name}.json", "GET")
+        self.assertEqual(trie.match("/api/file/a.json", "GET"), 7)
+        self.assertEqual(trie.match("/api/file/a.txt", "GET"), 6)
+
+
+class TestCan(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        reader = Role(name="reader", apis=[
+            Api(url="/api/config/api", method="GET"),
+            Api(url="/api/config/api/{id}", method="GET"),
+        ])
+        operator = Role(name="operator", apis=[
+            Api(url="/api/config/api/{id}", method="PUT"),
+        ])
+        self.user = User(username="user", email="user@example.com", roles=[reader, operator])
+        db.session.add(self.user)
+        db.session.commit()
+        cache_auth()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def test_can(self):
+        """合并用户所有角色的权限"""
+        self.assertTrue(self.user.can("/api/config/api", "GET"))
+        self.assertTrue(self.user.can("/api/config/api/1", "GET"))
+        self.assertTrue(self.user.can("/api/config/api/1", "PUT"))
+        self.assertFalse(self.user.can("/api/config/api/1", "DELETE"))
+        self.assertFalse(self.user.can("/api/config/role", "GET"))
+
+    def test_snapshot(self):
+        """刷新后发布新版本的快照，已删除的api立即失效"""
+        version = permission_store.version
+        api = Api.query.filter_by(url="/api/config/api/{id}", method="PUT").first()
+        db.session.delete(api)
+        db.session.commit()
+        cache_auth()
+        self.assertGreater(permission_store.version, version)
+        self.assertNotIn(api.id, permission_store.snapshot.apis)
+        self.assertFalse(self.user.can("/api/config/api/1", "PUT"))
+
+    def test_incremental_refresh(self):
+        """提交后立即增量刷新，无需等待全量刷新"""
+        version = permission_store.version
+        role = Role.query.filter_by(name="operator").first()
+        role.apis.append(Api(url="/api/config/role", method="GET"))
+        db.session.commit()
+        self.assertGreater(permission_store.version, version)
+        self.assertTrue(self.user.can("/api/config/role", "GET"))
+
+        api = Api.query.filter_by(url="/api/config/role", method="GET").first()
+        api.url = "/api/config/user"
+        db.session.commit()
+        self.assertFalse(self.user.can("/api/config/role", "GET"))
+        self.assertTrue(self.user.can("/api/config/user", "GET"))
+
+        db.session.delete(role)
+        db.session.commit()
+        self.assertNotIn(role.id, permission_store.snapshot.role_apis)
+        self.assertFalse(self.user.can("/api/config/user", "GET"))
+        self.assertTrue(self.user.can("/api/config/api/1", "GET"))
+
+    def test_user_role_refresh(self):
+        """用户角色变更后立即生效"""
+        self.assertTrue(self.user.can("/api/config/api", "GET"))
+        self.user.roles = [Role.query.filter_by(name="operator").first()]
+        db.session.commit()
+        self.assertFalse(self.user.can("/api/config/api", "GET"))
+        self.assertTrue(self.user.can("/api/config/api/1", "PUT"))
+
+    def test_identity(self):
+        """用户身份被缓存，用户变更后立即失效"""
+        token = self.user.auth_token
+        identity = verify_identity(token)
+        self.assertEqual(identity.username, "user")
+        self.assertEqual(identity.role_ids, frozenset(role.id for role in self.user.roles))
+        self.assertFalse(identity.is_admin)
+        self.assertIs(cache.get(f"cache_identity_{self.user.id}").locked, False)
+
+        self.user.lock()
+        self.assertIsNone(verify_identity(token))
+        self.user.unlock()
+        self.assertIsNotNone(verify_identity(token))
+
+    def test_token_embed_roles(self):
+        """token携带角色时纪元一致则直接信任token，角色变更后回到慢路径"""
+        self.app.config["TOKEN_EMBED_ROLES"] = True
+        try:
+            token = self.user.auth_token
+            cache.delete(f"cache_identity_{self.user.id}")
+            identity = verify_identity(token)
+            self.assertEqual(identity.role_ids, frozenset(role.id for role in self.user.roles))
+            self.assertIsNone(cache.get(f"cache_identity_{self.user.id}"), msg="纪元一致时不应读取用户身份")
+
+            self.user.roles = [Role.query.filter_by(name="operator").first()]
+            db.session.commit()
+            identity = verify_identity(token)
+            self.assertEqual(identity.role_ids, frozenset(role.id for role in self.user.roles))
+            self.assertIsNotNone(cache.get(f"cache_identity_{self.user.id}"))
+
+            self.user.lock()
+            self.assertIsNone(verify_identity(token))
+        finally:
+            self.app.config["TOKEN_EMBED_ROLES"] = False
+
+    def test_token_embed_roles_shared_cache(self):
+        """token携带角色时必须使用共享缓存，否则其它进程看不到锁定、注销"""
+        Testing.TOKEN_EMBED_ROLES = True
+        try:
+            with self.assertRaises(RuntimeError):
+                create_app('test')
+        finally:
+            del Testing.TOKEN_EMBED_ROLES
+
+    def test_batch_check(self):
+        """批量鉴权与逐个鉴权结果一致"""
+        items = [
+            {"url": "/api/config/api", "method": "GET"},
+            {"url": "/api/config/api/1", "method": "PUT"},
+            {"url": "/api/config/api/1", "method": "DELETE"},
+            {"url": "/api/config/role", "method": "GET"},
+        ]
+        headers = {"Authorization": self.user.auth_token}
+        res = self.client.post("/api/auth/check/batch", json={"items": items}, headers=headers)
+        self.assertEqual(res.status_code, 200)
+        result = res.json["data"]
+        self.assertEqual(len(result), len(items))
+        for item, decision in zip(items, result):
+            res = self.client.post("/api/auth/check", json=item, headers=headers)
+            self.assertEqual(decision["url"], item["url"])
+            self.assertEqual(decision["allowed"], res.status_code == 200)
+
+    def test_batch_check_empty(self):
+        """批量鉴权不接受空列表"""
+        headers = {"Authorization": self.user.auth_token}
+        res = self.client.post("/api/auth/check/batch", json={"items": []}, headers=headers)
+        self.assertEqual(res.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
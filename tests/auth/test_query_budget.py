@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User
+from eAuth.utils.fixture import FixtureGenerator
+from eAuth.utils.query_budget import query_budget, QueryBudgetExceeded
+
+
+class TestQueryBudget(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        generator = FixtureGenerator()
+        generator.apis(100)
+        generator.roles(20, (10, 20))
+        self.usernames = generator.users(20, (2, 3))
+        generator.operate_logs(300, usernames=self.usernames, end=datetime.utcnow())
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        db.session.commit()
+        cache_auth()
+        self.admin_headers = {"Authorization": admin.auth_token}
+        self.user_headers = {"Authorization": User.query.get(1).auth_token}
+
+    def tearDown(self) -> None:
+        self.app.config["QUERY_BUDGET_DEFAULT"] = 30
+        self.app.config["QUERY_BUDGET_RAISE"] = True
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def test_count(self):
+        with query_budget.count() as counter:
+            User.query.all()
+            User.query.first()
+        self.assertEqual(counter.count, 2)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget.count(1):
+                User.query.all()
+                User.query.first()
+
+    def test_exceeded(self):
+        """超过预算时测试中直接失败，生产环境中记录警告"""
+        # 未设置预算的接口使用QUERY_BUDGET_DEFAULT
+        self.app.config["QUERY_BUDGET_DEFAULT"] = 0
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/config/user/roles", headers=self.admin_headers)
+        self.app.config["QUERY_BUDGET_RAISE"] = False
+        with self.assertLogs("eAuth.utils.query_budget", "WARNING") as logs:
+            res = self.client.get("/api/config/user/roles", headers=self.admin_headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("config.config_user.get_roles_light executed", logs.output[0])
+
+    def test_budget(self):
+        """高频接口的语句数不随数据量增长"""
+        res = self.client.post("/api/auth/check", json={"url": "/api/x", "method": "GET"},
+                               headers=self.user_headers)
+        self.assertEqual(res.status_code, 403)
+        res = self.client.post("/api/auth/check/batch", json={"items": [{"url": "/api/x", "method": "GET"}] * 20},
+                               headers=self.user_headers)
+        self.assertEqual(res.status_code, 200)
+        res = self.client.post("/api/auth/login", json={"username": self.usernames[0], "password": "Password@123"})
+        self.assertEqual(res.status_code, 200)
+        for query_string in ({"per_page": 100}, {"per_page": 100, "cursor": ""}, {"username": "user1"}):
+            res = self.client.get("/api/log/operate-log", query_string=query_string, headers=self.admin_headers)
+            self.assertEqual(res.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+import flask_migrate
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect, text, MetaData, Table, Column, Integer, String, Boolean, DateTime, Text, \
+    ForeignKey, UniqueConstraint
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter, cache
+
+
+def baseline_metadata() -> MetaData:
+    """
+    引入迁移前db.create_all创建的表结构
+    """
+    metadata = MetaData()
+    Table("api", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("url", String(256), nullable=False),
+          Column("method", String(8), nullable=False),
+          Column("description", String(512)),
+          UniqueConstraint("url", "method", name="uix_url_method"))
+    Table("role", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("name", String(30), unique=True, nullable=False, index=True),
+          Column("description", String(512)))
+    Table("user", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("username", String(20), unique=True, index=True, nullable=False),
+          Column("password_hash", String(256)),
+          Column("locked", Boolean),
+          Column("login_incorrect", Integer),
+          Column("email", String(320), unique=True, nullable=False))
+    Table("roles_apis", metadata,
+          Column("role_id", Integer, ForeignKey("role.id", ondelete="CASCADE")),
+          Column("api_id", Integer, ForeignKey("api.id", ondelete="CASCADE")))
+    Table("users_roles", metadata,
+          Column("user_id", Integer, ForeignKey("user.id")),
+          Column("role_id", Integer, ForeignKey("role.id")))
+    Table("operate_log", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("username", String(32), index=True),
+          Column("ip_addr", String(64), index=True),
+          Column("operate_type", String(16)),
+          Column("operate_api", String(256)),
+          Column("status_code", Integer),
+          Column("resource_id", Integer),
+          Column("request_data", Text),
+          Column("response_data", Text),
+          Column("success", Boolean),
+          Column("operate_datetime", DateTime, index=True))
+    Table("security_log", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("username", String(32), index=True),
+          Column("ip_addr", String(64), index=True),
+          Column("operate", String(32)),
+          Column("success", Boolean),
+          Column("operate_datetime", DateTime, index=True))
+    return metadata
+
+
+class TestMigration(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        # 从空库开始迁移
+        db.drop_all()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        cache.clear()
+
+    def test_upgrade_matches_models(self):
+        """迁移到最新版本后的表结构与模型一致"""
+        flask_migrate.upgrade()
+        with db.engine.connect() as connection:
+            self.assertEqual(compare_metadata(MigrationContext.configure(connection), db.metadata), [])
+
+    def test_upgrade_existing_database(self):
+        """已有的数据库标记为基线版本后升级，得到与模型一致的表结构"""
+        # 基线版本与引入迁移前的表结构一致
+        flask_migrate.upgrade(revision="0001_baseline")
+        with db.engine.connect() as connection:
+            self.assertEqual(compare_metadata(MigrationContext.configure(connection), baseline_metadata()), [])
+        flask_migrate.downgrade(revision="base")
+
+        baseline_metadata().create_all(db.engine)
+        flask_migrate.stamp(revision="0001_baseline")
+        flask_migrate.upgrade()
+        with db.engine.connect() as connection:
+            self.assertEqual(compare_metadata(MigrationContext.configure(connection), db.metadata), [])
+        self.assertTrue({"search_trigram", "operate_log_hourly", "security_log_hourly"}
+                        <= set(inspect(db.engine).get_table_names()))
+
+    def test_deduplicate_bindings(self):
+        """升级时删除重复及不完整的绑定关系，降级后恢复原有结构"""
+        flask_migrate.upgrade(revision="0002_search_rollup")
+        db.session.execute(text("INSERT INTO role (id, name) VALUES (1, 'role')"))
+        db.session.execute(text("INSERT INTO api (id, url, method) VALUES (1, '/a', 'GET'), (2, '/b', 'GET')"))
+        db.session.execute(text("INSERT INTO roles_apis VALUES (1, 1), (1, 1), (1, 2), (NULL, 2)"))
+        db.session.commit()
+
+        flask_migrate.upgrade()
+        self.assertEqual(sorted(db.session.execute(text("SELECT role_id, api_id FROM roles_apis")).all()),
+                         [(1, 1), (1, 2)])
+        insp = inspect(db.engine)
+        self.assertEqual(insp.get_pk_constraint("roles_apis")["constrained_columns"], ["role_id", "api_id"])
+        self.assertIn(["username", "success", "operate_datetime"],
+                      [index["column_names"] for index in insp.get_indexes("security_log")])
+
+        flask_migrate.downgrade(revision="0002_search_rollup")
+        insp = inspect(db.engine)
+        self.assertEqual(insp.get_pk_constraint("roles_apis")["constrained_columns"], [])
+        self.assertIn(["username"], [index["column_names"] for index in insp.get_indexes("security_log")])
+        self.assertEqual(db.session.execute(text("SELECT count(*) FROM roles_apis")).scalar(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User, Role, roles_apis
+from eAuth.utils.fixture import FixtureGenerator
+from eAuth.utils.query_budget import query_budget
+
+
+class TestRoleApi(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/config/role/1/api"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        generator = FixtureGenerator()
+        self.apis = generator.apis(50, param_ratio=0)
+        role_id, = generator.roles(1, (0, 0))
+        generator.users(1, (1, 1))
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        db.session.commit()
+        cache_auth()
+        self.headers = {"Authorization": admin.auth_token}
+        self.user = User.query.get(1)
+        self.role_id = role_id
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def bound_ids(self) -> list[int]:
+        return sorted(db.session.execute(db.select(roles_apis.c.api_id).where(
+            roles_apis.c.role_id == self.role_id)).scalars())
+
+    def can(self, api_id: int) -> bool:
+        api = self.apis[api_id - 1]
+        return User.query.get(self.user.id).can(api["url"], api["method"])
+
+    def test_add_api(self):
+        """只写入未绑定的api，响应中不返回全部api，鉴权快照随之更新"""
+        res = self.client.put(self.url, json={"ids": [1, 2, 3]}, headers=self.headers)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json["count"], 3)
+        res = self.client.put(self.url, json={"ids": [2, 3, 4]}, headers=self.headers)
+        self.assertEqual(res.json["count"], 1)
+        self.assertEqual(res.json["data"], {"id": self.role_id, "name": "role1", "description": "fixture role 1",
+                                            "api_count": 4})
+        self.assertEqual(self.bound_ids(), [1, 2, 3, 4])
+        self.assertTrue(self.can(4))
+        self.assertFalse(self.can(5))
+
+    def test_remove_api(self):
+        self.client.put(self.url, json={"ids": list(range(1, 11))}, headers=self.headers)
+        self.assertTrue(self.can(3))
+        res = self.client.delete(self.url, json={"ids": [3, 5, 20]}, headers=self.headers)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json["count"], 2)
+        self.assertEqual(res.json["data"]["api_count"], 8)
+        self.assertEqual(self.bound_ids(), [1, 2, 4, 6, 7, 8, 9, 10])
+        self.assertFalse(self.can(3))
+        self.assertTrue(self.can(4))
+
+    def test_unbind_api(self):
+        self.client.put(self.url, json={"ids": list(range(1, 41))}, headers=self.headers)
+        res = self.client.get(f"/api/config/role/unbind/{self.role_id}", query_string={"per_page": 50},
+                              headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([item["id"] for item in res.json["data"]], list(range(41, 51)))
+        res = self.client.get("/api/config/role/unbind/100", headers=self.headers)
+        self.assertEqual(res.status_code, 404)
+
+    def test_large_role(self):
+        """绑定的api数量不影响执行的语句数"""
+        FixtureGenerator(1).apis(2000)
+        db.session.execute(roles_apis.insert(), [{"role_id": self.role_id, "api_id": api_id}
+                                                 for api_id in range(51, 2051)])
+        db.session.commit()
+        for method, count, api_count in ((self.client.put, 50, 2050), (self.client.delete, 1000, 1050)):
+            with query_budget.count(10):
+                res = method(self.url, json={"ids": list(range(1, 1001))}, headers=self.headers)
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(res.json["count"], count)
+            self.assertEqual(res.json["data"]["api_count"], api_count)
+        self.assertEqual(len(Role.query.get(self.role_id).apis), 1050)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from eAuth import create_app, cache_auth
+from eAuth.extensions import db, limiter, cache
+from eAuth.models import User
+from eAuth.utils.fixture import FixtureGenerator
+from eAuth.utils.query_budget import query_budget
+
+
+class TestSparseFields(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        generator = FixtureGenerator()
+        generator.apis(200)
+        generator.roles(50, (20, 40))
+        generator.users(100, (1, 3))
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        db.session.commit()
+        cache_auth()
+        self.headers = {"Authorization": admin.auth_token}
+        # 身份已缓存，只统计列表查询本身
+        self.client.get("/api/auth/ping", headers=self.headers)
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def get(self, url: str, **query_string):
+        with query_budget.count() as counter:
+            res = self.client.get(url, query_string=query_string, headers=self.headers)
+        self.assertEqual(res.status_code, 200, msg=res.json)
+        return res.json["data"], counter
+
+    def test_nested_collections(self):
+        """嵌套集合一次加载，语句数不随每页条数增长"""
+        for url, nested in (("/api/config/user", "roles"), ("/api/config/role", "apis"),
+                            ("/api/config/api", "roles"), ("/api/config/role/unbind/1", "roles")):
+            data, counter = self.get(url, per_page=10)
+            small = counter.count
+            data, counter = self.get(url, per_page=50)
+            self.assertEqual(counter.count, small, msg=url)
+            self.assertEqual(len(data), 50)
+            self.assertIn(nested, data[0])
+        data, counter = self.get("/api/config/user", per_page=100)
+        # 分页的count子查询不受load_only影响，只检查列表查询
+        select = next(statement for statement in counter.statements if "LIMIT" in statement)
+        self.assertNotIn("password_hash", select)
+        for item in data:
+            user = db.session.get(User, item["id"])
+            self.assertEqual(sorted(role["id"] for role in item["roles"]), sorted(role.id for role in user.roles))
+
+    def test_fields(self):
+        """只返回请求的字段，未请求的集合不加载"""
+        data, full = self.get("/api/config/role", per_page=50)
+        data, counter = self.get("/api/config/role", per_page=50, fields="name")
+        self.assertEqual(set(data[0]), {"id", "name"})
+        self.assertEqual(counter.count, full.count - 1)
+        self.assertFalse(any("roles_apis" in statement for statement in counter.statements))
+
+        data, counter = self.get("/api/config/user", fields="username,roles")
+        user = next(item for item in data if item["username"] == "user1")
+        self.assertEqual(set(user), {"id", "username", "roles"})
+        self.assertEqual(set(user["roles"][0]), {"id", "name", "description"})
+
+    def test_unknown_fields(self):
+        res = self.client.get("/api/config/user", query_string={"fields": "username,password_hash"},
+                              headers=self.headers)
+        self.assertEqual(res.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter, scheduler
+from eAuth.log.models import SecurityLog
+from eAuth.schedule.log import archive_log, archive_logs, archive_path, single_runner
+
+
+class TestArchive(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.now = datetime(2024, 3, 10, 12)
+        for i in range(30):
+            db.session.add(SecurityLog(username=f"user{i}", ip_addr="127.0.0.1", operate="login", success=True,
+                                       operate_datetime=self.now - timedelta(hours=i * 6)))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        self.archive_dir.cleanup()
+        db.session.remove()
+        db.drop_all()
+
+    def read_archive(self, day) -> list[dict]:
+        with gzip.open(archive_path(self.archive_dir.name, "security_log", day), "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_archive(self):
+        """超过保留时间的日志按天写入归档文件并从数据库删除"""
+        before = self.now - timedelta(days=3)
+        expected = SecurityLog.query.filter(SecurityLog.operate_datetime < before).count()
+        total = archive_log(SecurityLog, before, self.archive_dir.name, batch_size=4)
+        self.assertEqual(total, expected)
+        self.assertEqual(SecurityLog.query.filter(SecurityLog.operate_datetime < before).count(), 0)
+        self.assertEqual(SecurityLog.query.count(), 30 - expected)
+
+        files = sorted(os.listdir(os.path.join(self.archive_dir.name, "security_log")))
+        self.assertEqual(len(files), len(set(files)))
+        records = []
+        for name in files:
+            day = datetime.strptime(name, "security_log-%Y-%m-%d.ndjson.gz").date()
+            day_records = self.read_archive(day)
+            self.assertTrue(all(record["operate_datetime"].startswith(day.isoformat()) for record in day_records))
+            records.extend(day_records)
+        self.assertEqual(len(records), expected)
+        self.assertEqual(len(set(record["id"] for record in records)), expected)
+
+    def test_archive_append(self):
+        """多次归档同一天的日志追加到同一个文件"""
+        day = (self.now - timedelta(days=5)).date()
+        archive_log(SecurityLog, datetime.combine(day, datetime.min.time()) + timedelta(hours=7),
+                    self.archive_dir.name)
+        first = len(self.read_archive(day))
+        archive_log(SecurityLog, datetime.combine(day, datetime.min.time()) + timedelta(days=1),
+                    self.archive_dir.name)
+        self.assertEqual(len(self.read_archive(day)), 4)
+        self.assertLess(first, 4)
+
+    def test_single_runner(self):
+        """其它进程正在归档时跳过，锁释放后正常归档"""
+        config = {key: self.app.config[key] for key in ("LOG_ARCHIVE_DIR", "SECURITY_LOG_RETENTION_DAYS")}
+        self.app.config["LOG_ARCHIVE_DIR"] = self.archive_dir.name
+        self.app.config["SECURITY_LOG_RETENTION_DAYS"] = 3
+        try:
+            with single_runner("eauth_archive_log", self.archive_dir.name) as acquired:
+                self.assertTrue(acquired)
+                archive_logs()
+            self.assertEqual(SecurityLog.query.count(), 30)
+            archive_logs()
+            self.assertEqual(SecurityLog.query.count(), 0)
+        finally:
+            self.app.config.update(config)
+
+    def test_disabled_by_default(self):
+        """归档会删除数据库中的日志，默认不启用定时归档"""
+        self.assertFalse(self.app.config["LOG_ARCHIVE_ENABLED"])
+        self.assertIsNone(scheduler.get_job("archive_log"))
+
+
+if __name__ == '__main__':
+    unittest.main()
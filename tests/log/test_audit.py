@@ -0,0 +1,101 @@
+import queue
+import unittest
+from datetime import datetime
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter
+from eAuth.log.models import SecurityLog, OperateLog
+from eAuth.utils.audit import AuditWriter
+
+
+class TestAuditWriter(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        self.app.config["AUDIT_ASYNC"] = True
+        self.writer = AuditWriter(self.app)
+
+    def tearDown(self) -> None:
+        self.writer.shutdown()
+        self.app.config["AUDIT_ASYNC"] = False
+        self.app.extensions["audit_writer"] = None
+        db.session.remove()
+        db.drop_all()
+
+    @staticmethod
+    def security_log(username: str) -> dict:
+        return dict(username=username, ip_addr="127.0.0.1", operate="login", success=False,
+                    operate_datetime=datetime.utcnow())
+
+    def test_flush_by_interval(self):
+        """后台线程按时间间隔批量写入"""
+        for i in range(5):
+            self.writer.submit(SecurityLog, self.security_log(f"user{i}"))
+        self.writer.flush(timeout=5)
+        self.assertEqual(SecurityLog.query.count(), 5)
+
+    def test_flush_on_shutdown(self):
+        """停止时写入队列中剩余的日志"""
+        interval = self.app.config["AUDIT_FLUSH_INTERVAL"]
+        self.app.config["AUDIT_FLUSH_INTERVAL"] = 60
+        try:
+            self.writer.submit(SecurityLog, self.security_log("user"))
+            self.writer.submit(OperateLog, dict(username="user", ip_addr="127.0.0.1", operate_type="GET",
+                                                operate_api="/api/config/api", status_code=200, resource_id=None,
+                                                request_data=None, response_data=None, success=True,
+                                                operate_datetime=datetime.utcnow()))
+            self.writer.shutdown()
+        finally:
+            self.app.config["AUDIT_FLUSH_INTERVAL"] = interval
+        self.assertEqual(SecurityLog.query.count(), 1)
+        self.assertEqual(OperateLog.query.count(), 1)
+
+    def test_flush_after_shutdown(self):
+        """停止后flush直接返回，不会一直等待"""
+        self.writer.shutdown()
+        self.writer.flush()
+
+    def test_retry_one_by_one(self):
+        """批量写入失败时逐条重试，只丢弃出错的记录"""
+        bad = self.security_log("bad")
+        bad["operate_datetime"] = "invalid"
+        self.writer._write(SecurityLog, [self.security_log("user1"), bad, self.security_log("user2")])
+        self.assertEqual(sorted(log.username for log in SecurityLog.query.all()), ["user1", "user2"])
+
+    def test_drop_when_full(self):
+        """队列满且配置为drop时丢弃日志"""
+        self.writer.shutdown()
+        queue_size, queue_full = self.app.config["AUDIT_QUEUE_SIZE"], self.app.config["AUDIT_QUEUE_FULL"]
+        self.app.config["AUDIT_QUEUE_SIZE"] = 1
+        self.app.config["AUDIT_QUEUE_FULL"] = "drop"
+        try:
+            writer = AuditWriter()
+            writer.app = self.app
+            writer._queue = queue.Queue(maxsize=1)
+            writer._thread = object()  # 不启动后台线程，队列不会被消费
+            writer.submit(SecurityLog, self.security_log("user1"))
+            writer.submit(SecurityLog, self.security_log("user2"))
+            self.assertEqual(writer.dropped, 1)
+        finally:
+            self.app.config["AUDIT_QUEUE_SIZE"] = queue_size
+            self.app.config["AUDIT_QUEUE_FULL"] = queue_full
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter, cache
+from eAuth.log.models import OperateLog
+from eAuth.models import User
+
+
+class TestExport(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/log/operate-log/export"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.app.config["LOG_EXPORT_BATCH_SIZE"] = 7
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        now = datetime(2024, 1, 1)
+        for i in range(30):
+            db.session.add(OperateLog(username=f"user{i % 3}", ip_addr="127.0.0.1", operate_type="GET",
+                                      operate_api=f"/api/config/api/{i}", status_code=500 if i % 5 == 0 else 200,
+                                      resource_id=i, success=i % 5 != 0,
+                                      request_data='{"name": "中文, \\"quoted\\""}',
+                                      operate_datetime=now - timedelta(minutes=i)))
+        db.session.commit()
+        self.headers = {"Authorization": admin.auth_token}
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def test_export_ndjson(self):
+        """导出与列表接口使用相同的过滤条件"""
+        res = self.client.get(self.url, query_string={"username": "user1"}, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, "application/x-ndjson")
+        rows = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertTrue(all(row["username"] == "user1" for row in rows))
+        self.assertEqual(rows[0]["request_data"], '{"name": "中文, \\"quoted\\""}')
+        self.assertEqual(rows[0]["operate_datetime"], "2023-12-31T23:59:00")
+
+    def test_export_csv_gzip(self):
+        res = self.client.get(self.url, query_string={"format": "csv", "gzip": True}, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(".csv.gz", res.headers["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(res.data).decode())))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[0]["request_data"], '{"name": "中文, \\"quoted\\""}')
+
+    def test_export_cli(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["export-logs", "--username", "user2", "--start", "2023-12-31 23:45:00"])
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        rows = [json.loads(line) for line in result.stdout_bytes.decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(row["username"] == "user2" for row in rows))
+
+    def test_export_cli_filters(self):
+        """命令行支持与列表接口相同的过滤条件"""
+        runner = self.app.test_cli_runner()
+
+        def export(*args):
+            result = runner.invoke(args=["export-logs", *args])
+            self.assertEqual(result.exit_code, 0, msg=result.output)
+            return [json.loads(line) for line in result.stdout_bytes.decode().splitlines()]
+        rows = export("--status-code", "500", "--failure", "--operate-type", "GET")
+        self.assertEqual(sorted(row["resource_id"] for row in rows), [0, 5, 10, 15, 20, 25])
+        self.assertEqual(len(export("--success")), 24)
+        self.assertEqual([row["id"] for row in export("--resource-id", "7")], [8])
+        self.assertEqual(len(export("--operate-api", "/api/config/api/1", "--search-mode", "prefix")), 11)
+        result = runner.invoke(args=["export-logs", "--type", "security", "--status-code", "500"])
+        self.assertNotEqual(result.exit_code, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+from datetime import datetime, timedelta
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter, cache
+from eAuth.log.models import SecurityLog
+from eAuth.models import User
+from eAuth.utils.audit import audit_writer
+from eAuth.utils.model import _estimated_count
+
+
+class TestLogPage(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/log/security-log"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        now = datetime(2024, 1, 1)
+        # 部分日志的时间相同，验证按id确定顺序
+        for i in range(25):
+            db.session.add(SecurityLog(username=f"user{i % 3}", ip_addr="127.0.0.1", operate="login",
+                                       success=bool(i % 2), operate_datetime=now - timedelta(minutes=i // 2)))
+        db.session.commit()
+        self.headers = {"Authorization": admin.auth_token}
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def fetch_all(self, **params) -> list[dict]:
+        rows = []
+        params["cursor"] = ""
+        while True:
+            res = self.client.get(self.url, query_string=params, headers=self.headers)
+            self.assertEqual(res.status_code, 200)
+            rows.extend(res.json["data"])
+            if res.json["next_cursor"] is None:
+                return rows
+            params["cursor"] = res.json["next_cursor"]
+
+    def test_cursor_page(self):
+        """游标分页遍历的结果与一次性查询的顺序和内容一致"""
+        rows = self.fetch_all(per_page=4)
+        expected = SecurityLog.query.order_by(SecurityLog.operate_datetime.desc(), SecurityLog.id.desc()).all()
+        self.assertEqual([row["id"] for row in rows], [log.id for log in expected])
+
+    def test_cursor_page_filter(self):
+        """游标分页与过滤条件、总数统计同时使用"""
+        res = self.client.get(self.url, query_string={"cursor": "", "per_page": 2, "success": True,
+                                                      "with_total": True}, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json["total"], 12)
+        self.assertNotIn("pagination", res.json)
+        rows = self.fetch_all(per_page=5, username="user1")
+        self.assertEqual(len(rows), SecurityLog.query.filter_by(username="user1").count())
+        self.assertTrue(all(row["username"] == "user1" for row in rows))
+
+    def test_invalid_cursor(self):
+        res = self.client.get(self.url, query_string={"cursor": "invalid"}, headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    def test_offset_page(self):
+        """不传cursor时仍使用页码分页"""
+        res = self.client.get(self.url, query_string={"page": 2, "per_page": 10}, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json["pagination"]["total"], 25)
+        self.assertNotIn("next_cursor", res.json)
+
+    def test_count_cached(self):
+        """缓存的总数在日志写入后失效"""
+        query = {"page": 1, "per_page": 10, "count": "cached"}
+        res = self.client.get(self.url, query_string=query, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 25)
+        db.session.add(SecurityLog(username="user0", ip_addr="127.0.0.1", operate="login", success=True))
+        db.session.commit()
+        res = self.client.get(self.url, query_string=query, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 26)
+        res = self.client.get(self.url, query_string={**query, "username": "user1"}, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], SecurityLog.query.filter_by(username="user1").count())
+
+    def test_count_audit_writer(self):
+        """审计日志写入后缓存的总数失效，未指定统计方式时统计精确总数"""
+        query = {"page": 1, "per_page": 10, "count": "cached"}
+        res = self.client.get(self.url, query_string=query, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 25)
+        audit_writer.submit(SecurityLog, dict(username="user0", ip_addr="127.0.0.1", operate="login", success=True,
+                                              operate_datetime=datetime.utcnow()))
+        res = self.client.get(self.url, query_string=query, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 26)
+        res = self.client.get(self.url, query_string={"page": 1, "per_page": 10}, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 26)
+
+    def test_count_none(self):
+        """不统计总数时通过next判断是否有下一页"""
+        res = self.client.get(self.url, query_string={"page": 3, "per_page": 10, "count": "none"},
+                              headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(res.json["pagination"]["total"])
+        self.assertEqual(len(res.json["data"]), 5)
+        self.assertEqual(res.json["pagination"]["next"], "")
+        res = self.client.get(self.url, query_string={"page": 2, "per_page": 10, "count": "none"},
+                              headers=self.headers)
+        self.assertNotEqual(res.json["pagination"]["next"], "")
+
+    def test_count_estimate(self):
+        """无法估算时使用缓存的总数"""
+        res = self.client.get(self.url, query_string={"per_page": 10, "count": "estimate"}, headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 25)
+
+    def test_estimate_keep_session(self):
+        """估算失败不回滚会话中的其它变更"""
+        user = User(username="user", email="user@example.com")
+        db.session.add(user)
+        db.session.flush()
+        self.assertIsNone(_estimated_count(SecurityLog.query))
+        db.session.commit()
+        self.assertIsNotNone(User.query.filter_by(username="user").first())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime, timedelta
+
+from eAuth import create_app, cache_auth
+from eAuth.auth.schemas import LoginInputSchema, AuthBatchOutputSchema
+from eAuth.extensions import db, limiter, cache
+from eAuth.log.models import OperateLog, SecurityLog
+from eAuth.log.schemas import OperateLogPageOutputSchema
+from eAuth.models import User
+from eAuth.schedule.log import rollup_log
+from eAuth.utils.fixture import FixtureGenerator
+from eAuth.utils.serializer import compile_schema
+
+
+class TestSerializer(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        generator = FixtureGenerator()
+        generator.apis(50)
+        generator.roles(5, (5, 10))
+        usernames = generator.users(10, (1, 2))
+        end = datetime(2024, 1, 1)
+        generator.operate_logs(300, usernames=usernames, end=end)
+        generator.security_logs(300, usernames=usernames, end=end)
+        # 可为空的字段
+        db.session.add(OperateLog(username=None, ip_addr="127.0.0.1", operate_type="GET", operate_api="/api/x",
+                                  status_code=200, success=True, operate_datetime=end))
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        db.session.commit()
+        cache_auth()
+        self.headers = {"Authorization": admin.auth_token}
+        self.user_headers = {"Authorization": User.query.filter_by(username=usernames[0]).first().auth_token}
+
+    def tearDown(self) -> None:
+        self.app.config["FAST_SERIALIZER_ENABLED"] = True
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def both(self, method: str, url: str, **kwargs):
+        """分别使用编译的函数和marshmallow输出，返回两次的响应"""
+        responses = []
+        for enabled in (True, False):
+            self.app.config["FAST_SERIALIZER_ENABLED"] = enabled
+            responses.append(self.client.open(url, method=method, **kwargs))
+        return responses
+
+    def test_dump(self):
+        """编译的函数与schema.dump的输出一致"""
+        items = OperateLog.query.order_by(OperateLog.id.desc()).limit(200).all()
+        obj = {"data": items, "next_cursor": None, "total": 301}
+        self.assertEqual(compile_schema(OperateLogPageOutputSchema)(obj), OperateLogPageOutputSchema().dump(obj))
+        obj = {"data": [{"url": "/api/x", "method": "GET", "allowed": 1}, {"url": None, "method": "GET"}]}
+        self.assertEqual(compile_schema(AuthBatchOutputSchema)(obj), AuthBatchOutputSchema().dump(obj))
+        self.assertIs(compile_schema(AuthBatchOutputSchema), compile_schema(AuthBatchOutputSchema))
+
+    def test_hooks(self):
+        """带钩子的模型不能编译"""
+        with self.assertRaises(TypeError):
+            compile_schema(LoginInputSchema)
+
+    def test_docs(self):
+        """接口文档仍使用output的模型"""
+        res = self.client.get("/openapi.json")
+        self.assertEqual(res.status_code, 200)
+        content = res.json["paths"]["/api/log/operate-log"]["get"]["responses"]["200"]["content"]
+        self.assertEqual(content["application/json"]["schema"]["$ref"], "#/components/schemas/OperateLogPageOutput")
+
+    def test_endpoints(self):
+        """开启和关闭时各接口的响应一致"""
+        end = datetime(2024, 1, 1, 1)
+        for model in (OperateLog, SecurityLog):
+            rollup_log(model, end - timedelta(days=31), end)
+        for url, query_string in (("/api/log/operate-log", {"per_page": 200}),
+                                  ("/api/log/operate-log", {"per_page": 50, "cursor": ""}),
+                                  ("/api/log/security-log", {"per_page": 200, "page": 2}),
+                                  ("/api/log/stats", {"type": "operate", "group_by": "hour,username"}),
+                                  ("/api/log/stats", {"type": "security", "group_by": "success"})):
+            fast, slow = self.both("GET", url, query_string=query_string, headers=self.headers)
+            self.assertEqual(fast.status_code, 200, msg=fast.json)
+            self.assertEqual((fast.status_code, fast.data), (slow.status_code, slow.data), msg=url)
+        allowed = db.session.get(User, 1).roles[0].apis[0]
+        for url, method in ((allowed.url.replace("{id}", "1"), allowed.method), ("/api/missing", "GET")):
+            fast, slow = self.both("POST", "/api/auth/check", json={"url": url, "method": method},
+                                   headers=self.user_headers)
+            self.assertEqual((fast.status_code, fast.data), (slow.status_code, slow.data))
+        fast, slow = self.both("POST", "/api/auth/check/batch", headers=self.user_headers, json={
+            "items": [{"url": "/api/missing", "method": "GET"}, {"url": allowed.url, "method": allowed.method}]})
+        self.assertEqual((fast.status_code, fast.data), (slow.status_code, slow.data))
+        self.assertEqual([item["allowed"] for item in fast.json["data"]], [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
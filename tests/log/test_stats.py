@@ -0,0 +1,107 @@
+import unittest
+from datetime import datetime, timedelta
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter, cache
+from eAuth.log.models import SecurityLog, OperateLog, SecurityLogHourly, OperateLogHourly
+from eAuth.models import User
+from eAuth.schedule.log import rollup_log, rollup_logs
+
+
+class TestStats(unittest.TestCase):
+    app = None
+    context = None
+    url = "/api/log/stats"
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        self.start = datetime(2024, 1, 1)
+        # 3个小时内每10分钟一次登录，奇数次失败
+        for i in range(18):
+            db.session.add(SecurityLog(username=f"user{i % 2}", ip_addr=f"10.0.0.{i % 3}", operate="login",
+                                       success=i % 2 == 0, operate_datetime=self.start + timedelta(minutes=i * 10)))
+        for i in range(12):
+            db.session.add(OperateLog(username="admin", ip_addr="127.0.0.1", operate_type="GET",
+                                      operate_api=f"/api/config/api/{i % 4}", status_code=200 if i % 3 else 404,
+                                      success=bool(i % 3), operate_datetime=self.start + timedelta(minutes=i * 5)))
+        db.session.commit()
+        self.headers = {"Authorization": admin.auth_token}
+        end = self.start + timedelta(hours=3)
+        rollup_log(SecurityLog, self.start, end)
+        rollup_log(OperateLog, self.start, end)
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+    def stats(self, **params) -> list[dict]:
+        res = self.client.get(self.url, query_string=params, headers=self.headers)
+        self.assertEqual(res.status_code, 200, msg=res.json)
+        return res.json["data"]
+
+    def test_rollup(self):
+        """汇总结果与原始日志一致，重复汇总结果不变"""
+        self.assertEqual(db.session.query(db.func.sum(SecurityLogHourly.count)).scalar(), 18)
+        count = SecurityLogHourly.query.count()
+        rollup_log(SecurityLog, self.start + timedelta(minutes=30), self.start + timedelta(hours=3))
+        self.assertEqual(SecurityLogHourly.query.count(), count)
+        self.assertEqual(db.session.query(db.func.sum(SecurityLogHourly.count)).scalar(), 18)
+
+    def test_backfill(self):
+        """汇总表为空时从最早的日志开始补算"""
+        db.session.execute(db.delete(SecurityLogHourly))
+        db.session.commit()
+        rollup_logs()
+        self.assertEqual(db.session.query(db.func.sum(SecurityLogHourly.count)).scalar(), 18)
+        self.assertEqual(db.session.query(db.func.sum(OperateLogHourly.count)).scalar(), 12)
+        # 汇总表不为空时只重新计算最近几个小时
+        db.session.execute(db.delete(SecurityLogHourly).where(SecurityLogHourly.hour > self.start))
+        db.session.commit()
+        rollup_logs()
+        self.assertEqual(SecurityLogHourly.query.count(), SecurityLogHourly.query.filter_by(hour=self.start).count())
+
+    def test_logins_per_hour(self):
+        data = self.stats(type="security", operate="login")
+        self.assertEqual([row["hour"] for row in data],
+                         ["2024-01-01 00:00:00", "2024-01-01 01:00:00", "2024-01-01 02:00:00"])
+        self.assertEqual([row["count"] for row in data], [6, 6, 6])
+
+    def test_failed_login_per_ip(self):
+        data = self.stats(type="security", success=False, group_by="ip_addr")
+        expected = {}
+        for log in SecurityLog.query.filter_by(success=False):
+            expected[log.ip_addr] = expected.get(log.ip_addr, 0) + 1
+        self.assertEqual({row["ip_addr"]: row["count"] for row in data}, expected)
+        self.assertNotIn("hour", data[0])
+
+    def test_operate_per_api_status(self):
+        data = self.stats(type="operate", group_by="operate_api,status_code")
+        self.assertEqual(sum(row["count"] for row in data), 12)
+        self.assertEqual(len(data), len(set((log.operate_api, log.status_code) for log in OperateLog.query)))
+
+    def test_invalid_group_by(self):
+        res = self.client.get(self.url, query_string={"type": "security", "group_by": "operate_api"},
+                              headers=self.headers)
+        self.assertEqual(res.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy import insert, func
+
+from eAuth import create_app
+from eAuth.extensions import db, limiter
+from eAuth.log.models import OperateLog
+from eAuth.models import Api, User
+from eAuth.utils.audit import audit_writer
+from eAuth.utils.query_budget import query_budget
+from eAuth.utils.search import search_condition, reindex, search_trigram, insert_rows, _unindexed_rows
+
+
+class TestSearch(unittest.TestCase):
+    app = None
+    context = None
+    limiter.enabled = False
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = create_app('test')
+        cls.app.config["TESTING"] = True
+        cls.app.config["SQLALCHEMY_ECHO"] = False
+        cls.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.app.config["SEARCH_INDEX_ENABLED"] = True
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.context.pop()
+
+    def setUp(self) -> None:
+        db.create_all()
+        self.urls = ["/api/config/api", "/api/config/role", "/api/config/user", "/api/log/operate-log",
+                     "/api/log/100%", "/api/auth/check"]
+        for url in self.urls:
+            db.session.add(Api(url=url, method="GET", description=f"查询{url}"))
+        admin = User(username="admin", email="admin@example.com")
+        db.session.add(admin)
+        db.session.commit()
+        self.headers = {"Authorization": admin.auth_token}
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+
+    def search(self, term: str, mode: str = "contains") -> list[str]:
+        return sorted(api.url for api in Api.query.filter(search_condition(Api, ("url",), term, mode)))
+
+    def test_contains(self):
+        """与LIKE子串查询的结果一致"""
+        for term in ("config", "CONFIG", "log/", "ro", "100%", "0%", "none", "/api/config/api"):
+            expected = sorted(url for url in self.urls if term.lower() in url.lower())
+            self.assertEqual(self.search(term), expected, msg=term)
+
+    def test_exact_prefix(self):
+        self.assertEqual(self.search("/api/config/api", "exact"), ["/api/config/api"])
+        self.assertEqual(self.search("/api/config/", "prefix"),
+                         ["/api/config/api", "/api/config/role", "/api/config/user"])
+
+    def test_index_maintenance(self):
+        """增删改后索引同步更新，重建索引的结果不变"""
+        api = Api.query.filter_by(url="/api/config/role").first()
+        api.url = "/api/config/group"
+        db.session.commit()
+        self.assertEqual(self.search("role"), [])
+        self.assertEqual(self.search("group"), ["/api/config/group"])
+        db.session.delete(api)
+        db.session.commit()
+        self.assertEqual(self.search("group"), [])
+
+        count = db.session.query(search_trigram).count()
+        reindex(Api)
+        reindex(User)
+        self.assertEqual(db.session.query(search_trigram).count(), count)
+
+    def test_index_failure(self):
+        """索引写入失败时记录本身仍然写入成功"""
+        next_id = db.session.query(func.max(Api.id)).scalar() + 1
+        db.session.execute(insert(search_trigram).values(table_name="api", field="url", gram="xyz", row_id=next_id))
+        db.session.commit()
+        db.session.add(Api(url="/api/xyz", method="GET"))
+        db.session.commit()
+        self.assertIsNotNone(Api.query.filter_by(url="/api/xyz").first())
+
+    def test_log_search(self):
+        """批量写入的审计日志同样建立索引"""
+        for i in range(5):
+            audit_writer.submit(OperateLog, dict(
+                username=f"user{i}", ip_addr=f"10.0.0.{i}", operate_type="GET", operate_api=f"/api/config/api/{i}",
+                status_code=200, resource_id=None, request_data=None, response_data=None, success=True,
+                operate_datetime=datetime.utcnow()))
+        res = self.client.get("/api/log/operate-log", query_string={"ip_addr": "10.0.0.3"}, headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([row["username"] for row in res.json["data"]], ["user3"])
+        res = self.client.get("/api/log/operate-log", query_string={"username": "user", "search_mode": "prefix"},
+                              headers=self.headers)
+        self.assertEqual(res.json["pagination"]["total"], 5)
+        res = self.client.get("/api/log/operate-log", query_string={"username": "user", "search_mode": "exact"},
+                              headers=self.headers)
+        self.assertEqual(res.status_code, 404)
+
+    def test_batch_insert(self):
+        """批量写入的记录和索引各用一条语句写入，索引对应各自的记录"""
+        rows = [dict(username=f"user{i}", ip_addr=f"10.0.{i}.1", operate_type="GET", operate_api=f"/api/item/{i}",
+                     success=True, operate_datetime=datetime.utcnow()) for i in range(50)]
+        with query_budget.count() as counter:
+            insert_rows(db.session, OperateLog, rows)
+        db.session.commit()
+        self.assertEqual([statement.split("(")[0].strip() for statement in counter.statements],
+                         ["INSERT INTO operate_log", "INSERT INTO search_trigram"])
+        for i in (0, 17, 49):
+            logs = OperateLog.query.filter(search_condition(OperateLog, ("ip_addr",), f"10.0.{i}.1")).all()
+            self.assertEqual([log.username for log in logs], [f"user{i}"])
+
+    def test_unindexed_rows(self):
+        """范围扫描只返回尚未建立索引的记录"""
+        rows = [dict(username=f"user{i}", ip_addr=f"10.0.{i}.1", operate_type="GET", operate_api=f"/api/item/{i}",
+                     success=True, operate_datetime=datetime.utcnow()) for i in range(5)]
+        insert_rows(db.session, OperateLog, rows[:2])
+        db.session.execute(insert(OperateLog), rows[2:])
+        first_id = db.session.query(func.min(OperateLog.id)).scalar()
+        self.assertEqual(sorted(row["username"] for _, row in _unindexed_rows(db.session, OperateLog, first_id)),
+                         ["user2", "user3", "user4"])
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    unittest.main()